@@ -0,0 +1,125 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.dashboard import ClearanceState, DashboardAggregates, load_aggregates
+
+logger = logging.getLogger("app.analytics_snapshot")
+
+# Seconds between full reconciliations of the snapshot against the database (0 reloads on
+# every read). Bounds drift from writes made by other worker processes or outside the API,
+# and members becoming inactive as time passes.
+ANALYTICS_RECONCILE_INTERVAL = float(os.getenv("ANALYTICS_RECONCILE_INTERVAL", "300"))
+
+
+class AnalyticsSnapshot:
+    """
+    In-memory materialized dashboard, kept current by the membership, event and attendance
+    write paths.
+
+    The first read loads the aggregates from the database; after that, writes apply their
+    before/after deltas and reads only re-render when something changed, so serving the
+    dashboard costs no queries. The rendered JSON and its ETag are cached until the next
+    change. Every `reconcile_interval` seconds the next read reloads everything.
+
+    The snapshot is per process: with several workers, each sees its own writes
+    immediately and the others' after the next reconciliation.
+
+    A reload can run between a write's commit and its delta, and then already counts the
+    write. Writers therefore read `generation` before committing and pass it with the
+    delta; a delta from an older generation is not applied and the snapshot is reloaded
+    on the next read instead.
+    """
+
+    def __init__(self, reconcile_interval: float = ANALYTICS_RECONCILE_INTERVAL):
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.Lock()
+        self._aggregates: Optional[DashboardAggregates] = None
+        self._loaded_at = 0.0
+        self._body: Optional[bytes] = None
+        self._etag: Optional[str] = None
+        self.loads = 0
+        self.updates = 0
+
+    @property
+    def generation(self) -> int:
+        """Changes whenever the snapshot is reloaded; read it before committing a write."""
+        return self.loads
+
+    def get(self, db: Session) -> Tuple[bytes, str]:
+        """Return the dashboard JSON body and its ETag, reloading it if it is due."""
+        with self._lock:
+            if self._aggregates is None or time.monotonic() - self._loaded_at >= self.reconcile_interval:
+                started = time.perf_counter()
+                self._aggregates = load_aggregates(db)
+                self._loaded_at = time.monotonic()
+                self._body = None
+                self.loads += 1
+                logger.info(f"Analytics snapshot reconciled in {(time.perf_counter() - started) * 1000:.1f} ms")
+            if self._body is None:
+                self._body = json.dumps(self._aggregates.render(), separators=(",", ":"), default=str).encode("utf-8")
+                self._etag = '"' + hashlib.sha256(self._body).hexdigest()[:32] + '"'
+            return self._body, self._etag
+
+    def _apply(self, update, generation: Optional[int] = None) -> None:
+        # Nothing to maintain until the first read loads the snapshot
+        with self._lock:
+            if self._aggregates is None:
+                return
+            if generation is not None and generation != self.loads:
+                # Reloaded since the write began, so the load may already include it
+                logger.debug("Analytics snapshot reloaded during a write; reloading again on the next read")
+                self._aggregates = None
+            else:
+                update(self._aggregates)
+                self.updates += 1
+            self._body = None
+
+    def record_clearance_change(self, before: Optional[ClearanceState], after: Optional[ClearanceState],
+                                generation: Optional[int] = None) -> None:
+        """Apply a committed clearance write; `before` is None for inserts, `after` for removals."""
+        self.record_clearance_changes([(before, after)], generation)
+
+    def record_clearance_changes(self, changes, generation: Optional[int] = None) -> None:
+        """Apply a batch of committed (before, after) clearance writes under one lock."""
+        changes = [(before, after) for before, after in changes if before != after]
+
+        def update(aggregates: DashboardAggregates) -> None:
+            for before, after in changes:
+                aggregates.apply_clearance_change(before, after)
+
+        if changes:
+            self._apply(update, generation)
+
+    def record_new_clearances(self, requirement: str, counts_by_year, generation: Optional[int] = None) -> None:
+        """Apply a bulk creation of unpaid clearances without a state per row."""
+        counts_by_year = {year: count for year, count in counts_by_year.items() if count}
+        if counts_by_year:
+            self._apply(lambda aggregates: aggregates.add_new_clearances(requirement, counts_by_year), generation)
+
+    def record_participation(self, event_id: int, delta: int, generation: Optional[int] = None) -> None:
+        self._apply(lambda aggregates: aggregates.apply_participants(event_id, delta), generation)
+
+    def record_attendance(self, event_id: int, delta: int, generation: Optional[int] = None) -> None:
+        self._apply(lambda aggregates: aggregates.apply_attendance(event_id, delta), generation)
+
+    def record_event(self, event: models.Event) -> None:
+        """Apply a created, updated or archived event. Idempotent, so it needs no generation."""
+        event_id, title, date, archived = event.id, event.title, event.date, bool(event.archived)
+        self._apply(lambda aggregates: aggregates.set_event(event_id, title, date, archived))
+
+    def invalidate(self) -> None:
+        """Force a full reload on the next read."""
+        with self._lock:
+            self._aggregates = None
+            self._body = None
+
+
+analytics_snapshot = AnalyticsSnapshot()
@@ -0,0 +1,132 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger("app.answer_cache")
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+# Minimum cosine similarity between two query embeddings for them to share an answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+
+class SemanticAnswerCache:
+    """
+    In-process cache of chatbot answers keyed by query embedding similarity.
+
+    Embeddings are kept L2-normalized in a fixed-size matrix so a lookup is a single
+    matrix-vector product. Entries expire after `ttl` seconds and the least recently
+    used entry is evicted once `max_entries` is reached. The cache remembers which
+    index version its answers were produced from and drops everything when it changes.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, ttl: float = ANSWER_CACHE_TTL,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES, enabled: bool = ANSWER_CACHE_ENABLED):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.index_version: Optional[Any] = None
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._active = np.zeros(max_entries, dtype=bool)
+        # slot -> (query, answer, expires_at), ordered from least to most recently used
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype="float32").reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def get(self, embedding: np.ndarray) -> Optional[str]:
+        """Return the cached answer for the most similar query above the threshold."""
+        if not self.enabled:
+            return None
+        query = self._normalize(embedding)
+        with self._lock:
+            if not self._entries or self._vectors is None or self._vectors.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+            similarities = self._vectors @ query
+            similarities[~self._active] = -np.inf
+            slot = int(np.argmax(similarities))
+            if similarities[slot] < self.threshold:
+                self.misses += 1
+                return None
+            cached_query, answer, expires_at = self._entries[slot]
+            if expires_at <= time.monotonic():
+                self._remove(slot)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(slot)
+            self.hits += 1
+            logger.debug(f"Answer cache hit (similarity {similarities[slot]:.3f}) for cached query: {cached_query}")
+            return answer
+
+    def put(self, embedding: np.ndarray, query: str, answer: str) -> None:
+        if not self.enabled or not answer:
+            return
+        vector = self._normalize(embedding)
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype="float32")
+                self._active[:] = False
+                self._entries.clear()
+            if len(self._entries) >= self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+            slot = int(np.argmin(self._active))
+            self._vectors[slot] = vector
+            self._active[slot] = True
+            self._entries[slot] = (query, answer, time.monotonic() + self.ttl)
+
+    def _remove(self, slot: int) -> None:
+        self._entries.pop(slot, None)
+        self._active[slot] = False
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._active[:] = False
+            self.invalidations += 1
+        logger.info("Answer cache invalidated")
+
+    def set_index_version(self, version: Any) -> None:
+        """Record the index version answers are produced from, dropping stale answers."""
+        if version != self.index_version:
+            if self.index_version is not None:
+                self.invalidate()
+            self.index_version = version
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+answer_cache = SemanticAnswerCache()
@@ -0,0 +1,245 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models, rollups
+from app.analytics_snapshot import analytics_snapshot
+from app.auth_utils import SECRET_KEY
+from app.database import SessionLocal
+
+logger = logging.getLogger("app.attendance")
+
+# Key for check-in token signatures; set it separately from the JWT secret in production
+CHECKIN_SECRET = os.getenv("CHECKIN_SECRET", SECRET_KEY).encode("utf-8")
+# Tokens stay valid this many hours after the event starts
+CHECKIN_TOKEN_VALID_HOURS = float(os.getenv("CHECKIN_TOKEN_VALID_HOURS", "24"))
+# Buffered scans are written once this many are pending, or every interval seconds
+ATTENDANCE_BATCH_SIZE = int(os.getenv("ATTENDANCE_BATCH_SIZE", "200"))
+ATTENDANCE_FLUSH_INTERVAL = float(os.getenv("ATTENDANCE_FLUSH_INTERVAL", "1.0"))
+# Failed flushes a scan survives before it is dropped and logged
+ATTENDANCE_MAX_ATTEMPTS = int(os.getenv("ATTENDANCE_MAX_ATTEMPTS", "30"))
+
+_SIGNATURE_BYTES = 16
+
+
+class InvalidToken(ValueError):
+    """A check-in token that is malformed, forged or expired; `reason` says which."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(CHECKIN_SECRET, b"checkin:" + payload.encode("ascii"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:_SIGNATURE_BYTES]).decode("ascii").rstrip("=")
+
+
+def issue_token(event_id: int, user_id: int, expires_at: datetime) -> str:
+    """A compact "event.user.expiry.signature" token, short enough for a small QR code."""
+    expiry = int(expires_at.replace(tzinfo=expires_at.tzinfo or timezone.utc).timestamp())
+    payload = f"{event_id}.{user_id}.{expiry}"
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_token(token: str, now: Optional[float] = None) -> Tuple[int, int]:
+    """
+    Check a token's signature and expiry without touching the database and return
+    (event_id, user_id). `now` (a Unix time) lets offline scans be checked against the
+    time they were made rather than when they were synced.
+    """
+    try:
+        event_id, user_id, expiry, signature = token.strip().split(".")
+        payload = f"{int(event_id)}.{int(user_id)}.{int(expiry)}"
+        # Bytes, because compare_digest rejects non-ASCII strings with a TypeError
+        signature = signature.encode("ascii")
+    except ValueError:
+        raise InvalidToken("malformed")
+    if not hmac.compare_digest(_sign(payload).encode("ascii"), signature):
+        raise InvalidToken("bad_signature")
+    if int(expiry) < (time.time() if now is None else now):
+        raise InvalidToken("expired")
+    return int(event_id), int(user_id)
+
+
+def _insert_ignore(db: Session, rows: List[dict]) -> None:
+    """Bulk insert attendance rows, skipping members already checked in."""
+    table = models.EventAttendance.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        statement = table.insert().prefix_with("IGNORE")
+    elif dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(table).on_conflict_do_nothing(index_elements=["event_id", "user_id"])
+    else:
+        statement = table.insert()
+    db.execute(statement, rows)
+
+
+class AttendanceBuffer:
+    """
+    Collects check-in scans in memory and writes them in bulk.
+
+    Scans are deduplicated per (event, member) while pending; `flush` inserts the whole
+    batch in one statement that skips members already checked in, then records the new
+    check-ins in the daily rollups and the analytics snapshot. Flushes happen when
+    `batch_size` scans are pending and from a background task every `interval` seconds,
+    so a door scanner's burst costs a handful of inserts instead of one per scan.
+    """
+
+    def __init__(self, batch_size: int = ATTENDANCE_BATCH_SIZE, interval: float = ATTENDANCE_FLUSH_INTERVAL,
+                 max_attempts: int = ATTENDANCE_MAX_ATTEMPTS):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: Dict[Tuple[int, int], dict] = {}
+        self._task: Optional[asyncio.Task] = None
+        # Failed flushes per pending scan; only touched under _flush_lock
+        self._attempts: Dict[Tuple[int, int], int] = {}
+        self.flushed = 0
+        self.inserted = 0
+        self.dropped = 0
+
+    def add(self, event_id: int, user_id: int, checked_in_at: datetime, scanned_by: Optional[int],
+            source: str = "live") -> bool:
+        """Queue a scan; False if the same member is already pending for the event."""
+        with self._lock:
+            key = (event_id, user_id)
+            if key in self._pending:
+                return False
+            self._pending[key] = {
+                "event_id": event_id, "user_id": user_id, "checked_in_at": checked_in_at,
+                "scanned_by": scanned_by, "source": source, "recorded_at": datetime.utcnow(),
+            }
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+        return True
+
+    def pending(self, event_id: Optional[int] = None) -> int:
+        with self._lock:
+            if event_id is None:
+                return len(self._pending)
+            return sum(1 for key in self._pending if key[0] == event_id)
+
+    def _write(self, rows: List[dict]) -> List[dict]:
+        """Insert `rows` and their rollups in one transaction; returns the new check-ins."""
+        db = SessionLocal()
+        try:
+            attendance = models.EventAttendance
+            event_ids = {row["event_id"] for row in rows}
+            user_ids = {row["user_id"] for row in rows}
+            existing = set(db.query(attendance.event_id, attendance.user_id)
+                           .filter(attendance.event_id.in_(event_ids), attendance.user_id.in_(user_ids)))
+            new_rows = [row for row in rows if (row["event_id"], row["user_id"]) not in existing]
+            if new_rows:
+                _insert_ignore(db, new_rows)
+                years = dict(db.query(models.User.id, models.User.year)
+                             .filter(models.User.id.in_({row["user_id"] for row in new_rows})))
+                rollups.record_occurrences(db, "event_attendance", (
+                    (row["checked_in_at"].date(), {"event_id": row["event_id"], "year": years.get(row["user_id"])})
+                    for row in new_rows
+                ))
+            db.commit()
+            return new_rows
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _requeue(self, key: Tuple[int, int], row: dict) -> None:
+        """Keep a scan for the next flush, or give up on it after `max_attempts` failures."""
+        attempts = self._attempts.get(key, 0) + 1
+        if attempts >= self.max_attempts:
+            self._drop(key, row, f"failed {attempts} times")
+            return
+        self._attempts[key] = attempts
+        with self._lock:
+            self._pending.setdefault(key, row)
+
+    def _drop(self, key: Tuple[int, int], row: dict, reason: str) -> None:
+        self._attempts.pop(key, None)
+        self.dropped += 1
+        logger.error(f"Dropping attendance scan {row} ({reason})")
+
+    def flush(self) -> int:
+        """
+        Write every pending scan; returns how many were new check-ins.
+
+        If the bulk write fails, the scans are written one at a time so a single bad row
+        cannot hold back the rest: rows the database rejects (integrity or data errors)
+        are dropped and logged, and on any other error (e.g. the database is unreachable)
+        the remaining scans are kept for the next flush, each for at most `max_attempts`
+        failed flushes.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            # Every write below commits after this point
+            generation = analytics_snapshot.generation
+            try:
+                new_rows = self._write(list(batch.values()))
+                written = list(batch)
+            except Exception:
+                logger.exception(f"Failed to write {len(batch)} attendance scans in bulk; writing them one at a time")
+                new_rows, written = [], []
+                items = list(batch.items())
+                for position, (key, row) in enumerate(items):
+                    try:
+                        new_rows.extend(self._write([row]))
+                        written.append(key)
+                    except (IntegrityError, DataError) as e:
+                        self._drop(key, row, repr(e))
+                    except Exception as e:
+                        logger.warning(f"Failed to write attendance scans ({e!r}); will retry")
+                        for retry_key, retry_row in items[position:]:
+                            self._requeue(retry_key, retry_row)
+                        break
+            for key in written:
+                self._attempts.pop(key, None)
+            per_event = Counter(row["event_id"] for row in new_rows)
+            for event_id, count in per_event.items():
+                analytics_snapshot.record_attendance(event_id, count, generation)
+            self.flushed += len(written)
+            self.inserted += len(new_rows)
+            if written:
+                logger.info(f"Flushed {len(written)} attendance scans, {len(new_rows)} new check-ins")
+            return len(new_rows)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.pending():
+                await asyncio.to_thread(self.flush)
+
+
+attendance_buffer = AttendanceBuffer()
@@ -0,0 +1,91 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from how i if in is it its me my of on or so that the
+their then there these this to was what when where which who why will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over an updatable set of documents keyed by id.
+
+    Postings are kept per term, so scoring touches only documents that share a term
+    with the query, and documents can be added or removed without a rebuild.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._lengths: Dict[int, int] = {}
+        self._doc_terms: Dict[int, Tuple[str, ...]] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, doc_id: int, text: str) -> None:
+        if doc_id in self._lengths:
+            self.remove(doc_id)
+        tokens = tokenize(text)
+        counts = Counter(tokens)
+        for term, count in counts.items():
+            self._postings.setdefault(term, {})[doc_id] = count
+        self._doc_terms[doc_id] = tuple(counts)
+        self._lengths[doc_id] = len(tokens)
+        self._total_length += len(tokens)
+
+    def add_many(self, documents: Iterable[Tuple[int, str]]) -> None:
+        for doc_id, text in documents:
+            self.add(doc_id, text)
+
+    def remove(self, doc_id: int) -> None:
+        length = self._lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self._total_length -= length
+        for term in self._doc_terms.pop(doc_id):
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Return up to `k` (doc_id, score) pairs with a positive score, best first."""
+        return [(doc_id, score) for _, doc_id, score in search_combined([self], query, k)]
+
+
+def search_combined(indexes: Sequence[BM25Index], query: str, k: int) -> List[Tuple[int, int, float]]:
+    """
+    Score documents from several indexes as if they were one corpus, so document
+    frequencies and lengths are comparable across them. Returns up to `k`
+    (index position, doc_id, score) tuples with a positive score, best first.
+    """
+    n = sum(len(index._lengths) for index in indexes)
+    if not n:
+        return []
+    avg_length = sum(index._total_length for index in indexes) / n or 1.0
+    scores: Dict[Tuple[int, int], float] = {}
+    for term in set(tokenize(query)):
+        postings = [index._postings.get(term) or {} for index in indexes]
+        df = sum(len(p) for p in postings)
+        if not df:
+            continue
+        idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        for position, (index, term_postings) in enumerate(zip(indexes, postings)):
+            for doc_id, tf in term_postings.items():
+                norm = tf + index.k1 * (1 - index.b + index.b * index._lengths[doc_id] / avg_length)
+                key = (position, doc_id)
+                scores[key] = scores.get(key, 0.0) + idf * tf * (index.k1 + 1) / norm
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+    return [(position, doc_id, score) for (position, doc_id), score in ranked]
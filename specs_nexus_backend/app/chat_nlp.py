@@ -1,70 +1,386 @@
+import asyncio
+import logging
 import os
-import requests
-import pickle
+import threading
+import time
 import numpy as np
-import faiss
-from functools import lru_cache
-from sentence_transformers import SentenceTransformer
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, Optional, Set
 
+from app.answer_cache import answer_cache
+from app.chat_sessions import ChatSession, get_session_store
+from app.bm25 import BM25Index
+from app.embedding_cache import EmbeddingCache, normalize_query, query_key
+from app.embedding_service import EmbeddingService
+from app.encoders import encoder_model_id, load_encoder
+from app.live_index import live_index, live_kind
+from app.llm_client import close_llm_client, get_llm_client
+from app.prompt_builder import NO_ANSWER, prompt_builder
+from app.vector_store import IndexArtifactError, apply_search_params, load_artifacts
+
+logger = logging.getLogger("app.chat_nlp")
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-FAISS_INDEX_PATH = os.path.join(BASE_DIR, "faiss_system_index.pkl")
-DOC_MAPPING_PATH = os.path.join(BASE_DIR, "system_doc_mapping.pkl")
-
-
-with open(FAISS_INDEX_PATH, "rb") as f:
-    faiss_index = pickle.load(f)
-with open(DOC_MAPPING_PATH, "rb") as f:
-    documents = pickle.load(f)
-
-
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-
-
-TOGETHER_AI_KEY = "d33551f1ead6362d8ad07b4787274f4007a11d64cb2ab3d5c1be2b325c8b285c"
-
-@lru_cache(maxsize=128)
-def get_query_embedding(query: str):
-    return np.array(embedding_model.encode([query])).astype("float32")
-
-def retrieve_context(query: str, k: int = 3) -> str:
-
-    query_embedding_np = get_query_embedding(query)
-    distances, indices = faiss_index.search(query_embedding_np, k)
-    retrieved_texts = [documents[i] for i in indices[0] if i < len(documents)]
-    return "\n\n".join(retrieved_texts)
-
-def get_chat_response(user_query: str) -> str:
-
-    context = retrieve_context(user_query)
-    full_prompt = (
-        "You are SPECS NEXUS Assistance, a helpful chatbot that uses only the context provided below to answer questions. "
-        "SPECS info is in the context."
-        "This is SPECS NEXUS.SPECS Nexus is a comprehensive platform designed for a student organization. It streamlines membership registration, event participation, and announcement updates, helping members stay connected and informed. The system makes it easy for students to manage their profiles, track their membership status, and engage with community activities in a user-friendly environment."
-        "The system i called SPECS NEXUS. This has 5 main pages - Dashboard, Profile, Events, Announcements, and MembershipS. "
-        "If the context does not include the answer, respond with: \"I'm sorry, I do not have that information.\" \n\n"
-        f"Context:\n{context}\n\n"
-        f"User Query: {user_query}\n"
-        "Answer:"
-    )
-    
-    url = "https://api.together.xyz/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {TOGETHER_AI_KEY}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "model": "mistralai/Mistral-7B-Instruct-v0.1",  # Adjust if needed
-        "messages": [{"role": "user", "content": full_prompt}],
-        "max_tokens": 256,
-        "temperature": 0.7,
-        "do_sample": True
-    }
-    
-    response = requests.post(url, json=payload, headers=headers)
-    if response.status_code != 200:
-        raise Exception(f"Together.ai API error {response.status_code}: {response.text}")
-    
-    data = response.json()
-    answer = data.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
+INDEX_DIR = os.getenv("CHAT_INDEX_DIR", os.path.join(BASE_DIR, "system_index"))
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+
+# Hybrid retrieval settings. Vector hits farther than RETRIEVAL_MAX_DISTANCE (squared L2;
+# for the normalized MiniLM vectors this is 2 - 2 * cosine) and lexical hits scoring below
+# RETRIEVAL_MIN_BM25 are dropped. If nothing is left the LLM is not called at all.
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "3"))
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "10"))
+RETRIEVAL_MAX_DISTANCE = float(os.getenv("RETRIEVAL_MAX_DISTANCE", "1.45"))
+RETRIEVAL_MIN_BM25 = float(os.getenv("RETRIEVAL_MIN_BM25", "2.0"))
+# Reciprocal rank fusion constant
+RETRIEVAL_RRF_K = int(os.getenv("RETRIEVAL_RRF_K", "60"))
+# Override the query-time recall/latency knobs recorded in the index manifest (HNSW, IVF)
+INDEX_EF_SEARCH = os.getenv("INDEX_EF_SEARCH")
+INDEX_NPROBE = os.getenv("INDEX_NPROBE")
+
+
+def load_index(dimension: Optional[int] = None):
+    """
+    Load the memory-mapped FAISS index and chunk store, returning them with the index
+    version and a BM25 index over the same chunks. With `dimension`, an index of any
+    other vector dimension is rejected.
+    """
+    index, chunks, manifest = load_artifacts(INDEX_DIR, model_name=EMBEDDING_MODEL_NAME, dimension=dimension,
+                                             encoder=encoder_model_id(EMBEDDING_MODEL_NAME))
+    apply_search_params(index, {"ef_search": INDEX_EF_SEARCH, "nprobe": INDEX_NPROBE})
+    bm25 = BM25Index()
+    bm25.add_many((int(chunk_id), chunks[position]) for position, chunk_id in enumerate(chunks.ids))
+    return index, chunks, manifest["content_hash"], bm25
+
+def load_embedding_model():
+    # Backend (PyTorch or quantized ONNX) is chosen by EMBEDDING_BACKEND
+    return load_encoder(EMBEDDING_MODEL_NAME)
+
+
+class ChatResources:
+    """
+    Holds the embedding model and FAISS index used by the chatbot.
+
+    Nothing is loaded at import time. Resources are loaded on first use or by an
+    explicit `warmup()`, so processes that never chat do not pay for torch and the model.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._model = None
+        # Swapped as one tuple so a reload never pairs a new index with old documents
+        self._index_state = None
+        self.load_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._model is not None and self._index_state is not None
+
+    @property
+    def model(self):
+        if self._model is None:
+            self.warmup()
+        return self._model
+
+    @property
+    def index_state(self):
+        if self._index_state is None:
+            self.warmup()
+        return self._index_state
+
+    def warmup(self) -> None:
+        """Load everything the chatbot needs. Safe to call from several threads."""
+        with self._lock:
+            if self.ready:
+                return
+            started = time.perf_counter()
+            try:
+                if self._index_state is None:
+                    self._set_index_state(load_index())
+                if self._model is None:
+                    model = load_embedding_model()
+                    dimension = model.dimension
+                    if dimension != self._index_state[0].d:
+                        raise IndexArtifactError(
+                            f"Model {EMBEDDING_MODEL_NAME} produces {dimension}-d vectors but the index is {self._index_state[0].d}-d"
+                        )
+                    self._model = model
+                # Opened here so the first query does not open it on the event loop
+                get_query_cache()
+            except Exception as e:
+                self.error = repr(e)
+                logger.error("Failed to load chat resources", exc_info=True)
+                raise
+            self.error = None
+            self.load_seconds = round(time.perf_counter() - started, 3)
+            logger.info(f"Chat resources loaded in {self.load_seconds}s")
+            # Indexes events and announcements from the database in the background
+            live_index.start(
+                lambda texts: self._model.encode(texts),
+                self._index_state[0].d,
+                self._model.model_id,
+            )
+
+    def reload_index(self) -> int:
+        """
+        Reload the index after build_index.py has rebuilt it and drop answers cached from the
+        old one. An index the loaded encoder cannot search (another encoder or dimension) is
+        rejected with IndexArtifactError and the current one stays in use.
+        """
+        state = load_index(self._model.dimension if self._model is not None else None)
+        with self._lock:
+            self._set_index_state(state)
+        logger.info(f"Reloaded FAISS index with {len(state[1])} documents")
+        return len(state[1])
+
+    def _set_index_state(self, state) -> None:
+        self._index_state = state
+        answer_cache.set_index_version(state[2])
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "model_loaded": self._model is not None,
+            "index_loaded": self._index_state is not None,
+            "documents": len(self._index_state[1]) if self._index_state is not None else 0,
+            "live_documents": len(live_index),
+            "load_seconds": self.load_seconds,
+            "error": self.error,
+        }
+
+
+resources = ChatResources()
+
+def warmup() -> None:
+    resources.warmup()
+
+def reload_index() -> int:
+    return resources.reload_index()
+
+_embedding_service: Optional[EmbeddingService] = None
+
+def get_embedding_service() -> EmbeddingService:
+    global _embedding_service
+    if _embedding_service is None:
+        _embedding_service = EmbeddingService(
+            encode=lambda texts: resources.model.encode(texts),
+            model_name=EMBEDDING_MODEL_NAME,
+        )
+    return _embedding_service
+
+async def shutdown() -> None:
+    """Stop background work and release connections held by the chat subsystem."""
+    global _query_cache
+    live_index.stop()
+    if _embedding_service is not None:
+        await _embedding_service.aclose()
+    if _cache_writes:
+        # Let background cache writes finish before the connection is closed
+        await asyncio.gather(*_cache_writes, return_exceptions=True)
+    if _query_cache is not None:
+        _query_cache.close()
+        _query_cache = None
+    await close_llm_client()
+
+
+_query_cache: Optional[EmbeddingCache] = None
+_query_model_id: Optional[str] = None
+_query_cache_lock = threading.Lock()
+# Cache writes still running in the background
+_cache_writes: Set[asyncio.Future] = set()
+
+def get_query_cache() -> EmbeddingCache:
+    """
+    The on-disk embedding cache, shared by all worker processes and kept across restarts.
+    Opening it may wait on another process' write lock, so call it from a thread (warmup
+    opens it ahead of the first query).
+    """
+    global _query_cache, _query_model_id
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_model_id = encoder_model_id(EMBEDDING_MODEL_NAME)
+            _query_cache = EmbeddingCache()
+    return _query_cache
+
+async def embed_query(query: str) -> np.ndarray:
+    """
+    Return the (1, d) float32 embedding of a query. Queries are normalized first and
+    looked up in the shared embedding cache; misses are batched with concurrent queries.
+    """
+    normalized = normalize_query(query)
+    key = query_key(normalized)
+    cache = _query_cache or await asyncio.to_thread(get_query_cache)
+    vector = await asyncio.to_thread(cache.get, _query_model_id, key)
+    if vector is None:
+        vector = await get_embedding_service().embed(normalized)
+        # Write in the background: the answer does not depend on the cache write, which
+        # may wait on another process' write lock (failures are logged by the cache).
+        # shutdown() waits for the pending writes.
+        write = asyncio.ensure_future(asyncio.to_thread(cache.put, _query_model_id, key, vector))
+        _cache_writes.add(write)
+        write.add_done_callback(_cache_writes.discard)
+    return vector.reshape(1, -1)
+
+def retrieve(query: str, query_embedding_np: np.ndarray, k: int = RETRIEVAL_TOP_K) -> list:
+    """
+    Hybrid retrieval over the static system index and the live database index.
+
+    Vector (L2) and lexical (BM25) candidates that pass their relevance thresholds are
+    combined with reciprocal rank fusion. Returns up to `k` hits, best first, each with
+    its source, distance, BM25 score and fused score. An empty list means nothing
+    relevant was found.
+    """
+    faiss_index, documents, _, bm25 = resources.index_state
+    candidates = {}
+
+    def candidate(source: str, doc_id: int, text: str) -> dict:
+        key = (source, doc_id)
+        if key not in candidates:
+            candidates[key] = {"source": source, "id": doc_id, "text": text, "distance": None, "bm25": None, "score": 0.0}
+        return candidates[key]
+
+    distances, indices = faiss_index.search(query_embedding_np, RETRIEVAL_CANDIDATES)
+    # FAISS returns chunk ids and pads missing results with -1
+    vector_hits = [
+        (float(distance), "system", int(i), documents.get_by_id(int(i)))
+        for distance, i in zip(distances[0], indices[0]) if i >= 0
+    ]
+    vector_hits += [(distance, live_kind(i), i, text) for distance, i, text in live_index.search(query_embedding_np, RETRIEVAL_CANDIDATES)]
+    vector_hits.sort(key=lambda hit: hit[0])
+    rank = 0
+    for distance, source, doc_id, text in vector_hits:
+        if distance > RETRIEVAL_MAX_DISTANCE:
+            break
+        rank += 1
+        hit = candidate(source, doc_id, text)
+        hit["distance"] = round(distance, 4)
+        hit["score"] += 1 / (RETRIEVAL_RRF_K + rank)
+
+    # Static chunks and live documents are scored as one corpus so their BM25 scores compare
+    lexical_hits = live_index.lexical_search(query, RETRIEVAL_CANDIDATES, bm25)
+    rank = 0
+    for score, source, doc_id, text in lexical_hits:
+        if score < RETRIEVAL_MIN_BM25:
+            break
+        rank += 1
+        hit = candidate(source, doc_id, text if text is not None else documents.get_by_id(doc_id))
+        hit["bm25"] = round(score, 4)
+        hit["score"] += 1 / (RETRIEVAL_RRF_K + rank)
+
+    hits = sorted(candidates.values(), key=lambda hit: hit["score"], reverse=True)[:k]
+    for hit in hits:
+        hit["score"] = round(hit["score"], 6)
+    logger.debug(f"Retrieval for {query!r}: {[(h['source'], h['id'], h['distance'], h['bm25']) for h in hits]}")
+    return hits
+
+# Per-request durations of the pipeline stages (seconds), reported by the chat routes
+_stage_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("chat_stage_timings", default=None)
+
+def start_stage_timings() -> Dict[str, float]:
+    """Start collecting stage timings for the current request and return the dict they go in."""
+    timings: Dict[str, float] = {}
+    _stage_timings.set(timings)
+    return timings
+
+@contextmanager
+def timed_stage(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _stage_timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+
+def build_messages(hits: list, user_query: str, session: Optional[ChatSession] = None) -> list:
+    """Assemble the token-budgeted chat messages for the LLM and log their token counts."""
+    if session is not None:
+        messages, usage = prompt_builder.build(hits, user_query, session.turns, session.summary)
+    else:
+        messages, usage = prompt_builder.build(hits, user_query)
+    logger.info(f"Prompt usage: {usage}")
+    return messages
+
+def retrieval_query(user_query: str, session: Optional[ChatSession] = None) -> str:
+    """
+    Follow-up questions ("and how much is it?") rarely retrieve anything on their own, so
+    within a session the previous question is prepended to the retrieval query.
+    """
+    if session is not None and session.turns:
+        return f"{session.turns[-1]['question']} {user_query}"
+    return user_query
+
+async def remember_turn(session: Optional[ChatSession], user_query: str, answer: str) -> None:
+    if session is not None:
+        session.add_turn(user_query, answer)
+        # The Redis store does network I/O, so keep it off the event loop
+        await asyncio.to_thread(get_session_store().save, session)
+
+async def get_chat_response(user_query: str, session: Optional[ChatSession] = None) -> str:
+
+    # Answers to follow-ups depend on the conversation, so only first questions use the answer cache
+    use_cache = session is None or not session.turns
+    search_query = retrieval_query(user_query, session)
+    # Embedding and FAISS search are CPU bound, so keep them off the event loop
+    with timed_stage("embed"):
+        query_embedding = await embed_query(search_query)
+    cached = answer_cache.get(query_embedding[0]) if use_cache else None
+    if cached is not None:
+        await remember_turn(session, user_query, cached)
+        return cached
+
+    with timed_stage("retrieve"):
+        hits = await asyncio.to_thread(retrieve, search_query, query_embedding)
+    if not hits:
+        # Off-topic question: answer right away instead of paying for an LLM round trip
+        if use_cache:
+            answer_cache.put(query_embedding[0], user_query, NO_ANSWER)
+        await remember_turn(session, user_query, NO_ANSWER)
+        return NO_ANSWER
+    messages = build_messages(hits, user_query, session)
+    with timed_stage("llm"):
+        answer = await get_llm_client().complete(messages)
+    if use_cache:
+        answer_cache.put(query_embedding[0], user_query, answer)
+    await remember_turn(session, user_query, answer)
     return answer
+
+async def stream_chat_response(user_query: str, session: Optional[ChatSession] = None) -> AsyncIterator[str]:
+
+    use_cache = session is None or not session.turns
+    search_query = retrieval_query(user_query, session)
+    with timed_stage("embed"):
+        query_embedding = await embed_query(search_query)
+    cached = answer_cache.get(query_embedding[0]) if use_cache else None
+    if cached is not None:
+        await remember_turn(session, user_query, cached)
+        yield cached
+        return
+
+    with timed_stage("retrieve"):
+        hits = await asyncio.to_thread(retrieve, search_query, query_embedding)
+    if not hits:
+        if use_cache:
+            answer_cache.put(query_embedding[0], user_query, NO_ANSWER)
+        await remember_turn(session, user_query, NO_ANSWER)
+        yield NO_ANSWER
+        return
+    messages = build_messages(hits, user_query, session)
+    tokens = []
+    started = time.perf_counter()
+    async for token in get_llm_client().stream(messages):
+        if not tokens:
+            timings = _stage_timings.get()
+            if timings is not None:
+                timings["llm_first_token"] = time.perf_counter() - started
+        tokens.append(token)
+        yield token
+    timings = _stage_timings.get()
+    if timings is not None:
+        timings["llm"] = time.perf_counter() - started
+    # Only complete answers are cached and remembered; an abandoned stream never reaches this point
+    answer = "".join(tokens).strip()
+    if use_cache:
+        answer_cache.put(query_embedding[0], user_query, answer)
+    await remember_turn(session, user_query, answer)
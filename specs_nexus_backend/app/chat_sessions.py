@@ -0,0 +1,232 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Optional
+
+logger = logging.getLogger("app.chat_sessions")
+
+# "memory" keeps sessions in this process (use sticky sessions with several workers);
+# "redis" shares them through CHAT_SESSION_REDIS_URL
+CHAT_SESSION_STORE = os.getenv("CHAT_SESSION_STORE", "memory")
+CHAT_SESSION_REDIS_URL = os.getenv("CHAT_SESSION_REDIS_URL", "redis://localhost:6379/0")
+# Idle sessions expire after this many seconds
+CHAT_SESSION_TTL = float(os.getenv("CHAT_SESSION_TTL", "1800"))
+# In-process store caps: number of sessions and approximate total bytes of text held
+CHAT_SESSION_MAX_SESSIONS = int(os.getenv("CHAT_SESSION_MAX_SESSIONS", "10000"))
+CHAT_SESSION_MAX_BYTES = int(os.getenv("CHAT_SESSION_MAX_BYTES", str(32 * 1024 * 1024)))
+# Per session: the most recent turns are kept verbatim, older ones are folded into a
+# short extractive summary of at most CHAT_SESSION_SUMMARY_CHARS characters
+CHAT_SESSION_MAX_TURNS = int(os.getenv("CHAT_SESSION_MAX_TURNS", "4"))
+CHAT_SESSION_SUMMARY_CHARS = int(os.getenv("CHAT_SESSION_SUMMARY_CHARS", "600"))
+# Answers longer than this are truncated when stored as history
+CHAT_SESSION_TURN_CHARS = int(os.getenv("CHAT_SESSION_TURN_CHARS", "1000"))
+
+SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s")
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+def valid_session_id(session_id: str) -> bool:
+    return bool(SESSION_ID_RE.match(session_id))
+
+
+def _first_sentence(text: str, limit: int = 160) -> str:
+    sentence = _SENTENCE_RE.split(text.strip(), 1)[0]
+    return sentence if len(sentence) <= limit else sentence[:limit].rstrip() + "..."
+
+
+class ChatSession:
+    """The recent turns of one conversation plus a summary of the older ones."""
+
+    def __init__(self, session_id: str, turns: Optional[List[dict]] = None, summary: str = "",
+                 updated_at: Optional[float] = None):
+        self.session_id = session_id
+        self.turns = turns or []
+        self.summary = summary
+        self.updated_at = updated_at or time.time()
+
+    def add_turn(self, question: str, answer: str) -> None:
+        if len(answer) > CHAT_SESSION_TURN_CHARS:
+            answer = answer[:CHAT_SESSION_TURN_CHARS].rstrip() + "..."
+        self.turns.append({"question": question, "answer": answer})
+        self.updated_at = time.time()
+        self._compact()
+
+    def _compact(self) -> None:
+        """Fold turns beyond the most recent CHAT_SESSION_MAX_TURNS into the summary."""
+        while len(self.turns) > CHAT_SESSION_MAX_TURNS:
+            turn = self.turns.pop(0)
+            line = f"Q: {_first_sentence(turn['question'])} A: {_first_sentence(turn['answer'])}"
+            summary = f"{self.summary}\n{line}".strip()
+            # Drop the oldest summary lines once the summary is too long
+            while len(summary) > CHAT_SESSION_SUMMARY_CHARS and "\n" in summary:
+                summary = summary.split("\n", 1)[1]
+            self.summary = summary[-CHAT_SESSION_SUMMARY_CHARS:]
+
+    def copy(self) -> "ChatSession":
+        return ChatSession(self.session_id, [dict(turn) for turn in self.turns], self.summary, self.updated_at)
+
+    def size(self) -> int:
+        return len(self.summary) + sum(len(t["question"]) + len(t["answer"]) for t in self.turns)
+
+    def to_dict(self) -> dict:
+        return {"session_id": self.session_id, "turns": self.turns, "summary": self.summary, "updated_at": self.updated_at}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ChatSession":
+        return cls(data["session_id"], data.get("turns"), data.get("summary", ""), data.get("updated_at"))
+
+
+class SessionStore:
+    """
+    Backend interface for chat sessions. `get` returns None for unknown or expired ids.
+    Implementations may block (e.g. on network I/O), so async code calls them through
+    asyncio.to_thread.
+    """
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        raise NotImplementedError
+
+    def save(self, session: ChatSession) -> None:
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Process-local session store. Sessions idle for `ttl` seconds expire; when there are
+    more than `max_sessions` sessions or more than `max_bytes` of text, the least recently
+    used sessions are evicted. Sessions are copied in and out, so two requests for the same
+    session never modify a shared object; the last one saved wins, as with Redis.
+    """
+
+    def __init__(self, ttl: float = CHAT_SESSION_TTL, max_sessions: int = CHAT_SESSION_MAX_SESSIONS,
+                 max_bytes: int = CHAT_SESSION_MAX_BYTES):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # session_id -> (session, size), least recently used first
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            session, _ = entry
+            if time.time() - session.updated_at > self.ttl:
+                self._remove(session_id)
+                self.expirations += 1
+                return None
+            self._sessions.move_to_end(session_id)
+            return session.copy()
+
+    def save(self, session: ChatSession) -> None:
+        session = session.copy()
+        size = session.size()
+        with self._lock:
+            self._remove(session.session_id)
+            self._sessions[session.session_id] = (session, size)
+            self._bytes += size
+            self._expire()
+            while self._sessions and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+                oldest = next(iter(self._sessions))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._remove(session_id)
+
+    def _remove(self, session_id: str) -> None:
+        entry = self._sessions.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _expire(self) -> None:
+        # Least recently used first, so stop at the first session that is still fresh
+        cutoff = time.time() - self.ttl
+        while self._sessions:
+            session_id, (session, _) = next(iter(self._sessions.items()))
+            if session.updated_at >= cutoff:
+                break
+            self._remove(session_id)
+            self.expirations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Session store shared by all workers. Sessions are JSON values with a TTL; the global
+    memory cap and LRU eviction are left to Redis' maxmemory policy (e.g. allkeys-lru).
+    """
+
+    def __init__(self, url: str = CHAT_SESSION_REDIS_URL, ttl: float = CHAT_SESSION_TTL, prefix: str = "chat_session:"):
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        raw = self._redis.get(self.prefix + session_id)
+        return ChatSession.from_dict(json.loads(raw)) if raw else None
+
+    def save(self, session: ChatSession) -> None:
+        self._redis.setex(self.prefix + session.session_id, self.ttl, json.dumps(session.to_dict()))
+
+    def delete(self, session_id: str) -> None:
+        self._redis.delete(self.prefix + session_id)
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "ttl": self.ttl}
+
+
+_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    global _store
+    if _store is None:
+        if CHAT_SESSION_STORE == "redis":
+            _store = RedisSessionStore()
+        elif CHAT_SESSION_STORE == "memory":
+            _store = InMemorySessionStore()
+        else:
+            raise ValueError(f"Unknown chat session store {CHAT_SESSION_STORE!r}; expected 'memory' or 'redis'")
+        logger.info(f"Using {CHAT_SESSION_STORE} chat session store")
+    return _store
+
+
+def set_session_store(store: SessionStore) -> None:
+    """Plug in a different backend, e.g. from application startup."""
+    global _store
+    _store = store
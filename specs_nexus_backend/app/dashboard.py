@@ -0,0 +1,263 @@
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, NamedTuple, Optional
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from app import models
+
+logger = logging.getLogger("app.dashboard")
+
+PAYMENT_STATUSES = ("Not Paid", "Verifying", "Paid")
+# Members whose last activity is within this window count as active
+ACTIVE_WINDOW = timedelta(days=30)
+
+
+class ClearanceState(NamedTuple):
+    """The fields of one clearance (and its member) that the dashboard counts."""
+    user_id: Optional[int]
+    year: Optional[str]
+    requirement: str
+    payment_status: str
+    status: str
+    payment_method: Optional[str]
+    archived: bool
+    active: bool
+
+
+def clearance_state(clearance: models.Clearance, user: Optional[models.User] = None,
+                    now: Optional[datetime] = None) -> ClearanceState:
+    """Capture a clearance's counted fields, e.g. before and after a write."""
+    user = user if user is not None else clearance.user
+    active_since = (now or datetime.now()) - ACTIVE_WINDOW
+    return ClearanceState(
+        clearance.user_id,
+        user.year if user is not None else None,
+        clearance.requirement,
+        clearance.payment_status,
+        clearance.status,
+        clearance.payment_method,
+        clearance.archived is not False,
+        bool(user is not None and user.last_active and user.last_active >= active_since),
+    )
+
+
+class DashboardAggregates:
+    """
+    The counters behind the analytics dashboard.
+
+    Loaded from the database in four grouped queries by `load_aggregates`, and kept
+    current by applying clearance and event changes, so `render()` never has to touch
+    the database. Rendering cost depends on the number of groups and events, not on the
+    number of members or clearances.
+    """
+
+    def __init__(self):
+        # (year, requirement, payment_status, status, has_user) -> non-archived clearances
+        self.clearance_groups: Counter = Counter()
+        self.payment_methods: Counter = Counter()
+        # user_id -> requirement -> paid clearances, for the distinct paid member counts
+        self.paid: Dict[int, Counter] = {}
+        self.paid_by_requirement: Counter = Counter()
+        self.active_paid = set()
+        # event_id -> [title, date, participant_count, attendance_count] of non-archived events
+        self.events: Dict[int, list] = {}
+
+    def apply_clearance(self, state: Optional[ClearanceState], sign: int) -> None:
+        """Add (sign=1) or remove (sign=-1) one clearance from the counters."""
+        if state is None or state.archived:
+            return
+        _add(self.clearance_groups,
+             (state.year, state.requirement, state.payment_status, state.status, state.user_id is not None), sign)
+        if state.payment_method is not None:
+            _add(self.payment_methods, state.payment_method, sign)
+        if state.payment_status != "Paid" or state.user_id is None:
+            return
+        requirements = self.paid.setdefault(state.user_id, Counter())
+        before = requirements[state.requirement]
+        _add(requirements, state.requirement, sign)
+        after = requirements[state.requirement]
+        if before == 0 and after > 0:
+            self.paid_by_requirement[state.requirement] += 1
+        elif before > 0 and after == 0:
+            _add(self.paid_by_requirement, state.requirement, -1)
+        if not requirements:
+            del self.paid[state.user_id]
+            self.active_paid.discard(state.user_id)
+        elif state.active:
+            self.active_paid.add(state.user_id)
+
+    def apply_clearance_change(self, before: Optional[ClearanceState], after: Optional[ClearanceState]) -> None:
+        self.apply_clearance(before, -1)
+        self.apply_clearance(after, 1)
+
+    def add_new_clearances(self, requirement: str, counts_by_year: Dict[Optional[str], int]) -> None:
+        """Count freshly created (unpaid, not cleared) member clearances, grouped by member year."""
+        for year, count in counts_by_year.items():
+            _add(self.clearance_groups, (year, requirement, "Not Paid", "Not Yet Cleared", True), count)
+
+    def set_event(self, event_id: int, title: str, date: Optional[datetime], archived: bool) -> None:
+        if archived:
+            self.events.pop(event_id, None)
+        elif event_id in self.events:
+            self.events[event_id][:2] = [title, date]
+        else:
+            self.events[event_id] = [title, date, 0, 0]
+
+    def apply_participants(self, event_id: int, delta: int) -> None:
+        if event_id in self.events:
+            self.events[event_id][2] = max(0, self.events[event_id][2] + delta)
+
+    def apply_attendance(self, event_id: int, delta: int) -> None:
+        if event_id in self.events:
+            self.events[event_id][3] = max(0, self.events[event_id][3] + delta)
+
+    def render(self) -> Dict[str, Any]:
+        payment_counts = dict.fromkeys(PAYMENT_STATUSES, 0)
+        by_requirement_and_year = {}
+        clearance_tracking = {}
+        compliance = {}
+        for (user_year, requirement, payment_status, status, has_user), count in self.clearance_groups.items():
+            payment_counts[payment_status] = payment_counts.get(payment_status, 0) + count
+            tracking = clearance_tracking.setdefault(requirement, {})
+            tracking[status] = tracking.get(status, 0) + count
+            # The by-year breakdowns only include clearances that belong to a user
+            if not has_user:
+                continue
+            year = user_year or "Unspecified"
+            by_year = by_requirement_and_year.setdefault(requirement, {}).setdefault(year, dict.fromkeys(PAYMENT_STATUSES, 0))
+            by_year[payment_status] = by_year.get(payment_status, 0) + count
+            year_compliance = compliance.setdefault(year, {})
+            year_compliance[status] = year_compliance.get(status, 0) + count
+
+        total_paid_members = len(self.paid)
+        active_members = len(self.active_paid)
+        events_engagement = []
+        events_by_year = {}
+        for event_id in sorted(self.events):
+            title, date, participant_count, attendance_count = self.events[event_id]
+            engagement = {
+                "title": title,
+                "participant_count": participant_count,
+                "participation_rate": round((participant_count / total_paid_members) * 100, 2) if total_paid_members > 0 else 0,
+                # Share of registered participants who were checked in at the door
+                "attendance_count": attendance_count,
+                "attendance_rate": round((attendance_count / participant_count) * 100, 2) if participant_count > 0 else 0
+            }
+            events_engagement.append(engagement)
+            events_by_year.setdefault(date.year if date else "Unknown", []).append(engagement)
+        popular_events = sorted(events_engagement, key=lambda x: x["participant_count"], reverse=True)
+
+        return {
+            "membershipInsights": {
+                "totalPaidMembers": total_paid_members,
+                "activeMembers": active_members,
+                "inactiveMembers": total_paid_members - active_members,
+                "membersByRequirement": dict(self.paid_by_requirement)
+            },
+            "paymentAnalytics": {
+                "byRequirementAndYear": by_requirement_and_year,
+                "notPaid": payment_counts["Not Paid"],
+                "verifying": payment_counts["Verifying"],
+                "paid": payment_counts["Paid"],
+                "preferredPaymentMethods": [{"method": method, "count": count} for method, count in self.payment_methods.items()]
+            },
+            "eventsEngagement": {
+                "events": events_engagement,
+                "popularEvents": popular_events,
+                "breakdownByYear": events_by_year
+            },
+            "clearanceTracking": {
+                "byRequirement": clearance_tracking,
+                "complianceByYear": compliance
+            }
+        }
+
+
+def _add(counter: Counter, key, delta: int) -> None:
+    counter[key] += delta
+    if counter[key] <= 0:
+        del counter[key]
+
+
+def load_aggregates(db: Session, now: Optional[datetime] = None) -> DashboardAggregates:
+    """
+    Load the dashboard counters in four grouped queries, independent of the number of
+    members, clearances and events:
+
+    1. clearances by requirement, payment status, status and member year (everything
+       payment and clearance related is folded from this one result)
+    2. paid (member, requirement) pairs with whether the member is active
+    3. payment method usage
+    4. non-archived events with their participant and check-in counts (grouped
+       subqueries over event_participants and event_attendance instead of loading
+       every participant)
+    """
+    active_since = (now or datetime.now()) - ACTIVE_WINDOW
+    clearance = models.Clearance
+    requirement = models.Requirement
+    user = models.User
+    not_archived = clearance.archived == False
+    aggregates = DashboardAggregates()
+
+    # 1. The outer join keeps clearances without a user in the overall counts
+    has_user = user.id.isnot(None).label("has_user")
+    for year, name, payment_status, status, belongs_to_user, count in db.query(
+        user.year, requirement.name, clearance.payment_status, clearance.status, has_user, func.count(clearance.id)
+    ).join(requirement, clearance.requirement_id == requirement.id)\
+     .outerjoin(user, clearance.user_id == user.id)\
+     .filter(not_archived)\
+     .group_by(user.year, requirement.name, clearance.payment_status, clearance.status, has_user)\
+     .all():
+        aggregates.clearance_groups[(year, name, payment_status, status, bool(belongs_to_user))] = count
+
+    # 2. Paid members per requirement, and whether they were active in the last 30 days
+    for user_id, name, paid_count, active in db.query(
+        clearance.user_id, requirement.name, func.count(clearance.id),
+        func.max(case((user.last_active >= active_since, 1), else_=0)),
+    ).join(requirement, clearance.requirement_id == requirement.id)\
+     .outerjoin(user, clearance.user_id == user.id)\
+     .filter(not_archived, clearance.payment_status == "Paid", clearance.user_id.isnot(None))\
+     .group_by(clearance.user_id, requirement.name)\
+     .all():
+        aggregates.paid.setdefault(user_id, Counter())[name] = paid_count
+        aggregates.paid_by_requirement[name] += 1
+        if active:
+            aggregates.active_paid.add(user_id)
+
+    # 3. Payment method usage (ignoring nulls)
+    aggregates.payment_methods.update(dict(
+        db.query(clearance.payment_method, func.count(clearance.id))
+        .filter(not_archived, clearance.payment_method.isnot(None))
+        .group_by(clearance.payment_method)
+        .all()
+    ))
+
+    # 4. Events with participant and check-in counts
+    participants = models.event_participants
+    attendance = models.EventAttendance
+    participant_counts = db.query(participants.c.event_id, func.count().label("n"))\
+        .group_by(participants.c.event_id).subquery()
+    attendance_counts = db.query(attendance.event_id, func.count().label("n"))\
+        .group_by(attendance.event_id).subquery()
+    for event_id, title, date, participant_count, attendance_count in db.query(
+        models.Event.id, models.Event.title, models.Event.date,
+        func.coalesce(participant_counts.c.n, 0), func.coalesce(attendance_counts.c.n, 0),
+    ).outerjoin(participant_counts, participant_counts.c.event_id == models.Event.id)\
+     .outerjoin(attendance_counts, attendance_counts.c.event_id == models.Event.id)\
+     .filter(models.Event.archived == False)\
+     .all():
+        aggregates.events[event_id] = [title, date, participant_count, attendance_count]
+
+    logger.debug(
+        f"Loaded dashboard aggregates: {len(aggregates.clearance_groups)} clearance groups, "
+        f"{len(aggregates.paid)} paid members, {len(aggregates.events)} events"
+    )
+    return aggregates
+
+
+def compute_dashboard(db: Session, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Compute the analytics dashboard from scratch."""
+    return load_aggregates(db, now).render()
@@ -0,0 +1,194 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+logger = logging.getLogger("app.embedding_cache")
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(BASE_DIR, "embedding_cache.sqlite3"))
+# Least recently used entries are evicted once the cache holds more than this many vectors
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+# SQLite limits the number of bound parameters per statement
+_BATCH = 500
+# Eviction trims the cache to this fraction of its maximum so it does not run on every insert
+_EVICT_TO = 0.9
+# The entry count is only checked after this many inserts by this process, so a put is not
+# a table scan; the cache can overshoot its maximum by up to this much per process
+_EVICT_CHECK_ROWS = 1000
+# A hit only rewrites an entry's access time if it is older than this many seconds, so hot
+# keys do not turn every read into a write
+_TOUCH_INTERVAL = 60.0
+# How long a writer waits for another process holding the write lock
+_BUSY_TIMEOUT = 5.0
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a query before embedding and caching it, so trivially different spellings
+    share one entry. Lowercasing is safe because the MiniLM tokenizer is uncased.
+    """
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", query)).strip().lower()
+
+
+def query_key(normalized_query: str) -> str:
+    # Prefixed so query keys never collide with the chunk hashes used by build_index.py
+    return "query:" + hashlib.sha256(normalized_query.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache stored in SQLite, keyed by model id and content key.
+
+    Vectors are stored as raw float32 bytes. The key is whatever identifies the text
+    for the caller, e.g. the SHA-256 of a document chunk or `query_key()` of a query.
+    The database runs in WAL mode, so any number of worker processes can read while
+    one writes, and survives restarts. Size is bounded by evicting the least recently
+    used entries.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=_BUSY_TIMEOUT, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " dim INTEGER NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " accessed_at REAL NOT NULL DEFAULT 0,"
+            " PRIMARY KEY (model, key))"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")}
+        if "accessed_at" not in columns:
+            # Caches created before eviction existed
+            self._conn.execute("ALTER TABLE embeddings ADD COLUMN accessed_at REAL NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_accessed_at ON embeddings (accessed_at)")
+        self._conn.commit()
+        self._evict_check_rows = max(1, min(_EVICT_CHECK_ROWS, int(max_entries * (1 - _EVICT_TO))))
+        # Rows this process inserted since it last counted the entries; the first put
+        # counts them, so restarts cannot let the cache grow unchecked
+        self._unchecked = self._evict_check_rows
+        # Metrics for this process
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.write_errors = 0
+
+    def get_many(self, model: str, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        keys = list(keys)
+        found = {}
+        stale = []
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(keys), _BATCH):
+                batch = keys[start:start + _BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, dim, vector, accessed_at FROM embeddings WHERE model = ? AND key IN ({placeholders})",
+                    [model, *batch],
+                ).fetchall()
+                for key, dim, vector, accessed_at in rows:
+                    found[key] = np.frombuffer(vector, dtype="float32", count=dim)
+                    if now - accessed_at > _TOUCH_INTERVAL:
+                        stale.append(key)
+            if stale:
+                self._touch(model, stale, now)
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, model: str, key: str) -> Optional[np.ndarray]:
+        return self.get_many(model, [key]).get(key)
+
+    def put_many(self, model: str, items: Dict[str, np.ndarray]) -> None:
+        """
+        Store vectors. A failed write (e.g. another process holding the write lock past
+        the busy timeout) is logged and dropped: the cache is only an optimization.
+        """
+        now = time.time()
+        rows = [
+            (model, key, int(vector.shape[-1]), np.asarray(vector, dtype="float32").tobytes(), now)
+            for key, vector in items.items()
+        ]
+        with self._lock:
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, key, dim, vector, accessed_at) VALUES (?, ?, ?, ?, ?)", rows
+                )
+                self._conn.commit()
+                self._unchecked += len(rows)
+                if self._unchecked >= self._evict_check_rows:
+                    self._unchecked = 0
+                    self._evict()
+            except sqlite3.OperationalError as e:
+                self._conn.rollback()
+                self.write_errors += 1
+                logger.warning(f"Skipped caching {len(rows)} embeddings in {self.path}: {e}")
+
+    def put(self, model: str, key: str, vector: np.ndarray) -> None:
+        self.put_many(model, {key: vector})
+
+    def _touch(self, model: str, keys: list, now: float) -> None:
+        placeholders = ",".join("?" * len(keys))
+        try:
+            self._conn.execute(
+                f"UPDATE embeddings SET accessed_at = ? WHERE model = ? AND key IN ({placeholders})",
+                [now, model, *keys],
+            )
+            self._conn.commit()
+        except sqlite3.OperationalError as e:
+            # Another process held the write lock for too long; the access time is only a hint
+            self._conn.rollback()
+            logger.debug(f"Skipped access time update: {e}")
+
+    def _evict(self) -> None:
+        if not self.max_entries:
+            return
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        excess = count - int(self.max_entries * _EVICT_TO)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY accessed_at LIMIT ?)",
+            (excess,),
+        )
+        self._conn.commit()
+        self.evictions += excess
+        logger.info(f"Evicted {excess} least recently used embeddings from {self.path}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "vector_bytes": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "write_errors": self.write_errors,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger("app.embedding_service")
+
+# Queries arriving within EMBED_MAX_WAIT_MS of each other are encoded together, up to EMBED_MAX_BATCH
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+# "thread" runs the encoder on a dedicated thread pool in this process; "process" runs it in
+# a process pool where every worker loads its own copy of the model
+EMBED_EXECUTOR = os.getenv("EMBED_EXECUTOR", "thread")
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "1"))
+
+_worker_model = None
+
+
+def _init_process_worker(model_name: str) -> None:
+    global _worker_model
+    from app.encoders import load_encoder
+
+    _worker_model = load_encoder(model_name)
+
+
+def _encode_in_process_worker(texts: List[str]) -> np.ndarray:
+    return np.asarray(_worker_model.encode(texts), dtype="float32")
+
+
+class EmbeddingService:
+    """
+    Micro-batching front end for the embedding model.
+
+    Concurrent `embed()` calls are queued; a single batcher task takes up to `max_batch`
+    queued texts, waiting at most `max_wait_ms` after the first one, and encodes them in
+    one call on the executor. Up to `workers` batches are encoded at once; while all
+    workers are busy new requests keep queueing, so the batch size grows with load.
+    """
+
+    def __init__(self, encode: Optional[Callable[[List[str]], np.ndarray]] = None, model_name: Optional[str] = None,
+                 max_batch: int = EMBED_MAX_BATCH, max_wait_ms: float = EMBED_MAX_WAIT_MS,
+                 executor: str = EMBED_EXECUTOR, workers: int = EMBED_WORKERS):
+        if executor == "process" and not model_name:
+            raise ValueError("The process executor needs a model name to load in each worker")
+        if executor != "process" and encode is None:
+            raise ValueError("The thread executor needs an encode function")
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.executor_kind = executor
+        self._encode = encode
+        self._model_name = model_name
+        self._workers = workers
+        self._executor: Optional[Executor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        # The batch the batcher is collecting, and the batches being encoded by their task
+        self._collecting: list = []
+        self._in_flight: Dict[asyncio.Task, list] = {}
+        # Metrics
+        self.batches = 0
+        self.items = 0
+        self.batch_sizes = Counter()
+        self.queue_waits = deque(maxlen=1000)
+        self.encode_times = deque(maxlen=1000)
+
+    def _ensure_started(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self._workers, initializer=_init_process_worker, initargs=(self._model_name,)
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="embedding")
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self._workers)
+        self._task = asyncio.get_running_loop().create_task(self._batcher())
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Return the float32 embedding of `text` as a 1-d array."""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future, time.perf_counter()))
+        return await future
+
+    async def _batcher(self) -> None:
+        loop = asyncio.get_running_loop()
+        slots = self._slots
+
+        def batch_done(task: asyncio.Task) -> None:
+            self._in_flight.pop(task, None)
+            slots.release()
+
+        while True:
+            # Only start collecting once a worker is free, so batches grow while all are busy
+            await slots.acquire()
+            batch = self._collecting = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            self._collecting = []
+            task = loop.create_task(self._encode_batch(batch))
+            self._in_flight[task] = batch
+            task.add_done_callback(batch_done)
+
+    async def _encode_batch(self, batch: list) -> None:
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        for _, _, queued_at in batch:
+            self.queue_waits.append(started - queued_at)
+        texts = [text for text, _, _ in batch]
+        try:
+            if self.executor_kind == "process":
+                vectors = await loop.run_in_executor(self._executor, _encode_in_process_worker, texts)
+            else:
+                vectors = await loop.run_in_executor(self._executor, self._encode, texts)
+            vectors = np.asarray(vectors, dtype="float32")
+        except Exception as e:
+            logger.error(f"Embedding batch of {len(batch)} failed", exc_info=True)
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.encode_times.append(time.perf_counter() - started)
+        self.batches += 1
+        self.items += len(batch)
+        self.batch_sizes[len(batch)] += 1
+        for (_, future, _), vector in zip(batch, vectors):
+            # A caller that gave up (e.g. client disconnected) has a cancelled future
+            if not future.done():
+                future.set_result(vector)
+
+    async def aclose(self) -> None:
+        """Stop the batcher; every queued or unfinished `embed()` call fails instead of hanging."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        pending = list(self._collecting)
+        self._collecting = []
+        for task, batch in list(self._in_flight.items()):
+            task.cancel()
+            pending.extend(batch)
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        error = RuntimeError("Embedding service closed")
+        for _, future, _ in pending:
+            if not future.done():
+                future.set_exception(error)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> dict:
+        def percentile(values, q):
+            return round(float(np.percentile(values, q)) * 1000, 3) if values else 0.0
+
+        waits = list(self.queue_waits)
+        encodes = list(self.encode_times)
+        return {
+            "executor": self.executor_kind,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+            "queue_wait_ms": {"p50": percentile(waits, 50), "p95": percentile(waits, 95), "max": percentile(waits, 100)},
+            "encode_ms": {"p50": percentile(encodes, 50), "p95": percentile(encodes, 95), "max": percentile(encodes, 100)},
+        }
@@ -0,0 +1,127 @@
+import json
+import logging
+import os
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger("app.encoders")
+
+# "torch" runs the sentence-transformers model in PyTorch; "onnx" runs the int8-quantized
+# export written by export_onnx.py in ONNX Runtime, which needs far less RAM and CPU per query
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join(BASE_DIR, "onnx_model"))
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "1"))
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_META_FILE = "encoder.json"
+
+
+class Encoder:
+    """
+    Turns texts into float32 sentence embeddings.
+
+    `model_id` names the exact vectors an encoder produces and keys the embedding cache,
+    so vectors from different backends of the same model are never mixed up.
+    """
+
+    model_name: str
+    model_id: str
+    dimension: int
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+
+class SentenceTransformerEncoder(Encoder):
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self._model = SentenceTransformer(model_name, device="cpu")
+        self.model_name = model_name
+        self.model_id = model_name
+        self.dimension = self._model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self._model.encode(texts), dtype="float32")
+
+
+class OnnxEncoder(Encoder):
+    """
+    Mean-pooled, L2-normalized embeddings from an ONNX export of a sentence-transformers
+    model, matching what SentenceTransformer produces for MiniLM-style models.
+    """
+
+    def __init__(self, model_dir: str, model_name: Optional[str] = None, threads: int = ONNX_THREADS):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        meta = _read_onnx_meta(model_dir)
+        if model_name is not None and meta["model_name"] != model_name:
+            raise ValueError(f"ONNX model in {model_dir} was exported from {meta['model_name']!r}, not {model_name!r}")
+        self.model_name = meta["model_name"]
+        self.model_id = f"{meta['model_name']}@onnx-{meta['quantization']}"
+        self.dimension = meta["dimension"]
+        self._normalize = meta.get("normalize", True)
+
+        self._tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self._tokenizer.enable_truncation(meta["max_length"])
+        self._tokenizer.enable_padding()
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, ONNX_MODEL_FILE), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {model_input.name for model_input in self._session.get_inputs()}
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dimension), dtype="float32")
+        encodings = self._tokenizer.encode_batch(list(texts))
+        input_ids = np.array([e.ids for e in encodings], dtype="int64")
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype="int64")
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype="int64")
+        token_embeddings = self._session.run(None, feeds)[0]
+
+        mask = attention_mask[:, :, None].astype("float32")
+        vectors = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self._normalize:
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors.astype("float32")
+
+
+def _read_onnx_meta(model_dir: str) -> dict:
+    with open(os.path.join(model_dir, ONNX_META_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def encoder_model_id(model_name: str, backend: str = EMBEDDING_BACKEND, onnx_model_dir: str = ONNX_MODEL_DIR) -> str:
+    """The `model_id` the configured encoder will have, without loading it."""
+    if backend == "onnx":
+        return f"{model_name}@onnx-{_read_onnx_meta(onnx_model_dir)['quantization']}"
+    return model_name
+
+
+def load_encoder(model_name: str, backend: str = EMBEDDING_BACKEND, onnx_model_dir: str = ONNX_MODEL_DIR) -> Encoder:
+    if backend == "onnx":
+        encoder = OnnxEncoder(onnx_model_dir, model_name=model_name)
+    elif backend == "torch":
+        encoder = SentenceTransformerEncoder(model_name)
+    else:
+        raise ValueError(f"Unknown embedding backend {backend!r}; expected 'torch' or 'onnx'")
+    logger.info(f"Loaded {backend} encoder {encoder.model_id} ({encoder.dimension}-d)")
+    return encoder
+
+
+def onnx_parity(model_name: str, texts: List[str], onnx_model_dir: str = ONNX_MODEL_DIR) -> np.ndarray:
+    """Cosine similarity between the ONNX export's and the PyTorch model's vector of each text."""
+    reference = load_encoder(model_name, "torch").encode(texts)
+    candidate = load_encoder(model_name, "onnx", onnx_model_dir).encode(texts)
+    return np.sum(reference * candidate, axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
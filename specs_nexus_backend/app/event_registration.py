@@ -0,0 +1,142 @@
+import logging
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from app import models, rollups
+from app.analytics_snapshot import analytics_snapshot
+
+logger = logging.getLogger("app.event_registration")
+
+participants = models.event_participants
+Waitlist = models.EventWaitlistEntry
+
+
+def lock_event(db: Session, event_id: int) -> Optional[models.Event]:
+    """
+    Load the event and lock its row until the transaction ends, so joins and leaves for
+    one event run one at a time while other events are unaffected (SELECT ... FOR UPDATE).
+    SQLite has no row locks; there a no-op write takes the database write lock instead.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        db.execute(update(models.Event).where(models.Event.id == event_id).values(capacity=models.Event.capacity))
+    return db.query(models.Event).filter(models.Event.id == event_id).with_for_update().populate_existing().first()
+
+
+def _is_participant(db: Session, event_id: int, user_id: int) -> bool:
+    return db.query(participants.c.user_id)\
+        .filter(participants.c.event_id == event_id, participants.c.user_id == user_id)\
+        .first() is not None
+
+
+def _participant_count(db: Session, event_id: int) -> int:
+    return db.query(func.count()).select_from(participants).filter(participants.c.event_id == event_id).scalar()
+
+
+def _waitlist_position(db: Session, event_id: int, user_id: int) -> Optional[int]:
+    entry = db.query(Waitlist.id).filter(Waitlist.event_id == event_id, Waitlist.user_id == user_id).first()
+    if entry is None:
+        return None
+    return db.query(func.count(Waitlist.id)).filter(Waitlist.event_id == event_id, Waitlist.id <= entry.id).scalar()
+
+
+def _add_participant(db: Session, event_id: int, user_id: int, year: Optional[str]) -> None:
+    db.execute(participants.insert().values(event_id=event_id, user_id=user_id, joined_at=datetime.utcnow()))
+    rollups.record(db, "event_signups", 1, event_id=event_id, year=year)
+
+
+def promote_waitlist(db: Session, event: models.Event) -> List[int]:
+    """
+    Move members from the front of the waitlist into free seats of the locked `event`.
+    Returns the promoted user ids; the caller commits.
+    """
+    free = None if event.capacity is None else event.capacity - _participant_count(db, event.id)
+    if free is not None and free <= 0:
+        return []
+    query = db.query(Waitlist, models.User.year)\
+        .outerjoin(models.User, Waitlist.user_id == models.User.id)\
+        .filter(Waitlist.event_id == event.id)\
+        .order_by(Waitlist.id)
+    promoted = []
+    for entry, year in (query.limit(free).all() if free is not None else query.all()):
+        _add_participant(db, event.id, entry.user_id, year)
+        db.delete(entry)
+        promoted.append(entry.user_id)
+    return promoted
+
+
+def join(db: Session, event_id: int, user_id: int, year: Optional[str]) -> Tuple[str, Optional[int]]:
+    """
+    Register a member for an event, or put them on its waitlist when it is full.
+
+    Idempotent: joining again reports the current state instead of failing. Runs under
+    the event's row lock, so the capacity check and the insert cannot interleave with
+    another registration for the same event. Returns (status, waitlist position).
+    """
+    event = lock_event(db, event_id)
+    if event is None:
+        db.rollback()
+        raise LookupError(f"Event {event_id} not found")
+    if _is_participant(db, event_id, user_id):
+        db.rollback()
+        return "already_joined", None
+    position = _waitlist_position(db, event_id, user_id)
+    if position is not None:
+        db.rollback()
+        return "already_waitlisted", position
+
+    if event.capacity is None or _participant_count(db, event_id) < event.capacity:
+        _add_participant(db, event_id, user_id, year)
+        generation = analytics_snapshot.generation
+        db.commit()
+        analytics_snapshot.record_participation(event_id, 1, generation)
+        return "joined", None
+
+    db.add(Waitlist(event_id=event_id, user_id=user_id))
+    db.flush()
+    position = _waitlist_position(db, event_id, user_id)
+    db.commit()
+    logger.info(f"Event {event_id} is full; user {user_id} waitlisted at position {position}")
+    return "waitlisted", position
+
+
+def leave(db: Session, event_id: int, user_id: int, year: Optional[str]) -> Tuple[str, List[int]]:
+    """
+    Remove a member from an event (promoting the next waitlisted members into the freed
+    seat) or from its waitlist. Returns (status, promoted user ids).
+    """
+    event = lock_event(db, event_id)
+    if event is None:
+        db.rollback()
+        raise LookupError(f"Event {event_id} not found")
+    removed = db.execute(
+        participants.delete().where(participants.c.event_id == event_id, participants.c.user_id == user_id)
+    ).rowcount
+    if removed:
+        rollups.record(db, "event_signups", -1, event_id=event_id, year=year)
+        promoted = promote_waitlist(db, event)
+        generation = analytics_snapshot.generation
+        db.commit()
+        analytics_snapshot.record_participation(event_id, len(promoted) - 1, generation)
+        if promoted:
+            logger.info(f"Promoted users {promoted} from the waitlist of event {event_id}")
+        return "left", promoted
+
+    unlisted = db.query(Waitlist).filter(Waitlist.event_id == event_id, Waitlist.user_id == user_id)\
+        .delete(synchronize_session=False)
+    db.commit()
+    return ("left_waitlist" if unlisted else "not_participating"), []
+
+
+def apply_capacity(db: Session, event_id: int) -> List[int]:
+    """Promote waitlisted members after an event's capacity was raised or removed; commits."""
+    event = lock_event(db, event_id)
+    promoted = promote_waitlist(db, event) if event is not None else []
+    generation = analytics_snapshot.generation
+    db.commit()
+    if promoted:
+        analytics_snapshot.record_participation(event_id, len(promoted), generation)
+        logger.info(f"Promoted users {promoted} from the waitlist of event {event_id}")
+    return promoted
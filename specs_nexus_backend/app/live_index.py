@@ -0,0 +1,259 @@
+import datetime
+import logging
+import os
+import queue
+import threading
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from app.answer_cache import answer_cache
+from app.bm25 import BM25Index, search_combined
+from app.embedding_cache import EmbeddingCache
+from app.vector_store import chunk_hash
+
+logger = logging.getLogger("app.live_index")
+
+# Seconds between polls for rows changed by other worker processes (0 disables polling)
+LIVE_INDEX_SYNC_INTERVAL = float(os.getenv("LIVE_INDEX_SYNC_INTERVAL", "30"))
+
+# Live document ids are (kind << 32) | row id so events and announcements never collide
+KIND_CODES = {"event": 1, "announcement": 2}
+KIND_NAMES = {code: kind for kind, code in KIND_CODES.items()}
+
+
+def live_id(kind: str, row_id: int) -> int:
+    return (KIND_CODES[kind] << 32) | row_id
+
+
+def live_kind(faiss_id: int) -> str:
+    return KIND_NAMES.get(faiss_id >> 32, "unknown")
+
+
+def event_document(event) -> str:
+    lines = [f"Event: {event.title}"]
+    if event.date:
+        lines.append(f"Date: {event.date.strftime('%B %d, %Y %I:%M %p')}")
+    if event.location:
+        lines.append(f"Location: {event.location}")
+    if event.registration_end:
+        lines.append(f"Registration closes: {event.registration_end.strftime('%B %d, %Y %I:%M %p')}")
+    if event.description:
+        lines.append(event.description)
+    return "\n".join(lines)
+
+
+def announcement_document(announcement) -> str:
+    lines = [f"Announcement: {announcement.title}"]
+    if announcement.date:
+        lines.append(f"Date: {announcement.date.strftime('%B %d, %Y %I:%M %p')}")
+    if announcement.location:
+        lines.append(f"Location: {announcement.location}")
+    if announcement.description:
+        lines.append(announcement.description)
+    return "\n".join(lines)
+
+
+class LiveIndex:
+    """
+    In-memory vector index over database content (events and announcements).
+
+    Rows are embedded and upserted one at a time by a background worker thread, so
+    the request that changed a row never waits for the embedding model. Archived or
+    deleted rows are removed. The worker also polls `updated_at` so rows changed by
+    other worker processes are picked up without rebuilding the index, and compares the
+    indexed ids with the ids still in the tables so rows they deleted are dropped too.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._index = None
+        self._texts = {}
+        self._bm25 = BM25Index()
+        self._queue: "queue.Queue[Optional[Tuple[str, int]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._encode: Optional[Callable[[List[str]], np.ndarray]] = None
+        self._model_id: Optional[str] = None
+        self._watermark: Optional[datetime.datetime] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def start(self, encode: Callable[[List[str]], np.ndarray], dimension: int, model_id: str) -> None:
+        """Start the background worker. The first thing it does is load all current rows."""
+        import faiss
+
+        with self._lock:
+            if self.running:
+                return
+            self._encode = encode
+            self._model_id = model_id
+            self._index = faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+            self._texts = {}
+            self._bm25 = BM25Index()
+            self._thread = threading.Thread(target=self._run, name="live-index", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self.running:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+    def schedule(self, kind: str, row_id: int) -> None:
+        """Queue a row for re-indexing. A no-op until the worker has been started."""
+        if self.running:
+            self._queue.put((kind, row_id))
+
+    def search(self, query_embedding: np.ndarray, k: int) -> List[Tuple[float, int, str]]:
+        """Vector search, returning (L2 distance, id, text) tuples, closest first."""
+        with self._lock:
+            if self._index is None or self._index.ntotal == 0:
+                return []
+            distances, ids = self._index.search(query_embedding, k)
+            return [
+                (float(distance), int(faiss_id), self._texts[int(faiss_id)])
+                for distance, faiss_id in zip(distances[0], ids[0])
+                if faiss_id >= 0 and int(faiss_id) in self._texts
+            ]
+
+    def lexical_search(self, query: str, k: int, static_bm25: BM25Index) -> List[Tuple[float, str, int, Optional[str]]]:
+        """
+        BM25 search over the static chunks and live documents as one corpus, so scores of
+        both are comparable. Returns (score, source, id, text) tuples, best first; text is
+        None for static chunks, which the caller looks up in its chunk store.
+        """
+        with self._lock:
+            hits = search_combined([static_bm25, self._bm25], query, k)
+            return [
+                (score, "system", doc_id, None) if position == 0 else (score, live_kind(doc_id), doc_id, self._texts[doc_id])
+                for position, doc_id, score in hits
+            ]
+
+    def _run(self) -> None:
+        cache = EmbeddingCache()
+        try:
+            self._sync(cache, full=True)
+        except Exception:
+            logger.error("Initial live index load failed", exc_info=True)
+        while True:
+            try:
+                item = self._queue.get(timeout=LIVE_INDEX_SYNC_INTERVAL or None)
+            except queue.Empty:
+                item = "sync"
+            if item is None:
+                break
+            try:
+                if item == "sync":
+                    self._sync(cache)
+                else:
+                    self._refresh_row(cache, *item)
+            except Exception:
+                logger.error(f"Live index update failed for {item}", exc_info=True)
+        cache.close()
+
+    def _load_rows(self, db, kind: str, row_ids: Optional[List[int]] = None, since: Optional[datetime.datetime] = None):
+        from app import models
+
+        model = models.Event if kind == "event" else models.Announcement
+        query = db.query(model)
+        if row_ids is not None:
+            query = query.filter(model.id.in_(row_ids))
+        elif since is not None:
+            query = query.filter(model.updated_at >= since)
+        return query.all()
+
+    def _deleted_ids(self, db, kind: str) -> List[int]:
+        """Live ids of `kind` whose rows no longer exist (an id-only query, cheap for these tables)."""
+        from app import models
+
+        model = models.Event if kind == "event" else models.Announcement
+        code = KIND_CODES[kind]
+        with self._lock:
+            indexed = [faiss_id for faiss_id in self._texts if faiss_id >> 32 == code]
+        if not indexed:
+            return []
+        existing = {row_id for row_id, in db.query(model.id)}
+        return [faiss_id for faiss_id in indexed if faiss_id & 0xFFFFFFFF not in existing]
+
+    def _sync(self, cache: EmbeddingCache, full: bool = False) -> None:
+        from app.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            started = datetime.datetime.utcnow()
+            since = None if full else self._watermark
+            upserts, removals = [], []
+            for kind in KIND_CODES:
+                for row in self._load_rows(db, kind, since=since):
+                    self._collect(kind, row, upserts, removals)
+                # Hard deletes leave no updated_at behind, so look for missing rows instead
+                removals.extend(self._deleted_ids(db, kind))
+            self._apply(cache, upserts, removals)
+            # Overlap slightly so rows committed while we were reading are seen next time
+            self._watermark = started - datetime.timedelta(seconds=5)
+            if full or upserts or removals:
+                logger.info(f"Live index synced: {len(upserts)} upserted, {len(removals)} removed, {len(self)} total")
+        finally:
+            db.close()
+
+    def _refresh_row(self, cache: EmbeddingCache, kind: str, row_id: int) -> None:
+        from app.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            rows = self._load_rows(db, kind, row_ids=[row_id])
+            upserts, removals = [], []
+            if rows:
+                self._collect(kind, rows[0], upserts, removals)
+            else:
+                removals.append(live_id(kind, row_id))
+            self._apply(cache, upserts, removals)
+            logger.debug(f"Live index refreshed {kind} {row_id}")
+        finally:
+            db.close()
+
+    def _collect(self, kind: str, row, upserts: list, removals: list) -> None:
+        faiss_id = live_id(kind, row.id)
+        if row.archived:
+            removals.append(faiss_id)
+            return
+        text = event_document(row) if kind == "event" else announcement_document(row)
+        if self._texts.get(faiss_id) != text:
+            upserts.append((faiss_id, text))
+
+    def _apply(self, cache: EmbeddingCache, upserts: List[Tuple[int, str]], removals: List[int]) -> None:
+        vectors = None
+        if upserts:
+            hashes = [chunk_hash(text) for _, text in upserts]
+            cached = cache.get_many(self._model_id, hashes)
+            missing = [i for i, digest in enumerate(hashes) if digest not in cached]
+            if missing:
+                encoded = np.asarray(self._encode([upserts[i][1] for i in missing]), dtype="float32")
+                new_vectors = {hashes[i]: vector for i, vector in zip(missing, encoded)}
+                cache.put_many(self._model_id, new_vectors)
+                cached.update(new_vectors)
+            vectors = np.stack([cached[digest] for digest in hashes]).astype("float32")
+
+        with self._lock:
+            stale = [faiss_id for faiss_id in removals if faiss_id in self._texts]
+            stale += [faiss_id for faiss_id, _ in upserts if faiss_id in self._texts]
+            if stale:
+                self._index.remove_ids(np.array(stale, dtype="int64"))
+                for faiss_id in stale:
+                    self._texts.pop(faiss_id, None)
+                    self._bm25.remove(faiss_id)
+            if upserts:
+                self._index.add_with_ids(vectors, np.array([faiss_id for faiss_id, _ in upserts], dtype="int64"))
+                for faiss_id, text in upserts:
+                    self._texts[faiss_id] = text
+                    self._bm25.add(faiss_id, text)
+        if stale or upserts:
+            # Cached answers may describe the old version of these rows
+            answer_cache.invalidate()
+
+
+live_index = LiveIndex()
@@ -0,0 +1,288 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger("app.llm_client")
+
+# Completion provider settings. Point LLM_API_URL at a local fake server to run the
+# chat pipeline without network access.
+LLM_API_URL = os.getenv("LLM_API_URL", "https://api.together.xyz/v1/chat/completions")
+LLM_API_KEY = os.getenv("LLM_API_KEY", "d33551f1ead6362d8ad07b4787274f4007a11d64cb2ab3d5c1be2b325c8b285c")
+LLM_MODEL = os.getenv("LLM_MODEL", "mistralai/Mistral-7B-Instruct-v0.1")
+
+# Connection pool and timeout settings (seconds)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "10"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "30"))
+
+# Retry and circuit breaker settings
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "4"))
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Raised when the completion provider cannot produce an answer."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(LLMError):
+    """Raised when calls are short-circuited because the provider keeps failing."""
+
+
+class CircuitBreaker:
+    """
+    Tracks consecutive upstream failures. After `failure_threshold` failures the circuit
+    opens and calls fail fast for `reset_timeout` seconds, after which a single trial
+    call is let through (half-open). A success closes the circuit again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """Admit a call or raise CircuitOpenError. Returns True if the call is the half-open trial."""
+        state = self.state
+        if state == "open":
+            raise CircuitOpenError("Completion provider is unavailable, try again later", status_code=503)
+        if state == "half-open":
+            if self._trial_in_flight:
+                raise CircuitOpenError("Completion provider is recovering, try again later", status_code=503)
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def release(self, trial: bool) -> None:
+        """
+        Forget an abandoned call's trial; `trial` is what before_call returned for it, so
+        a call that was not the trial cannot clear another call's.
+        """
+        if trial:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"Opening LLM circuit breaker after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+
+
+class LLMClient:
+    """
+    Async client for the chat completion API. A single instance holds one pooled,
+    keep-alive HTTP connection pool and is shared by all requests in the process.
+    """
+
+    def __init__(
+        self,
+        api_url: str = LLM_API_URL,
+        api_key: str = LLM_API_KEY,
+        model: str = LLM_MODEL,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff_base: float = LLM_BACKOFF_BASE,
+        backoff_max: float = LLM_BACKOFF_MAX,
+        breaker: Optional[CircuitBreaker] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.api_url = api_url
+        self.model = model
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker(LLM_BREAKER_THRESHOLD, LLM_BREAKER_RESET)
+        self._http = http_client or httpx.AsyncClient(
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+            },
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        )
+
+    def build_payload(self, messages: List[Dict[str, str]], **params: Any) -> Dict[str, Any]:
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": 256,
+            "temperature": 0.7,
+            "do_sample": True,
+        }
+        payload.update(params)
+        return payload
+
+    def _backoff_delay(self, attempt: int) -> float:
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def complete(self, messages: List[Dict[str, str]], **params: Any) -> str:
+        """Send a chat completion request and return the answer text."""
+        trial = self.breaker.before_call()
+        payload = self.build_payload(messages, **params)
+        attempt = 0
+        try:
+            while True:
+                try:
+                    response = await self._http.post(self.api_url, json=payload)
+                    if response.status_code in RETRYABLE_STATUS_CODES:
+                        raise LLMError(
+                            f"Completion API error {response.status_code}: {response.text}",
+                            status_code=response.status_code,
+                        )
+                    if response.status_code != 200:
+                        # Client errors are not the provider's fault, so they do not trip the breaker
+                        self.breaker.record_success()
+                        raise LLMError(
+                            f"Completion API error {response.status_code}: {response.text}",
+                            status_code=response.status_code,
+                        )
+                    try:
+                        data = response.json()
+                    except ValueError as e:
+                        # A garbled body is the provider's fault: retried, then counted as a failure
+                        raise LLMError(f"Completion API returned invalid JSON: {response.text[:200]}", status_code=502) from e
+                except (httpx.TransportError, LLMError) as e:
+                    retryable = not isinstance(e, LLMError) or e.status_code in RETRYABLE_STATUS_CODES
+                    if not retryable:
+                        raise
+                    if attempt >= self.max_retries:
+                        self.breaker.record_failure()
+                        if isinstance(e, LLMError):
+                            raise
+                        raise LLMError(f"Completion API request failed: {e!r}", status_code=504) from e
+                    delay = self._backoff_delay(attempt)
+                    attempt += 1
+                    logger.warning(f"Completion API call failed ({e!r}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+                    continue
+
+                self.breaker.record_success()
+                usage = data.get("usage")
+                if usage:
+                    logger.info(f"Completion usage: {usage.get('prompt_tokens')} prompt, {usage.get('completion_tokens')} completion tokens")
+                choice = (data.get("choices") or [{}])[0]
+                return ((choice.get("message") or {}).get("content") or "").strip()
+        except BaseException:
+            # Cancelled or failed unexpectedly: never leave a half-open trial call outstanding
+            self.breaker.release(trial)
+            raise
+
+    async def stream(self, messages: List[Dict[str, str]], **params: Any) -> AsyncIterator[str]:
+        """
+        Send a streaming chat completion request and yield answer tokens as they arrive.
+
+        Failures before the first token are retried like `complete`. Once tokens have been
+        yielded the request is not retried, since the caller has already forwarded them.
+        Closing the generator (e.g. when the client disconnects) closes the upstream request.
+        """
+        trial = self.breaker.before_call()
+        payload = self.build_payload(messages, stream=True, **params)
+        attempt = 0
+        try:
+            while True:
+                started = False
+                try:
+                    async with self._http.stream("POST", self.api_url, json=payload) as response:
+                        if response.status_code != 200:
+                            body = (await response.aread()).decode("utf-8", errors="replace")
+                            if response.status_code not in RETRYABLE_STATUS_CODES:
+                                self.breaker.record_success()
+                            raise LLMError(
+                                f"Completion API error {response.status_code}: {body}",
+                                status_code=response.status_code,
+                            )
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                break
+                            try:
+                                chunk = json.loads(data)
+                            except ValueError:
+                                logger.warning(f"Skipping malformed stream chunk: {data[:200]}")
+                                continue
+                            choice = (chunk.get("choices") or [{}])[0]
+                            token = (choice.get("delta") or {}).get("content") or choice.get("text") or ""
+                            if token:
+                                started = True
+                                yield token
+                except (httpx.TransportError, LLMError) as e:
+                    retryable = not isinstance(e, LLMError) or e.status_code in RETRYABLE_STATUS_CODES
+                    if not retryable:
+                        raise
+                    if started or attempt >= self.max_retries:
+                        self.breaker.record_failure()
+                        if isinstance(e, LLMError):
+                            raise
+                        raise LLMError(f"Completion API stream failed: {e!r}", status_code=504) from e
+                    delay = self._backoff_delay(attempt)
+                    attempt += 1
+                    logger.warning(f"Completion API stream failed ({e!r}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+                    continue
+
+                self.breaker.record_success()
+                return
+        except BaseException:
+            # The caller went away (also during a backoff sleep) or the call failed: never
+            # leave a half-open trial call outstanding. The upstream request is closed by
+            # the context manager.
+            self.breaker.release(trial)
+            raise
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+
+_client: Optional[LLMClient] = None
+
+
+def get_llm_client() -> LLMClient:
+    """Return the process-wide client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = LLMClient()
+    return _client
+
+
+async def close_llm_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
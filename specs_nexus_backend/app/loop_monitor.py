@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger("app.loop_monitor")
+
+# Seconds between event loop probes (0 disables the monitor)
+LOOP_LAG_MONITOR_INTERVAL = float(os.getenv("LOOP_LAG_MONITOR_INTERVAL", "0"))
+# Probes delayed by more than this many seconds count as the loop being blocked
+LOOP_LAG_BLOCKED_THRESHOLD = float(os.getenv("LOOP_LAG_BLOCKED_THRESHOLD", "0.02"))
+
+
+class LoopLagMonitor:
+    """
+    Measures how long the event loop is blocked by synchronous work.
+
+    A probe task sleeps for `interval` seconds at a time; any time it wakes up later than
+    that is time the loop spent running something else without yielding (e.g. CPU-bound
+    embedding or FAISS search called directly from a coroutine).
+    """
+
+    def __init__(self, interval: float = 0.01, blocked_threshold: float = LOOP_LAG_BLOCKED_THRESHOLD,
+                 window: int = 10000):
+        self.interval = interval
+        self.blocked_threshold = blocked_threshold
+        self._lags = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+        self.blocked_seconds = 0.0
+        self.blocked_count = 0
+        self.max_lag = 0.0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(f"Event loop lag monitor started ({self.interval * 1000:.0f} ms probes)")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self._lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.blocked_threshold:
+                self.blocked_seconds += lag
+                self.blocked_count += 1
+
+    def reset(self) -> None:
+        self._lags.clear()
+        self.blocked_seconds = 0.0
+        self.blocked_count = 0
+        self.max_lag = 0.0
+
+    def stats(self) -> dict:
+        lags = list(self._lags)
+
+        def percentile(q):
+            return round(float(np.percentile(lags, q)) * 1000, 3) if lags else 0.0
+
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": len(lags),
+            "lag_ms": {"p50": percentile(50), "p99": percentile(99), "max": round(self.max_lag * 1000, 3)},
+            "blocked_threshold_ms": self.blocked_threshold * 1000,
+            "blocked_count": self.blocked_count,
+            "blocked_ms": round(self.blocked_seconds * 1000, 3),
+        }
+
+
+loop_monitor = LoopLagMonitor(interval=LOOP_LAG_MONITOR_INTERVAL or 0.01)
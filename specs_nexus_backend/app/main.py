@@ -1,11 +1,23 @@
+import asyncio
 import logging
 import logging.config
+import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from app.database import engine
 from app import models
-from app.routes import auth, clearance, membership, events, announcements, officers, analytics, chat
+from app.loop_monitor import LOOP_LAG_MONITOR_INTERVAL, loop_monitor
+from app.attendance import attendance_buffer
+from app.routes import auth, clearance, membership, events, announcements, officers, analytics, exports, attendance
+
+# CHAT_ENABLED=0 leaves out the chatbot entirely, so the CRUD API never imports the chat stack.
+# CHAT_WARMUP controls when the embedding model and index are loaded:
+#   "background" (default) - start loading after startup without delaying it
+#   "startup"              - load before the app starts serving
+#   "lazy"                 - load on the first chat request
+CHAT_ENABLED = os.getenv("CHAT_ENABLED", "1") == "1"
+CHAT_WARMUP = os.getenv("CHAT_WARMUP", "background")
 
 logging.config.fileConfig('app/logging.conf', disable_existing_loggers=False)
 
@@ -17,6 +29,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the frontend read the next page's cursor from paginated list responses
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
@@ -28,10 +42,54 @@ app.include_router(events.router)
 app.include_router(announcements.router)
 app.include_router(officers.router)
 app.include_router(analytics.router)
-app.include_router(chat.router)
+app.include_router(exports.router)
+app.include_router(attendance.router)
+
+if CHAT_ENABLED:
+    from app.routes import chat
+    app.include_router(chat.router)
 
 models.Base.metadata.create_all(bind=engine)
 
+@app.on_event("startup")
+async def startup():
+    if LOOP_LAG_MONITOR_INTERVAL:
+        loop_monitor.start()
+    # Writes queued check-in scans in batches
+    attendance_buffer.start()
+    if not CHAT_ENABLED or CHAT_WARMUP == "lazy":
+        return
+    from app import chat_nlp
+    if CHAT_WARMUP == "startup":
+        await asyncio.to_thread(chat_nlp.warmup)
+    else:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(None, chat_nlp.warmup)
+        # Failures are recorded on chat_nlp.resources and reported by /chat/ready
+        future.add_done_callback(lambda f: f.exception())
+
+@app.on_event("shutdown")
+async def shutdown():
+    await loop_monitor.stop()
+    # Write any scans still queued
+    await attendance_buffer.stop()
+    if CHAT_ENABLED:
+        from app import chat_nlp
+        # Stop the live index worker and embedding batcher, and release pooled
+        # keep-alive connections to the completion API
+        await chat_nlp.shutdown()
+
 @app.get("/")
 def home():
     return {"message": "Welcome to SPECS Nexus API"}
+
+# Endpoint: GET /metrics/event-loop
+# Description: Event loop lag measured by the monitor enabled with LOOP_LAG_MONITOR_INTERVAL.
+# Pass reset=true to clear the counters after reading them (e.g. between benchmark runs).
+@app.get("/metrics/event-loop")
+def event_loop_metrics(reset: bool = False):
+    stats = loop_monitor.stats()
+    stats["enabled"] = bool(LOOP_LAG_MONITOR_INTERVAL)
+    if reset:
+        loop_monitor.reset()
+    return stats
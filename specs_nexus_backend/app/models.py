@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, ForeignKey, Table, Enum, Boolean
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Float, ForeignKey, Table, Enum, Boolean, UniqueConstraint
 from sqlalchemy.orm import relationship
 from .database import Base
 import datetime
@@ -9,7 +9,8 @@ event_participants = Table(
     "event_participants",
     Base.metadata,
     Column("event_id", Integer, ForeignKey("events.id"), primary_key=True),
-    Column("user_id", Integer, ForeignKey("users.id"), primary_key=True)
+    Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
+    Column("joined_at", DateTime, default=datetime.datetime.utcnow, nullable=True)
 )
 
 class User(Base):
@@ -27,19 +28,42 @@ class User(Base):
     events_joined = relationship("Event", secondary=event_participants, back_populates="participants")
     clearance = relationship("Clearance", back_populates="user", uselist=False)
 
+class Requirement(Base):
+    """A membership requirement and its price; each member's Clearance references one (see app.requirements)."""
+    __tablename__ = "requirements"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), unique=True, nullable=False)
+    amount = Column(Float)
+    archived = Column(Boolean, default=False, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
 class Clearance(Base):
     __tablename__ = "clearances"
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    requirement = Column(Enum("1st Semester Membership", "2nd Semester Membership", name="requirement_type"), nullable=False)
+    requirement_id = Column(Integer, ForeignKey("requirements.id", name="fk_clearances_requirement_id"), nullable=False, index=True)
     status = Column(Enum("Clear", "Processing", "Not Yet Cleared", name="clearance_status"), default="Not Yet Cleared", nullable=False)
     payment_status = Column(Enum("Not Paid", "Verifying", "Paid", name="payment_status"), default="Not Paid", nullable=False)
     receipt_path = Column(String(255), nullable=True)
-    amount = Column(Float)
     archived = Column(Boolean, default=False)
     payment_method = Column(String(50), nullable=True)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, nullable=True)
     user = relationship("User", back_populates="clearance")
+    # Loaded with the clearance; there are only a handful of requirements
+    requirement_record = relationship("Requirement", lazy="joined", innerjoin=True)
+
+    @property
+    def requirement(self):
+        """The requirement's name; queries filter and group on Requirement.name instead."""
+        return self.requirement_record.name if self.requirement_record else None
+
+    @property
+    def amount(self):
+        """The requirement's current price, shared by every clearance for it."""
+        return self.requirement_record.amount if self.requirement_record else None
 
 class QRCode(Base):
     __tablename__ = "qr_codes"
@@ -60,12 +84,24 @@ class Event(Base):
     archived = Column(Boolean, default=False)
     registration_start = Column(DateTime, default=datetime.datetime.utcnow)
     registration_end = Column(DateTime, nullable=True)
+    # Maximum number of participants; None means unlimited. Further joins go to the waitlist.
+    capacity = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, index=True)
     
     participants = relationship("User", secondary=event_participants, back_populates="events_joined")
     
     @property
     def participant_count(self):
+        # Listing endpoints count participants in SQL and set the count here, so the
+        # participants collection is only loaded when nothing was preloaded
+        count = self.__dict__.get("_participant_count")
+        if count is not None:
+            return count
         return len(self.participants) if self.participants else 0
+
+    @participant_count.setter
+    def participant_count(self, value):
+        self.__dict__["_participant_count"] = value
     
     @property
     def registration_open(self):
@@ -87,6 +123,28 @@ class Event(Base):
             return "closed"
         return "open"
 
+class EventWaitlistEntry(Base):
+    """A member waiting for a seat in a full event; promoted in id (arrival) order."""
+    __tablename__ = "event_waitlist"
+    __table_args__ = (UniqueConstraint("event_id", "user_id", name="uq_event_waitlist_event_user"),)
+
+    id = Column(Integer, primary_key=True)
+    event_id = Column(Integer, ForeignKey("events.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class EventAttendance(Base):
+    """A member checked in at an event; written in batches from door scans (see app.attendance)."""
+    __tablename__ = "event_attendance"
+
+    event_id = Column(Integer, ForeignKey("events.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    checked_in_at = Column(DateTime, nullable=False)
+    # Officer who scanned the code, and whether it arrived live or from an offline queue
+    scanned_by = Column(Integer, ForeignKey("officers.id"), nullable=True)
+    source = Column(String(20), nullable=False, default="live")
+    recorded_at = Column(DateTime, default=datetime.datetime.utcnow)
+
 class Announcement(Base):
     __tablename__ = "announcements"
 
@@ -97,6 +155,7 @@ class Announcement(Base):
     location = Column(String(255), nullable=True)
     date = Column(DateTime, nullable=True)
     archived = Column(Boolean, default=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, index=True)
 
 class Officer(Base):
     __tablename__ = "officers"
@@ -109,4 +168,21 @@ class Officer(Base):
     year = Column(String(50))
     block = Column(String(50))
     position = Column(String(255))
-    archived = Column(Boolean, default=False)
\ No newline at end of file
+    archived = Column(Boolean, default=False)
+
+class AnalyticsDailyRollup(Base):
+    """Pre-aggregated daily counts behind the /analytics trend endpoints (see app.rollups)."""
+    __tablename__ = "analytics_daily_rollups"
+    __table_args__ = (
+        UniqueConstraint("day", "metric", "requirement", "payment_status", "year", "event_id", name="uq_analytics_daily_rollup"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False, index=True)
+    metric = Column(String(50), nullable=False)
+    # Unused dimensions are "" / 0 rather than NULL so the unique key matches them
+    requirement = Column(String(100), nullable=False, default="")
+    payment_status = Column(String(50), nullable=False, default="")
+    year = Column(String(50), nullable=False, default="")
+    event_id = Column(Integer, nullable=False, default=0)
+    value = Column(Integer, nullable=False, default=0)
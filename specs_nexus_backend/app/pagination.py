@@ -0,0 +1,105 @@
+import base64
+import json
+import logging
+import os
+from functools import lru_cache
+from typing import Any, Callable, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import create_model
+from sqlalchemy.orm import Query
+
+logger = logging.getLogger("app.pagination")
+
+# Largest page a client may ask for with ?limit=
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "500"))
+# Response header carrying the cursor of the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded.encode()))["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(query: Query, key_column, limit: Optional[int], cursor: Optional[str],
+             key: Callable[[Any], int] = lambda row: row.id) -> Tuple[List[Any], Optional[str]]:
+    """
+    Keyset pagination on an indexed, unique, ascending key (the primary key): the page
+    starts after the key in `cursor` and one extra row is fetched to know whether there
+    is a next page. Each page is a range scan on the key index, so its cost does not
+    grow with the table or with how far the client has paged.
+
+    Without `limit` every remaining row is returned, as the list endpoints always did.
+    """
+    if limit is not None and not 1 <= limit <= PAGE_SIZE_MAX:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {PAGE_SIZE_MAX}")
+    if cursor:
+        query = query.filter(key_column > decode_cursor(cursor))
+    query = query.order_by(key_column)
+    if limit is None:
+        return query.all(), None
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(key(rows[limit - 1]))
+    return rows, None
+
+
+def _schema_fields(schema: Type) -> dict:
+    fields = getattr(schema, "model_fields", None)
+    return fields if fields is not None else schema.__fields__
+
+
+@lru_cache(maxsize=128)
+def _sparse_schema(schema: Type, names: Tuple[str, ...]) -> Type:
+    """
+    A copy of `schema` with only the selected fields (all optional), so serializing a
+    row reads just those attributes and does not lazy-load unselected relationships.
+    """
+    fields = _schema_fields(schema)
+    if hasattr(schema, "model_fields"):
+        from pydantic import ConfigDict
+
+        definitions = {name: (fields[name].annotation, None) for name in names}
+        return create_model(f"{schema.__name__}Fields", __config__=ConfigDict(from_attributes=True), **definitions)
+    definitions = {name: (fields[name].outer_type_, None) for name in names}
+    config = type("Config", (), {"orm_mode": True})
+    return create_model(f"{schema.__name__}Fields", __config__=config, **definitions)
+
+
+def parse_fields(fields: Optional[str], schema: Type) -> Optional[List[str]]:
+    """Parse ?fields=a,b into field names of `schema`; None means all fields."""
+    if not fields:
+        return None
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    available = list(_schema_fields(schema))
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields {unknown}; available: {available}")
+    return names
+
+
+def page_response(response: Response, items: List[Any], next_cursor: Optional[str], schema: Type,
+                  fields: Optional[List[str]]):
+    """
+    Return `items` for the endpoint's response model, or, when the client selected
+    fields, a JSON response with just those fields (which the full response model
+    would reject). Either way the next page's cursor goes in the X-Next-Cursor header.
+    """
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+    if fields is None:
+        response.headers.update(headers)
+        return items
+    sparse = _sparse_schema(schema, tuple(fields))
+    validate = getattr(sparse, "model_validate", None) or sparse.from_orm
+    content = [jsonable_encoder(validate(item)) for item in items]
+    return JSONResponse(content=content, headers=headers)
@@ -0,0 +1,204 @@
+import logging
+import os
+import re
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("app.prompt_builder")
+
+# Token budget for retrieved context. Chunks are added in relevance order until the budget
+# is spent; the most relevant chunk is truncated rather than dropped if it alone is too big.
+PROMPT_CONTEXT_TOKENS = int(os.getenv("PROMPT_CONTEXT_TOKENS", "1200"))
+# Token budget for earlier turns of a chat session; the oldest turns are dropped first
+PROMPT_HISTORY_TOKENS = int(os.getenv("PROMPT_HISTORY_TOKENS", "400"))
+# Longer questions are truncated to this many tokens
+PROMPT_QUERY_TOKENS = int(os.getenv("PROMPT_QUERY_TOKENS", "256"))
+# Chunks whose word shingles overlap a more relevant chunk's by at least this much are dropped
+PROMPT_DEDUP_THRESHOLD = float(os.getenv("PROMPT_DEDUP_THRESHOLD", "0.8"))
+
+NO_ANSWER = "I'm sorry, I do not have that information."
+
+# Static part of every prompt. Sent as the system message, so it is identical byte for byte
+# across requests (which also lets providers with prefix caching reuse it).
+PREAMBLE = (
+    "You are SPECS NEXUS Assistance, a helpful chatbot that uses only the context provided below to answer questions. "
+    "SPECS info is in the context. "
+    "This is SPECS NEXUS. SPECS Nexus is a comprehensive platform designed for a student organization. It streamlines "
+    "membership registration, event participation, and announcement updates, helping members stay connected and "
+    "informed. The system makes it easy for students to manage their profiles, track their membership status, and "
+    "engage with community activities in a user-friendly environment. "
+    "The system is called SPECS NEXUS. This has 5 main pages - Dashboard, Profile, Events, Announcements, and "
+    "Memberships. "
+    f"If the context does not include the answer, respond with: \"{NO_ANSWER}\""
+)
+
+_WORD_RE = re.compile(r"\w+")
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_encoding = None
+
+
+def _get_encoding():
+    """tiktoken's cl100k_base if it is installed, otherwise None (use the estimate)."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens with tiktoken when available. Otherwise estimate: words and punctuation
+    marks, plus one extra token per 8 characters of long words (BPE splits those). The
+    provider's own count is logged by the LLM client for reconciliation.
+    """
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return sum(1 + len(token) // 8 for token in _TOKEN_RE.findall(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text)
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    used = 0
+    for match in _TOKEN_RE.finditer(text):
+        used += 1 + len(match.group()) // 8
+        if used > max_tokens:
+            return text[:match.start()].rstrip()
+    return text
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def dedupe_chunks(texts: List[str], threshold: float = PROMPT_DEDUP_THRESHOLD) -> List[str]:
+    """
+    Drop chunks that repeat a more relevant one: exact duplicates, chunks contained in
+    another, and chunks whose word 3-shingles mostly overlap. `texts` must be best first.
+    """
+    kept, kept_shingles = [], []
+    for text in texts:
+        shingles = _shingles(text)
+        duplicate = False
+        for other in kept_shingles:
+            overlap = len(shingles & other)
+            # Share of this chunk already covered, so a chunk inside a longer one is dropped
+            if shingles and overlap / len(shingles) >= threshold:
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(text)
+            kept_shingles.append(shingles)
+    return kept
+
+
+class PromptBuilder:
+    """
+    Builds the chat messages from retrieved hits within a token budget.
+
+    The preamble and its token count are computed once. Per request the retrieved
+    chunks are deduplicated, then packed in relevance order into `context_tokens`, and
+    the most recent turns of the conversation that fit in `history_tokens` are included.
+    """
+
+    def __init__(self, preamble: str = PREAMBLE, context_tokens: int = PROMPT_CONTEXT_TOKENS,
+                 query_tokens: int = PROMPT_QUERY_TOKENS, history_tokens: int = PROMPT_HISTORY_TOKENS):
+        self.preamble = preamble
+        self.context_tokens = context_tokens
+        self.query_tokens = query_tokens
+        self.history_tokens = history_tokens
+        self._preamble_tokens: Optional[int] = None
+
+    @property
+    def preamble_tokens(self) -> int:
+        if self._preamble_tokens is None:
+            self._preamble_tokens = count_tokens(self.preamble)
+        return self._preamble_tokens
+
+    def _history(self, turns: List[dict], summary: str):
+        """Return the history messages (newest turns first to fit), their tokens and turn count."""
+        messages, used = [], 0
+        for turn in reversed(turns):
+            pair = [
+                {"role": "user", "content": turn["question"]},
+                {"role": "assistant", "content": turn["answer"]},
+            ]
+            tokens = sum(count_tokens(m["content"]) for m in pair)
+            if used + tokens > self.history_tokens:
+                break
+            messages[:0] = pair
+            used += tokens
+        else:
+            # Only worth including when every verbatim turn fit
+            if summary:
+                tokens = count_tokens(summary)
+                if used + tokens <= self.history_tokens:
+                    messages.insert(0, {"role": "user", "content": f"Summary of the earlier conversation:\n{summary}"})
+                    messages.insert(1, {"role": "assistant", "content": "Understood."})
+                    used += tokens
+                    return messages, used, len(messages) // 2 - 1
+        return messages, used, len(messages) // 2
+
+    def build(self, hits: List[dict], user_query: str, turns: Optional[List[dict]] = None, summary: str = ""):
+        """
+        Return the chat messages and a usage dict with token counts and how many chunks
+        were used, dropped as duplicates or dropped for the budget. `hits` are best first;
+        `turns` and `summary` are the earlier conversation from the chat session.
+        """
+        texts = [hit["text"] for hit in hits if hit.get("text")]
+        unique = dedupe_chunks(texts)
+
+        context, used_tokens, over_budget = [], 0, 0
+        for text in unique:
+            tokens = count_tokens(text)
+            if used_tokens + tokens <= self.context_tokens:
+                context.append(text)
+                used_tokens += tokens
+            elif not context:
+                # Keep the best chunk even if it alone exceeds the budget, cut to size
+                text = truncate_tokens(text, self.context_tokens)
+                context.append(text)
+                used_tokens += count_tokens(text)
+            else:
+                over_budget += 1
+
+        query = user_query
+        query_tokens = count_tokens(query)
+        if query_tokens > self.query_tokens:
+            query = truncate_tokens(query, self.query_tokens)
+            query_tokens = count_tokens(query)
+
+        context_text = "\n\n".join(context)
+        user_content = f"Context:\n{context_text}\n\nUser Query: {query}\nAnswer:"
+        history, history_tokens, history_turns = self._history(turns or [], summary)
+        messages: List[Dict[str, str]] = [
+            {"role": "system", "content": self.preamble},
+            *history,
+            {"role": "user", "content": user_content},
+        ]
+        usage = {
+            "preamble_tokens": self.preamble_tokens,
+            "context_tokens": used_tokens,
+            "query_tokens": query_tokens,
+            "history_tokens": history_tokens,
+            "history_turns": history_turns,
+            "prompt_tokens": self.preamble_tokens + history_tokens + count_tokens(user_content),
+            "chunks_retrieved": len(texts),
+            "chunks_used": len(context),
+            "chunks_duplicate": len(texts) - len(unique),
+            "chunks_over_budget": over_budget,
+        }
+        return messages, usage
+
+
+prompt_builder = PromptBuilder()
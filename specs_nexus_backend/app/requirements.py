@@ -0,0 +1,129 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import false, func, literal, select, update
+from sqlalchemy.orm import Session
+
+from app import models, rollups
+
+logger = logging.getLogger("app.requirements")
+
+Requirement = models.Requirement
+
+
+def active(db: Session) -> List[models.Requirement]:
+    return db.query(Requirement).filter(Requirement.archived == False).order_by(Requirement.id).all()
+
+
+def find(db: Session, name: str) -> Optional[models.Requirement]:
+    """The active requirement called `name`, if any."""
+    return db.query(Requirement).filter(Requirement.name == name, Requirement.archived == False).first()
+
+
+def get_or_create(db: Session, name: str, amount: Optional[float]) -> Optional[models.Requirement]:
+    """
+    The active requirement called `name`, created at `amount` if no requirement has that
+    name. An active one keeps its price (see set_amount). Returns None if it is archived:
+    only create_for_all_members brings an archived requirement back. The caller commits.
+    """
+    requirement = db.query(Requirement).filter(Requirement.name == name).first()
+    if requirement is None:
+        requirement = Requirement(name=name, amount=amount, archived=False)
+        db.add(requirement)
+        db.flush()
+    elif requirement.archived:
+        return None
+    return requirement
+
+
+def set_amount(db: Session, name: str, amount: float) -> Optional[models.Requirement]:
+    """
+    Change an active requirement's price with one UPDATE of its catalog row; every
+    clearance reads the price from there. Returns None if there is no such requirement.
+    The caller commits.
+    """
+    updated = db.execute(
+        update(Requirement)
+        .where(Requirement.name == name, Requirement.archived == False)
+        .values(amount=amount, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    return find(db, name) if updated else None
+
+
+def archive(db: Session, name: str) -> Optional[int]:
+    """
+    Archive an active requirement and all its members' clearances, the latter with one
+    bulk UPDATE. Returns the number of clearances archived, or None if there is no such
+    requirement. The caller commits.
+    """
+    requirement = find(db, name)
+    if requirement is None:
+        return None
+    archived = db.execute(
+        update(models.Clearance)
+        .where(models.Clearance.requirement_id == requirement.id, models.Clearance.archived == False)
+        .values(archived=True, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    requirement.archived = True
+    return archived
+
+
+def create_for_all_members(db: Session, name: str, amount: float) -> Tuple[int, Dict[Optional[str], int]]:
+    """
+    Give every member without an active clearance for the requirement called `name` a
+    new unpaid one. The requirement is created at `amount` if it does not exist, and an
+    archived one is brought back at `amount`; an active one keeps its price, which only
+    set_amount changes.
+
+    Runs one INSERT ... SELECT over users per member year that skips members who already
+    have the requirement, so the cost is a few statements regardless of the number of
+    members. The counts come from each statement's rowcount, so rows inserted
+    concurrently by other requests are never counted as this call's. Records the new
+    clearances in the payment rollups and returns (number of members counted, created
+    clearances per member year). The caller commits.
+    """
+    clearance = models.Clearance
+    user = models.User
+    requirement = get_or_create(db, name, amount)
+    if requirement is None:
+        requirement = db.query(Requirement).filter(Requirement.name == name).one()
+        requirement.archived = False
+        requirement.amount = amount
+        db.flush()
+    elif requirement.amount != amount:
+        logger.info(f"Requirement '{name}' already exists and keeps its price of {requirement.amount}")
+    # NOT IN over a subquery is evaluated once, not per member like a correlated NOT EXISTS
+    # would be where clearances.user_id is not indexed
+    already = select(clearance.user_id).where(
+        clearance.requirement_id == requirement.id,
+        clearance.archived == False,
+        clearance.user_id.isnot(None),
+    )
+    now = datetime.utcnow()
+    eligible = select(
+        user.id,
+        literal(requirement.id, clearance.requirement_id.type),
+        literal("Not Paid", clearance.payment_status.type),
+        literal("Not Yet Cleared", clearance.status.type),
+        literal("", clearance.receipt_path.type),
+        false(),
+        literal(now, clearance.updated_at.type),
+    ).where(user.id.notin_(already))
+
+    # One statement per year, so each rowcount is exactly that year's new clearances
+    created_by_year = {}
+    for year, in db.query(user.year).distinct().all():
+        inserted = db.execute(clearance.__table__.insert().from_select(
+            ["user_id", "requirement_id", "payment_status", "status", "receipt_path", "archived", "updated_at"],
+            eligible.where(user.year == year if year is not None else user.year.is_(None)),
+        )).rowcount
+        if inserted:
+            created_by_year[year] = inserted
+    for year, count in created_by_year.items():
+        rollups.record(db, "payments", count, requirement=name, payment_status="Not Paid", year=year)
+    members = db.query(func.count(user.id)).scalar()
+    logger.debug(f"Created {sum(created_by_year.values())} '{name}' clearances for {members} members")
+    return members, created_by_year
@@ -0,0 +1,271 @@
+import logging
+import os
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import models
+from app.dashboard import ClearanceState
+
+logger = logging.getLogger("app.rollups")
+
+# Longest range (in days) a single trend query may cover
+ROLLUP_MAX_RANGE_DAYS = int(os.getenv("ROLLUP_MAX_RANGE_DAYS", "731"))
+
+# Metric -> the dimensions it is broken down by
+#   payments        clearances entering a payment status (created, receipt uploaded,
+#                   verified or denied); payment_status="Paid" is payments verified per day
+#   event_signups   net event joins minus leaves
+#   active_members  members who logged in that day (summed over wider buckets, so a
+#                   weekly value counts member-days, not distinct members)
+#   event_attendance
+#                   members checked in at an event (see app.attendance)
+METRICS: Dict[str, Tuple[str, ...]] = {
+    "payments": ("requirement", "payment_status", "year"),
+    "event_signups": ("event_id", "year"),
+    "active_members": ("year",),
+    "event_attendance": ("event_id", "year"),
+}
+DIMENSIONS = ("requirement", "payment_status", "year", "event_id")
+BUCKETS = ("day", "week", "month")
+
+Rollup = models.AnalyticsDailyRollup
+
+
+def _key(metric: str, day: date, dimensions: dict) -> tuple:
+    allowed = METRICS[metric]
+    unknown = set(dimensions) - set(allowed)
+    if unknown:
+        raise ValueError(f"Metric {metric} has no dimension(s) {sorted(unknown)}")
+    return (
+        day,
+        metric,
+        str(dimensions.get("requirement") or ""),
+        str(dimensions.get("payment_status") or ""),
+        str(dimensions.get("year") or ""),
+        int(dimensions.get("event_id") or 0),
+    )
+
+
+def _upsert(db: Session, key: tuple, delta: int) -> None:
+    """Add `delta` to one rollup row in the caller's transaction, creating it if needed."""
+    table = Rollup.__table__
+    values = dict(zip(("day", "metric", "requirement", "payment_status", "year", "event_id"), key), value=delta)
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+
+        statement = insert(table).values(**values).on_duplicate_key_update(value=table.c.value + delta)
+    elif dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(table).values(**values).on_conflict_do_update(
+            index_elements=["day", "metric", "requirement", "payment_status", "year", "event_id"],
+            set_={"value": table.c.value + delta},
+        )
+    else:
+        updated = db.execute(
+            table.update()
+            .where(*(table.c[name] == values[name] for name in values if name != "value"))
+            .values(value=table.c.value + delta)
+        )
+        if updated.rowcount:
+            return
+        statement = table.insert().values(**values)
+    db.execute(statement)
+
+
+def record_counts(db: Session, counts: Counter) -> None:
+    """Apply a Counter of rollup key -> delta, one upsert per key. The caller commits."""
+    for key, delta in sorted(counts.items()):
+        if delta:
+            _upsert(db, key, delta)
+
+
+def record(db: Session, metric: str, delta: int = 1, day: Optional[date] = None, **dimensions) -> None:
+    """Add `delta` to today's (or `day`'s) value of `metric`. The caller commits."""
+    record_counts(db, Counter({_key(metric, day or datetime.utcnow().date(), dimensions): delta}))
+
+
+def record_occurrences(db: Session, metric: str, occurrences: Iterable[Tuple[date, dict]]) -> None:
+    """Count one `metric` per (day, dimensions) pair, one upsert per distinct key. The caller commits."""
+    record_counts(db, Counter(_key(metric, day, dimensions) for day, dimensions in occurrences))
+
+
+def record_clearance_changes(db: Session, changes: Iterable[Tuple[Optional[ClearanceState], Optional[ClearanceState]]],
+                             day: Optional[date] = None) -> None:
+    """Count clearances whose payment status changed (or that were created) in `changes`."""
+    day = day or datetime.utcnow().date()
+    counts = Counter()
+    for before, after in changes:
+        if after is None or after.archived:
+            continue
+        if before is None or before.archived or before.payment_status != after.payment_status:
+            counts[_key("payments", day, {
+                "requirement": after.requirement, "payment_status": after.payment_status, "year": after.year,
+            })] += 1
+    record_counts(db, counts)
+
+
+def _bucket_start(day: date, bucket: str) -> date:
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _bucket_starts(start: date, end: date, bucket: str) -> List[date]:
+    starts, current = [], _bucket_start(start, bucket)
+    while current <= end:
+        starts.append(current)
+        if bucket == "day":
+            current += timedelta(days=1)
+        elif bucket == "week":
+            current += timedelta(days=7)
+        else:
+            current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return starts
+
+
+def query_series(db: Session, metric: str, start: date, end: date, bucket: str = "day",
+                 group_by: Optional[str] = None, filters: Optional[dict] = None) -> dict:
+    """
+    Return `metric` summed per bucket (day, week starting Monday, or month) between
+    `start` and `end` inclusive, optionally split by one dimension and filtered by
+    others. Reads only the rollup table; empty buckets are filled with zeros.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric}; expected one of {sorted(METRICS)}")
+    if bucket not in BUCKETS:
+        raise ValueError(f"Unknown bucket {bucket}; expected one of {list(BUCKETS)}")
+    if end < start:
+        raise ValueError("end must not be before start")
+    if (end - start).days + 1 > ROLLUP_MAX_RANGE_DAYS:
+        raise ValueError(f"Range is longer than {ROLLUP_MAX_RANGE_DAYS} days")
+    filters = {name: value for name, value in (filters or {}).items() if value is not None}
+    for name in [group_by, *filters]:
+        if name is not None and name not in METRICS[metric]:
+            raise ValueError(f"Metric {metric} can only be grouped or filtered by {list(METRICS[metric])}")
+
+    columns = [Rollup.day] + ([getattr(Rollup, group_by)] if group_by else [])
+    query = db.query(*columns, func.sum(Rollup.value))\
+        .filter(Rollup.metric == metric, Rollup.day >= start, Rollup.day <= end)
+    for name, value in filters.items():
+        query = query.filter(getattr(Rollup, name) == (int(value) if name == "event_id" else str(value)))
+    rows = query.group_by(*columns).all()
+
+    totals: Dict[object, Counter] = {}
+    for row in rows:
+        day, group, value = (row[0], row[1], row[2]) if group_by else (row[0], None, row[1])
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        totals.setdefault(group, Counter())[_bucket_start(day, bucket)] += int(value or 0)
+    if not totals:
+        totals[None] = Counter()
+
+    starts = _bucket_starts(start, end, bucket)
+    series = []
+    for group in sorted(totals, key=lambda g: (g is None, str(g))):
+        points = [{"bucket": s.isoformat(), "value": totals[group][s]} for s in starts]
+        entry = {"points": points, "total": sum(p["value"] for p in points)}
+        if group_by:
+            entry[group_by] = group if group != "" else None
+        series.append(entry)
+    return {
+        "metric": metric,
+        "bucket": bucket,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "group_by": group_by,
+        "series": series,
+    }
+
+
+def rebuild(db: Session, start: date, end: date, metrics: Optional[Iterable[str]] = None,
+            overwrite: bool = True) -> Dict[str, int]:
+    """
+    Recompute the rollups of `metrics` between `start` and `end` from the source tables,
+    replacing what is there. With `overwrite=False` days that already have rows for a
+    metric are left alone, so the live history recorded since rollups went in is kept.
+    Returns the number of rows written per metric. The caller commits.
+
+    History is only as good as the timestamps the tables keep: a clearance contributes
+    its current payment status on the day it was last updated, a participant whose
+    joined_at predates the column falls back to the event's registration start (or date),
+    a member counts as active on the day of their last login, and a check-in on the day
+    it was scanned.
+    """
+    metrics = list(metrics or METRICS)
+    for metric in metrics:
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric}")
+    low = datetime.combine(start, datetime.min.time())
+    high = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    written = {}
+    for metric in metrics:
+        existing = db.query(Rollup).filter(Rollup.metric == metric, Rollup.day >= start, Rollup.day <= end)
+        if overwrite:
+            existing.delete(synchronize_session=False)
+            keep_days = set()
+        else:
+            keep_days = {day for day, in existing.with_entities(Rollup.day).distinct()}
+        if metric == "payments":
+            clearance = models.Clearance
+            requirement = models.Requirement
+            when = clearance.updated_at
+            rows = db.query(func.date(when), requirement.name, clearance.payment_status, models.User.year,
+                            func.count(clearance.id))\
+                .join(requirement, clearance.requirement_id == requirement.id)\
+                .outerjoin(models.User, clearance.user_id == models.User.id)\
+                .filter(clearance.archived == False, when >= low, when < high)\
+                .group_by(func.date(when), requirement.name, clearance.payment_status, models.User.year)\
+                .all()
+            keyed = [(day, {"requirement": r, "payment_status": p, "year": y}, n) for day, r, p, y, n in rows]
+        elif metric == "event_signups":
+            participants = models.event_participants
+            when = func.coalesce(participants.c.joined_at, models.Event.registration_start, models.Event.date)
+            rows = db.query(func.date(when), participants.c.event_id, models.User.year, func.count())\
+                .select_from(participants)\
+                .join(models.Event, participants.c.event_id == models.Event.id)\
+                .outerjoin(models.User, participants.c.user_id == models.User.id)\
+                .filter(when >= low, when < high)\
+                .group_by(func.date(when), participants.c.event_id, models.User.year)\
+                .all()
+            keyed = [(day, {"event_id": e, "year": y}, n) for day, e, y, n in rows]
+        elif metric == "event_attendance":
+            attendance = models.EventAttendance
+            when = attendance.checked_in_at
+            rows = db.query(func.date(when), attendance.event_id, models.User.year, func.count())\
+                .outerjoin(models.User, attendance.user_id == models.User.id)\
+                .filter(when >= low, when < high)\
+                .group_by(func.date(when), attendance.event_id, models.User.year)\
+                .all()
+            keyed = [(day, {"event_id": e, "year": y}, n) for day, e, y, n in rows]
+        else:
+            when = models.User.last_active
+            rows = db.query(func.date(when), models.User.year, func.count(models.User.id))\
+                .filter(when >= low, when < high)\
+                .group_by(func.date(when), models.User.year)\
+                .all()
+            keyed = [(day, {"year": y}, n) for day, y, n in rows]
+
+        counts = Counter()
+        for day, dimensions, count in keyed:
+            if isinstance(day, str):
+                day = date.fromisoformat(day)
+            if day in keep_days:
+                continue
+            counts[_key(metric, day, dimensions)] += count
+        db.bulk_insert_mappings(Rollup, [
+            dict(zip(("day", "metric", "requirement", "payment_status", "year", "event_id"), key), value=value)
+            for key, value in counts.items()
+        ])
+        written[metric] = len(counts)
+        logger.info(f"Rebuilt {len(counts)} {metric} rollup rows for {start} to {end}")
+    return written
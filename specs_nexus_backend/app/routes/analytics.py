@@ -1,13 +1,13 @@
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, Any
+from datetime import date, datetime, timedelta
+from typing import Optional
 
-from fastapi import APIRouter, Depends
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 
 from app.database import SessionLocal
-from app import models, schemas
+from app.analytics_snapshot import analytics_snapshot
+from app import rollups
 
 logger = logging.getLogger("app.analytics")
 
@@ -27,158 +27,45 @@ def get_db():
 # - Payment analytics: details on payment statuses and popular payment methods.
 # - Event engagement: details on events, participation rates, and popular events.
 # - Clearance tracking: status breakdown by requirement and user year.
+# The data comes from the incrementally maintained snapshot (see app.analytics_snapshot)
+# and carries an ETag; a matching If-None-Match gets 304 Not Modified without a body.
 @router.get("/dashboard", response_model=dict)
-def get_dashboard_data(db: Session = Depends(get_db)) -> Dict[str, Any]:
-    logger.debug("Starting dashboard data aggregation")
-    
-    # Count distinct users with a clearance record marked as "Paid"
-    total_paid_members = db.query(models.Clearance.user_id).filter(
-        models.Clearance.archived == False,
-        models.Clearance.payment_status == "Paid"
-    ).distinct().count()
-    logger.debug(f"Total paid members: {total_paid_members}")
+def get_dashboard_data(request: Request, db: Session = Depends(get_db)) -> Response:
+    body, etag = analytics_snapshot.get(db)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in (tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")):
+        logger.debug("Dashboard data not modified")
+        return Response(status_code=304, headers=headers)
+    logger.info("Dashboard data served from the analytics snapshot")
+    return Response(content=body, media_type="application/json", headers=headers)
 
-    # Count distinct paid members per membership requirement
-    members_by_requirement_raw = db.query(
-        models.Clearance.requirement,
-        func.count(func.distinct(models.Clearance.user_id))
-    ).filter(
-        models.Clearance.archived == False,
-        models.Clearance.payment_status == "Paid"
-    ).group_by(models.Clearance.requirement).all()
-    members_by_requirement = {req: count for req, count in members_by_requirement_raw}
-    logger.debug(f"Members by requirement: {members_by_requirement}")
-
-    # Active members are those whose last activity was within the past 30 days
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-    active_members = db.query(models.User.id).join(models.Clearance, models.Clearance.user_id == models.User.id).filter(
-        models.Clearance.archived == False,
-        models.Clearance.payment_status == "Paid",
-        models.User.last_active >= thirty_days_ago
-    ).distinct().count()
-    inactive_members = total_paid_members - active_members
-    logger.debug(f"Active members: {active_members}, Inactive members: {inactive_members}")
-
-    # Get counts for each payment status
-    not_paid_count = db.query(models.Clearance).filter(
-        models.Clearance.archived == False, 
-        models.Clearance.payment_status == "Not Paid"
-    ).count()
-    verifying_count = db.query(models.Clearance).filter(
-        models.Clearance.archived == False, 
-        models.Clearance.payment_status == "Verifying"
-    ).count()
-    paid_count = db.query(models.Clearance).filter(
-        models.Clearance.archived == False, 
-        models.Clearance.payment_status == "Paid"
-    ).count()
-    logger.debug(f"Payment Analytics - Not Paid: {not_paid_count}, Verifying: {verifying_count}, Paid: {paid_count}")
-    
-    # Count how many times each payment method is used (ignoring nulls)
-    payment_methods = db.query(
-        models.Clearance.payment_method, 
-        func.count(models.Clearance.id)
-    ).filter(
-        models.Clearance.archived == False,
-        models.Clearance.payment_method.isnot(None)
-    ).group_by(models.Clearance.payment_method).all()
-    preferred_payment_methods = [{"method": method, "count": count} for method, count in payment_methods]
-    logger.debug(f"Preferred payment methods: {preferred_payment_methods}")
-
-    # Get payment details grouped by requirement and user's year
-    payment_by_req_year_raw = db.query(
-        models.User.year,
-        models.Clearance.requirement,
-        models.Clearance.payment_status,
-        func.count(models.Clearance.id)
-    ).join(models.Clearance, models.Clearance.user_id == models.User.id)\
-     .filter(models.Clearance.archived == False)\
-     .group_by(models.User.year, models.Clearance.requirement, models.Clearance.payment_status)\
-     .all()
-    
-    byRequirementAndYear = {}
-    for user_year, requirement, payment_status, count in payment_by_req_year_raw:
-        if not user_year:
-            user_year = "Unspecified"
-        if requirement not in byRequirementAndYear:
-            byRequirementAndYear[requirement] = {}
-        if user_year not in byRequirementAndYear[requirement]:
-            byRequirementAndYear[requirement][user_year] = {"Not Paid": 0, "Verifying": 0, "Paid": 0}
-        byRequirementAndYear[requirement][user_year][payment_status] = count
-    logger.debug(f"Payment details by requirement and year: {byRequirementAndYear}")
-
-    # Get event details and calculate participation rates
-    events = db.query(models.Event).filter(models.Event.archived == False).all()
-    events_engagement = []
-    events_by_year = {}
-    for event in events:
-        event_year = event.date.year if event.date else "Unknown"
-        engagement = {
-            "title": event.title,
-            "participant_count": event.participant_count,
-            "participation_rate": round((event.participant_count / total_paid_members)*100, 2) if total_paid_members > 0 else 0
-        }
-        events_engagement.append(engagement)
-        if event_year not in events_by_year:
-            events_by_year[event_year] = []
-        events_by_year[event_year].append(engagement)
-    popular_events = sorted(events_engagement, key=lambda x: x["participant_count"], reverse=True)
-    logger.debug(f"Event engagement: {events_engagement}")
-
-    # Group clearance records by requirement and status
-    clearance_by_requirement_raw = db.query(
-        models.Clearance.requirement,
-        models.Clearance.status,
-        func.count(models.Clearance.id)
-    ).filter(models.Clearance.archived == False)\
-     .group_by(models.Clearance.requirement, models.Clearance.status)\
-     .all()
-    clearance_tracking = {}
-    for requirement, status, count in clearance_by_requirement_raw:
-        if requirement not in clearance_tracking:
-            clearance_tracking[requirement] = {}
-        clearance_tracking[requirement][status] = count
-    logger.debug(f"Clearance tracking: {clearance_tracking}")
-
-    # Group clearance statuses by user's year for compliance data
-    compliance_by_year = db.query(
-        models.User.year,
-        models.Clearance.status,
-        func.count(models.Clearance.id)
-    ).join(models.Clearance, models.Clearance.user_id == models.User.id)\
-     .filter(models.Clearance.archived == False)\
-     .group_by(models.User.year, models.Clearance.status).all()
-    
-    compliance = {}
-    for year, status, count in compliance_by_year:
-        year = year or "Unspecified"
-        if year not in compliance:
-            compliance[year] = {}
-        compliance[year][status] = count
-    logger.debug(f"Compliance by year: {compliance}")
-
-    logger.info("Dashboard data aggregated successfully")
-    return {
-        "membershipInsights": {
-            "totalPaidMembers": total_paid_members,
-            "activeMembers": active_members,
-            "inactiveMembers": inactive_members,
-            "membersByRequirement": members_by_requirement
-        },
-        "paymentAnalytics": {
-            "byRequirementAndYear": byRequirementAndYear,
-            "notPaid": not_paid_count,
-            "verifying": verifying_count,
-            "paid": paid_count,
-            "preferredPaymentMethods": preferred_payment_methods
-        },
-        "eventsEngagement": {
-            "events": events_engagement,
-            "popularEvents": popular_events,
-            "breakdownByYear": events_by_year
-        },
-        "clearanceTracking": {
-            "byRequirement": clearance_tracking,
-            "complianceByYear": compliance
-        }
-    }
+# Endpoint: GET /analytics/trends/{metric}
+# Description: Time series of a rollup metric ("payments", "event_signups" or "active_members")
+# between start and end (inclusive, default the last 30 days), summed per day, week or month.
+# Optionally split by one dimension (group_by) and filtered by requirement, payment_status,
+# year or event_id. Reads only the daily rollup table, see app.rollups.
+@router.get("/trends/{metric}", response_model=dict)
+def get_trend(
+    metric: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    bucket: str = "day",
+    group_by: Optional[str] = None,
+    requirement: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    year: Optional[str] = None,
+    event_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=29)
+    filters = {"requirement": requirement, "payment_status": payment_status, "year": year, "event_id": event_id}
+    if metric not in rollups.METRICS:
+        raise HTTPException(status_code=404, detail=f"Unknown metric {metric}")
+    try:
+        data = rollups.query_series(db, metric, start, end, bucket, group_by, filters)
+    except ValueError as e:
+        logger.error(f"Invalid trend query for {metric}: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"Trend {metric} from {start} to {end} by {bucket} served")
+    return data
@@ -1,13 +1,15 @@
 import logging
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Response
 from sqlalchemy.orm import Session
 from datetime import datetime
 import os, shutil
-from typing import List
+from typing import List, Optional
 
 from app.database import SessionLocal
 from app import models, schemas
+from app.live_index import live_index
 from app.auth_utils import get_current_user, get_current_officer
+from app.pagination import page_response, paginate, parse_fields
 
 logger = logging.getLogger("app.announcements")
 
@@ -23,15 +25,29 @@ def get_db():
 
 # Endpoint: GET /announcements/
 # Description: Returns a list of non-archived announcements for a logged-in user.
+# Optional: date_from/date_to filter on the announcement date, limit/cursor page through the
+# announcements in id order (next cursor in X-Next-Cursor), and fields=a,b returns only those fields.
 @router.get("/", response_model=List[schemas.AnnouncementSchema])
 def get_announcements(
+    response: Response,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     logger.debug(f"User {current_user.id} ({current_user.full_name}) fetching non-archived announcements")
-    announcements = db.query(models.Announcement).filter(models.Announcement.archived == False).all()
+    selected = parse_fields(fields, schemas.AnnouncementSchema)
+    query = db.query(models.Announcement).filter(models.Announcement.archived == False)
+    if date_from:
+        query = query.filter(models.Announcement.date >= date_from)
+    if date_to:
+        query = query.filter(models.Announcement.date <= date_to)
+    announcements, next_cursor = paginate(query, models.Announcement.id, limit, cursor)
     logger.info(f"User {current_user.id} fetched {len(announcements)} announcements")
-    return announcements
+    return page_response(response, announcements, next_cursor, schemas.AnnouncementSchema, selected)
 
 
 # Officer Endpoints for Announcements
@@ -71,6 +87,7 @@ async def admin_create_announcement(
     db.add(new_announcement)
     db.commit()
     db.refresh(new_announcement)
+    live_index.schedule("announcement", new_announcement.id)
     logger.info(f"Officer {current_officer.id} created announcement successfully with id: {new_announcement.id}")
     return new_announcement
 
@@ -108,6 +125,7 @@ async def admin_update_announcement(
     announcement.location = location
     db.commit()
     db.refresh(announcement)
+    live_index.schedule("announcement", announcement.id)
     logger.info(f"Announcement {announcement_id} updated successfully by Officer {current_officer.id}")
     return announcement
 
@@ -126,5 +144,6 @@ def admin_delete_announcement(
         raise HTTPException(status_code=404, detail="Announcement not found")
     announcement.archived = True
     db.commit()
+    live_index.schedule("announcement", announcement.id)
     logger.info(f"Announcement {announcement_id} archived successfully by Officer {current_officer.id}")
     return {"detail": "Announcement archived successfully"}
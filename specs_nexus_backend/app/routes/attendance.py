@@ -0,0 +1,107 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app import models, schemas
+from app.attendance import CHECKIN_TOKEN_VALID_HOURS, InvalidToken, attendance_buffer, issue_token, verify_token
+from app.auth_utils import get_current_user, get_current_officer
+
+logger = logging.getLogger("app.attendance")
+
+router = APIRouter(prefix="/attendance", tags=["Attendance"])
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def _check_scan(token: str, event_id: int, now: float) -> schemas.ScanResult:
+    try:
+        token_event_id, user_id = verify_token(token, now=now)
+    except InvalidToken as e:
+        return schemas.ScanResult(status=e.reason)
+    if token_event_id != event_id:
+        return schemas.ScanResult(status="wrong_event", user_id=user_id)
+    return schemas.ScanResult(status="accepted", user_id=user_id)
+
+# Endpoint: GET /attendance/events/{event_id}/token
+# Description: Issues the current user's signed check-in code for an event they joined.
+# The frontend renders it as a QR code; scanning it needs no lookup.
+@router.get("/events/{event_id}/token", response_model=schemas.CheckinTokenResponse)
+def get_checkin_token(event_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    event = db.query(models.Event).filter(models.Event.id == event_id, models.Event.archived == False).first()
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    participants = models.event_participants
+    joined = db.query(participants.c.user_id)\
+        .filter(participants.c.event_id == event_id, participants.c.user_id == current_user.id)\
+        .first()
+    if joined is None:
+        raise HTTPException(status_code=403, detail="You are not registered for this event")
+    now = datetime.utcnow()
+    expires_at = max(event.date or now, now) + timedelta(hours=CHECKIN_TOKEN_VALID_HOURS)
+    return {"event_id": event_id, "token": issue_token(event_id, current_user.id, expires_at), "expires_at": expires_at}
+
+# Endpoint: POST /attendance/events/{event_id}/scan
+# Description: Checks in the members whose codes were scanned at the door. Tokens are
+# verified from their signature alone and queued; the queue is written in batches.
+# Members already checked in are skipped when the batch is written.
+@router.post("/events/{event_id}/scan", response_model=schemas.ScanResponse)
+def scan_checkins(event_id: int, request: schemas.ScanRequest, officer: models.Officer = Depends(get_current_officer)):
+    now = datetime.utcnow()
+    results = []
+    for token in request.tokens:
+        result = _check_scan(token, event_id, now.replace(tzinfo=timezone.utc).timestamp())
+        if result.status == "accepted" and not attendance_buffer.add(event_id, result.user_id, now, officer.id):
+            result.status = "duplicate"
+        results.append(result)
+    accepted = sum(1 for result in results if result.status == "accepted")
+    logger.debug(f"Officer {officer.id} scanned {len(results)} codes for event {event_id}, {accepted} accepted")
+    return {"accepted": accepted, "results": results}
+
+# Endpoint: POST /attendance/events/{event_id}/sync
+# Description: Uploads scans a device queued while offline. Each scan is checked against
+# the time it was made (future times are clamped to now), and the batch is written
+# before responding so the device can drop its queue.
+@router.post("/events/{event_id}/sync", response_model=schemas.ScanResponse)
+def sync_checkins(event_id: int, request: schemas.AttendanceSyncRequest, officer: models.Officer = Depends(get_current_officer)):
+    now = datetime.utcnow()
+    results = []
+    for scan in request.scans:
+        scanned_at = scan.scanned_at
+        if scanned_at.tzinfo is not None:
+            scanned_at = scanned_at.astimezone(timezone.utc).replace(tzinfo=None)
+        scanned_at = min(scanned_at, now)
+        result = _check_scan(scan.token, event_id, scanned_at.replace(tzinfo=timezone.utc).timestamp())
+        if result.status == "accepted" and not attendance_buffer.add(event_id, result.user_id, scanned_at, officer.id, source="offline"):
+            result.status = "duplicate"
+        results.append(result)
+    attendance_buffer.flush()
+    if attendance_buffer.pending(event_id):
+        raise HTTPException(status_code=503, detail="Could not save the scans; please sync again")
+    accepted = sum(1 for result in results if result.status == "accepted")
+    logger.info(f"Officer {officer.id} synced {len(results)} offline scans for event {event_id}, {accepted} accepted")
+    return {"accepted": accepted, "results": results}
+
+# Endpoint: GET /attendance/events/{event_id}
+# Description: Registered, checked-in and still-queued counts for an event.
+@router.get("/events/{event_id}", response_model=schemas.AttendanceSummary)
+def attendance_summary(event_id: int, db: Session = Depends(get_db), officer: models.Officer = Depends(get_current_officer)):
+    if not db.query(models.Event.id).filter(models.Event.id == event_id).first():
+        raise HTTPException(status_code=404, detail="Event not found")
+    participants = models.event_participants
+    registered = db.query(func.count()).select_from(participants).filter(participants.c.event_id == event_id).scalar()
+    checked_in = db.query(func.count()).select_from(models.EventAttendance)\
+        .filter(models.EventAttendance.event_id == event_id).scalar()
+    return {
+        "event_id": event_id,
+        "registered": registered,
+        "checked_in": checked_in,
+        "pending": attendance_buffer.pending(event_id),
+    }
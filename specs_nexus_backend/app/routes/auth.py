@@ -5,7 +5,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from app.database import SessionLocal
-from app import models, schemas, auth_utils
+from app import models, schemas, auth_utils, rollups
 from app.auth_utils import create_access_token, get_current_user
 
 logger = logging.getLogger("app.auth")
@@ -42,7 +42,11 @@ def login(user_login: schemas.UserLogin, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Invalid credentials")
     
     philippine_tz = timezone(timedelta(hours=8))
+    previous_active = db_user.last_active
     db_user.last_active = datetime.now(philippine_tz)
+    # Count each member once per day in the active members trend
+    if previous_active is None or previous_active.date() != db_user.last_active.date():
+        rollups.record(db, "active_members", 1, day=db_user.last_active.date(), year=db_user.year)
     db.commit()
     logger.info(f"User {db_user.id} ({db_user.full_name}) logged in; last_active updated")
     
@@ -1,22 +1,184 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import json
+import time
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from app.chat_nlp import get_chat_response
+from typing import Optional
+from app import models
+from app.answer_cache import answer_cache
+from app.auth_utils import get_current_officer
+from app import chat_nlp
+from app.chat_nlp import get_chat_response, get_embedding_service, reload_index, resources, stream_chat_response
+from app.llm_client import CircuitOpenError, LLMError
+from app.prompt_builder import prompt_builder
+from app.vector_store import IndexArtifactError
+from app.chat_sessions import ChatSession, get_session_store, new_session_id, valid_session_id
+import logging
 import traceback
 
+logger = logging.getLogger("app.chat")
+
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
 class ChatRequest(BaseModel):
     message: str
+    # Omit to start a new conversation; send back the returned id for follow-up questions
+    session_id: Optional[str] = None
 
 class ChatResponse(BaseModel):
     response: str
+    session_id: Optional[str] = None
+
+async def resolve_session(session_id: Optional[str]) -> ChatSession:
+    if session_id is None:
+        return ChatSession(new_session_id())
+    if not valid_session_id(session_id):
+        raise HTTPException(status_code=400, detail="Invalid session id")
+    # An expired or evicted session continues as a fresh conversation under the same id
+    session = await asyncio.to_thread(get_session_store().get, session_id)
+    return session or ChatSession(session_id)
+
+def server_timing(timings: dict) -> str:
+    """Format stage timings (seconds) as a Server-Timing header value."""
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+def sse_event(data: dict, event: str = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
 
+# Endpoint: POST /chat/
+# Description: Answers a question from the knowledge base. Time spent embedding the query,
+# retrieving context and waiting for the LLM is reported in the Server-Timing header.
 @router.post("/", response_model=ChatResponse)
-async def chat_endpoint(chat_request: ChatRequest):
+async def chat_endpoint(chat_request: ChatRequest, response: Response):
+    session = await resolve_session(chat_request.session_id)
+    timings = chat_nlp.start_stage_timings()
+    started = time.perf_counter()
     try:
         user_message = chat_request.message.strip()
-        response_text = get_chat_response(user_message)
-        return ChatResponse(response=response_text)
+        response_text = await get_chat_response(user_message, session)
+        timings["total"] = time.perf_counter() - started
+        response.headers["Server-Timing"] = server_timing(timings)
+        return ChatResponse(response=response_text, session_id=session.session_id)
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except LLMError as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=502, detail=f"Error processing request: {str(e)}")
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
+
+# Endpoint: POST /chat/stream
+# Description: Same as POST /chat/ but streams the answer as Server-Sent Events.
+# Each token is sent as `data: {"token": "..."}`, followed by an `event: done` message carrying
+# the session id (also sent in the X-Chat-Session-Id header) and the stage timings.
+# Errors after the stream has started are reported as an `event: error` message.
+@router.post("/stream")
+async def chat_stream_endpoint(chat_request: ChatRequest, request: Request):
+    user_message = chat_request.message.strip()
+    session = await resolve_session(chat_request.session_id)
+
+    async def event_stream():
+        timings = chat_nlp.start_stage_timings()
+        started = time.perf_counter()
+        tokens = stream_chat_response(user_message, session)
+        try:
+            async for token in tokens:
+                if await request.is_disconnected():
+                    logger.info("Chat client disconnected, cancelling upstream stream")
+                    break
+                yield sse_event({"token": token})
+            else:
+                timings["total"] = time.perf_counter() - started
+                yield sse_event({
+                    "session_id": session.session_id,
+                    "timings_ms": {name: round(seconds * 1000, 1) for name, seconds in timings.items()},
+                }, event="done")
+        except CircuitOpenError as e:
+            yield sse_event({"detail": str(e), "status_code": 503}, event="error")
+        except Exception as e:
+            traceback.print_exc()
+            yield sse_event({"detail": f"Error processing request: {str(e)}"}, event="error")
+        finally:
+            # Closing the generator closes the upstream HTTP request
+            await tokens.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Chat-Session-Id": session.session_id},
+    )
+
+# Endpoint: POST /chat/retrieve
+# Description: Runs retrieval only and returns each hit with its vector distance, BM25 score
+# and fused score, for tuning the RETRIEVAL_* thresholds, plus the token counts of the prompt
+# that would be sent. No LLM call is made.
+@router.post("/retrieve", response_model=dict)
+async def chat_retrieve_endpoint(chat_request: ChatRequest):
+    user_message = chat_request.message.strip()
+    query_embedding = await chat_nlp.embed_query(user_message)
+    hits = await asyncio.to_thread(chat_nlp.retrieve, user_message, query_embedding)
+    _, prompt_usage = prompt_builder.build(hits, user_message)
+    return {
+        "relevant": bool(hits),
+        "hits": hits,
+        "prompt_usage": prompt_usage if hits else None,
+        "thresholds": {
+            "max_distance": chat_nlp.RETRIEVAL_MAX_DISTANCE,
+            "min_bm25": chat_nlp.RETRIEVAL_MIN_BM25,
+        },
+    }
+
+# Endpoint: GET /chat/ready
+# Description: Readiness probe for the chat subsystem. Returns 503 until the embedding model
+# and FAISS index have been loaded (by warmup or the first chat request).
+@router.get("/ready", response_model=dict)
+def chat_ready():
+    status = resources.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+# Endpoint: GET /chat/cache/stats
+# Description: Returns hit/miss counters and size of the semantic answer cache.
+@router.get("/cache/stats", response_model=dict)
+def answer_cache_stats():
+    return answer_cache.stats()
+
+# Endpoint: GET /chat/embedding/stats
+# Description: Returns batch-size and queue-wait metrics of the micro-batching query encoder
+# and hit-rate and eviction counters of the shared query embedding cache.
+@router.get("/embedding/stats", response_model=dict)
+def embedding_stats():
+    stats = get_embedding_service().stats()
+    stats["cache"] = chat_nlp.get_query_cache().stats()
+    return stats
+
+# Endpoint: DELETE /chat/sessions/{session_id}
+# Description: Forgets a conversation, e.g. when the user starts over.
+@router.delete("/sessions/{session_id}", response_model=dict)
+def delete_chat_session(session_id: str):
+    if not valid_session_id(session_id):
+        raise HTTPException(status_code=400, detail="Invalid session id")
+    get_session_store().delete(session_id)
+    return {"detail": "Chat session deleted"}
+
+# Endpoint: GET /chat/sessions/stats
+# Description: Returns the size, eviction and expiry counters of the chat session store.
+@router.get("/sessions/stats", response_model=dict)
+def chat_session_stats():
+    return get_session_store().stats()
+
+# Endpoint: POST /chat/reload
+# Description: Allows an officer to reload the FAISS index after it was rebuilt with build_index.py.
+# Cached answers produced from the old index are discarded.
+@router.post("/reload", response_model=dict)
+def reload_chat_index(current_officer: models.Officer = Depends(get_current_officer)):
+    logger.debug(f"Officer {current_officer.id} reloading the chat index")
+    try:
+        document_count = reload_index()
+    except IndexArtifactError as e:
+        logger.error(f"Officer {current_officer.id} reload rejected: {e}")
+        raise HTTPException(status_code=409, detail=f"Index not reloaded: {e}")
+    logger.info(f"Officer {current_officer.id} reloaded the chat index ({document_count} documents)")
+    return {"detail": "Chat index reloaded", "documents": document_count}
@@ -3,11 +3,16 @@ from datetime import datetime
 import os
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Response
+from sqlalchemy import false, func, select
+from sqlalchemy.orm import Query, Session
 
 from app.database import SessionLocal
 from app import models, schemas
+from app.live_index import live_index
+from app.analytics_snapshot import analytics_snapshot
+from app.pagination import page_response, paginate, parse_fields
+from app import event_registration
 from app.auth_utils import get_current_user, get_current_officer  # Import both user and officer dependencies
 
 logger = logging.getLogger("app.events")
@@ -21,23 +26,79 @@ def get_db():
     finally:
         db.close()
 
+def events_with_counts(db: Session, user_id: Optional[int] = None) -> Query:
+    """
+    Active events with their participant count and, when `user_id` is given, whether
+    that user participates, as (Event, count, is_participant) rows from one query. The
+    counts come from a GROUP BY over event_participants instead of loading every
+    event's participants collection.
+    """
+    participants = models.event_participants
+    counts = select(participants.c.event_id, func.count().label("participant_count"))\
+        .group_by(participants.c.event_id)\
+        .subquery()
+    if user_id is None:
+        query = db.query(models.Event, func.coalesce(counts.c.participant_count, 0), false())
+    else:
+        mine = select(participants.c.event_id).where(participants.c.user_id == user_id).subquery()
+        query = db.query(models.Event, func.coalesce(counts.c.participant_count, 0), mine.c.event_id.isnot(None))\
+            .outerjoin(mine, mine.c.event_id == models.Event.id)
+    return query.outerjoin(counts, counts.c.event_id == models.Event.id)\
+        .filter(models.Event.archived == False)
+
+
+def attach_counts(rows) -> List[models.Event]:
+    """Set the preloaded count and participation flag on the events of `events_with_counts` rows."""
+    events = []
+    for event, participant_count, is_participant in rows:
+        event.participant_count = participant_count
+        event.is_participant = bool(is_participant)
+        events.append(event)
+    return events
+
+
+def filter_by_date(query: Query, date_from: Optional[datetime], date_to: Optional[datetime]) -> Query:
+    if date_from:
+        query = query.filter(models.Event.date >= date_from)
+    if date_to:
+        query = query.filter(models.Event.date <= date_to)
+    return query
+
+
+def count_participants(db: Session, event_id: int) -> int:
+    participants = models.event_participants
+    return db.query(func.count()).select_from(participants).filter(participants.c.event_id == event_id).scalar()
+
 # Endpoint: GET /events/
 # Description: Returns a list of all active (non-archived) events.
-# Update the get_events function to include is_participant flag
+# Each event carries its participant count and whether the current user participates,
+# both computed in the same query as the events.
+# Optional: date_from/date_to filter on the event date, limit/cursor page through the
+# events in id order (the next cursor is in the X-Next-Cursor header), and fields=a,b
+# returns only those fields.
 @router.get("/", response_model=List[schemas.EventSchema])
-def get_events(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def get_events(
+    response: Response,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
     logger.debug("Fetching all active events")
-    events = db.query(models.Event).filter(models.Event.archived == False).all()
-    
-    # Add is_participant flag to each event
-    for event in events:
-        # Check if current user is participating in this event
-        event.is_participant = any(participant.id == current_user.id for participant in event.participants)
-        
+    selected = parse_fields(fields, schemas.EventSchema)
+    query = filter_by_date(events_with_counts(db, current_user.id), date_from, date_to)
+    rows, next_cursor = paginate(query, models.Event.id, limit, cursor, key=lambda row: row[0].id)
+    events = attach_counts(rows)
     logger.info(f"Fetched {len(events)} events")
-    return events
+    return page_response(response, events, next_cursor, schemas.EventSchema, selected)
 
-@router.post("/join/{event_id}", response_model=schemas.MessageResponse)
+# Endpoint: POST /events/join/{event_id}
+# Description: Registers the current user for an event, or adds them to its waitlist when the
+# event is at capacity. Safe to repeat; the response status says what happened.
+@router.post("/join/{event_id}", response_model=schemas.EventRegistrationResponse)
 def join_event(
     event_id: int,
     db: Session = Depends(get_db),
@@ -59,18 +120,22 @@ def join_event(
         logger.error(f"Registration for event {event_id} has ended")
         raise HTTPException(status_code=403, detail="Registration for this event has ended")
     
-    user_in_session = db.merge(current_user)
-    if any(user.id == user_in_session.id for user in event.participants):
-        logger.info(f"User {user_in_session.id} already participating in event {event_id}")
-        return {"message": "Already participating in this event"}
-    event.participants.append(user_in_session)
-    db.commit()
-    logger.info(f"User {user_in_session.id} joined event {event_id}")
-    return {"message": "Successfully joined the event"}
+    # Seats are checked and taken under the event's row lock, see app.event_registration
+    db.rollback()
+    status, position = event_registration.join(db, event_id, current_user.id, current_user.year)
+    if status == "already_joined":
+        logger.info(f"User {current_user.id} already participating in event {event_id}")
+        return {"message": "Already participating in this event", "status": status}
+    if status in ("waitlisted", "already_waitlisted"):
+        logger.info(f"User {current_user.id} is on the waitlist of event {event_id} at position {position}")
+        return {"message": f"This event is full. You are number {position} on the waitlist", "status": status,
+                "waitlist_position": position}
+    logger.info(f"User {current_user.id} joined event {event_id}")
+    return {"message": "Successfully joined the event", "status": status}
 
 # Endpoint: POST /events/leave/{event_id}
 # Description: Allows a user to leave an event by event_id.
-@router.post("/leave/{event_id}", response_model=schemas.MessageResponse)
+@router.post("/leave/{event_id}", response_model=schemas.EventRegistrationResponse)
 def leave_event(
     event_id: int,
     db: Session = Depends(get_db),
@@ -88,28 +153,40 @@ def leave_event(
         logger.error(f"Registration for event {event_id} has ended, cannot leave")
         raise HTTPException(status_code=403, detail="Registration for this event has ended, cannot leave now")
     
-    user_in_event = next((user for user in event.participants if user.id == current_user.id), None)
-    if not user_in_event:
+    db.rollback()
+    status, promoted = event_registration.leave(db, event_id, current_user.id, current_user.year)
+    if status == "not_participating":
         logger.info(f"User {current_user.id} is not participating in event {event_id}")
-        return {"message": "You are not participating in this event"}
-    event.participants.remove(user_in_event)
-    db.commit()
+        return {"message": "You are not participating in this event", "status": status}
+    if status == "left_waitlist":
+        logger.info(f"User {current_user.id} left the waitlist of event {event_id}")
+        return {"message": "Removed from the waitlist", "status": status}
     logger.info(f"User {current_user.id} left event {event_id}")
-    return {"message": "Successfully left the event"}
+    return {"message": "Successfully left the event", "status": status}
 
 # Officer Endpoints (Manage Events)
 
 # Endpoint: GET /events/officer/list
 # Description: Allows an officer to fetch a list of all active (non-archived) events.
+# Takes the same date_from/date_to, limit/cursor and fields parameters as GET /events/.
 @router.get("/officer/list", response_model=List[schemas.EventSchema])
 def admin_list_events(
+    response: Response,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db),
     current_officer: models.Officer = Depends(get_current_officer)
 ):
     logger.debug(f"Officer {current_officer.id} ({current_officer.full_name}) fetching all active events")
-    events = db.query(models.Event).filter(models.Event.archived == False).all()
+    selected = parse_fields(fields, schemas.EventSchema)
+    query = filter_by_date(events_with_counts(db), date_from, date_to)
+    rows, next_cursor = paginate(query, models.Event.id, limit, cursor, key=lambda row: row[0].id)
+    events = attach_counts(rows)
     logger.info(f"Officer {current_officer.id} fetched {len(events)} events")
-    return events
+    return page_response(response, events, next_cursor, schemas.EventSchema, selected)
 
 # Endpoint: POST /events/officer/create
 # Description: Allows an officer to create a new event. An image can be optionally uploaded.
@@ -121,6 +198,7 @@ async def admin_create_event(
     location: str = Form(""),
     registration_start: Optional[datetime] = Form(None),
     registration_end: Optional[datetime] = Form(None),
+    capacity: Optional[int] = Form(None),
     image: UploadFile = File(None),
     db: Session = Depends(get_db),
     current_officer: models.Officer = Depends(get_current_officer)
@@ -149,11 +227,16 @@ async def admin_create_event(
         image_url=image_url,
         location=location,
         registration_start=registration_start,
-        registration_end=registration_end
+        registration_end=registration_end,
+        # No capacity (or 0) means unlimited seats
+        capacity=capacity if capacity and capacity > 0 else None
     )
     db.add(new_event)
     db.commit()
     db.refresh(new_event)
+    new_event.participant_count = 0
+    live_index.schedule("event", new_event.id)
+    analytics_snapshot.record_event(new_event)
     logger.info(f"Officer {current_officer.id} created event successfully with id: {new_event.id}")
     return new_event
 
@@ -168,6 +251,7 @@ async def admin_update_event(
     location: str = Form(""),
     registration_start: Optional[datetime] = Form(None),
     registration_end: Optional[datetime] = Form(None),
+    capacity: Optional[int] = Form(None),
     image: UploadFile = File(None),
     db: Session = Depends(get_db),
     current_officer: models.Officer = Depends(get_current_officer)
@@ -197,9 +281,19 @@ async def admin_update_event(
         event.registration_start = registration_start
     if registration_end:
         event.registration_end = registration_end
+    # Capacity changes only if provided; 0 removes the limit. Lowering it below the current
+    # participant count keeps everyone registered and sends new joins to the waitlist.
+    if capacity is not None:
+        event.capacity = capacity if capacity > 0 else None
         
     db.commit()
+    if capacity is not None:
+        # Seats may have opened up for waitlisted members
+        event_registration.apply_capacity(db, event.id)
     db.refresh(event)
+    event.participant_count = count_participants(db, event.id)
+    live_index.schedule("event", event.id)
+    analytics_snapshot.record_event(event)
     logger.info(f"Officer {current_officer.id} updated event {event_id} successfully")
     return event
 
@@ -218,20 +312,36 @@ def admin_delete_event(
         raise HTTPException(status_code=404, detail="Event not found")
     event.archived = True
     db.commit()
+    live_index.schedule("event", event.id)
+    analytics_snapshot.record_event(event)
     logger.info(f"Officer {current_officer.id} archived event {event_id} successfully")
     return {"detail": "Event archived successfully"}
 
 # Endpoint: GET /events/{event_id}/participants
 # Description: Returns a list of users participating in the specified event.
+# Optional: year filters by member year, limit/cursor page through the participants in
+# user id order (next cursor in X-Next-Cursor), and fields=a,b returns only those fields.
 @router.get("/{event_id}/participants", response_model=List[schemas.User])
 def get_event_participants(
     event_id: int,
+    response: Response,
+    year: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     logger.debug(f"Fetching participants for event id: {event_id}")
-    event = db.query(models.Event).filter(models.Event.id == event_id, models.Event.archived == False).first()
-    if not event:
+    selected = parse_fields(fields, schemas.User)
+    if not db.query(models.Event.id).filter(models.Event.id == event_id, models.Event.archived == False).first():
         logger.error(f"Event {event_id} not found for fetching participants")
         raise HTTPException(status_code=404, detail="Event not found")
-    logger.info(f"Fetched {len(event.participants)} participants for event id: {event_id}")
-    return event.participants
\ No newline at end of file
+    participants = models.event_participants
+    query = db.query(models.User)\
+        .join(participants, participants.c.user_id == models.User.id)\
+        .filter(participants.c.event_id == event_id)
+    if year:
+        query = query.filter(models.User.year == year)
+    users, next_cursor = paginate(query, models.User.id, limit, cursor)
+    logger.info(f"Fetched {len(users)} participants for event id: {event_id}")
+    return page_response(response, users, next_cursor, schemas.User, selected)
\ No newline at end of file
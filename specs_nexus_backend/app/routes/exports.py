@@ -0,0 +1,228 @@
+import csv
+import io
+import logging
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+from typing import Callable, Iterator, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Query, Session
+
+from app.database import SessionLocal
+from app import models, rollups
+from app.auth_utils import get_current_officer
+
+logger = logging.getLogger("app.exports")
+
+router = APIRouter(prefix="/exports", tags=["Exports"])
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Rows fetched per round trip from the server-side cursor, and written per CSV chunk
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+# Bytes per chunk when streaming a finished XLSX file
+XLSX_CHUNK_BYTES = 64 * 1024
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def _cell(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ", timespec="seconds")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@"):
+        # Keep spreadsheet apps from evaluating user-supplied text as a formula
+        return "'" + value
+    return value
+
+
+def _rows(build_query: Callable) -> Iterator[list]:
+    """
+    Run the query on its own session and yield rows as the server-side cursor delivers
+    them. The session is opened here, not through get_db, because the response body is
+    produced after the endpoint returns.
+    """
+    db = SessionLocal()
+    try:
+        query: Query = build_query(db)
+        for row in query.yield_per(EXPORT_BATCH_SIZE):
+            yield [_cell(value) for value in row]
+    finally:
+        db.close()
+
+
+def _csv_stream(build_query: Callable, columns: List[str]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # Excel needs the BOM to read the file as UTF-8
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+    pending = 0
+    for row in _rows(build_query):
+        writer.writerow(row)
+        pending += 1
+        if pending >= EXPORT_BATCH_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue().encode("utf-8")
+
+
+def _xlsx_stream(build_query: Callable, columns: List[str], title: str) -> Iterator[bytes]:
+    from openpyxl import Workbook
+
+    # A write-only workbook spools rows to a temporary file instead of keeping cells in
+    # memory; the finished file is then streamed from disk
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=title[:31])
+    sheet.append(columns)
+    for row in _rows(build_query):
+        sheet.append(row)
+    with tempfile.TemporaryFile() as f:
+        workbook.save(f)
+        f.seek(0)
+        while chunk := f.read(XLSX_CHUNK_BYTES):
+            yield chunk
+
+
+def export_response(build_query: Callable, columns: List[str], name: str, format: str) -> StreamingResponse:
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Use one of: {', '.join(FORMATS)}")
+    if format == "xlsx":
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            logger.error("XLSX export requested but openpyxl is not installed")
+            raise HTTPException(status_code=501, detail="XLSX export is not available on this server")
+        body = _xlsx_stream(build_query, columns, name)
+    else:
+        body = _csv_stream(build_query, columns)
+    filename = f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{format}"
+    return StreamingResponse(body, media_type=FORMATS[format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+# Endpoint: GET /exports/memberships
+# Description: Streams active membership records with their member as CSV or XLSX (format=csv|xlsx),
+# optionally filtered by requirement, status, payment_status and member year.
+@router.get("/memberships")
+def export_memberships(
+    format: str = "csv",
+    requirement: Optional[str] = None,
+    status: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    year: Optional[str] = None,
+    current_officer: models.Officer = Depends(get_current_officer)
+):
+    logger.info(f"Officer {current_officer.id} exporting memberships as {format}")
+    clearance, catalog, user = models.Clearance, models.Requirement, models.User
+    columns = ["Membership ID", "Student Number", "Full Name", "Email", "Year", "Block", "Requirement",
+               "Amount", "Payment Status", "Payment Method", "Status", "Receipt"]
+
+    def build_query(db):
+        # Plain columns rather than ORM entities, so nothing accumulates in the identity map
+        query = db.query(
+            clearance.id, user.student_number, user.full_name, user.email, user.year, user.block,
+            catalog.name, catalog.amount, clearance.payment_status, clearance.payment_method,
+            clearance.status, clearance.receipt_path,
+        ).join(catalog, clearance.requirement_id == catalog.id)\
+         .outerjoin(user, clearance.user_id == user.id)\
+         .filter(clearance.archived == False)
+        if requirement:
+            query = query.filter(catalog.name == requirement)
+        if status:
+            query = query.filter(clearance.status == status)
+        if payment_status:
+            query = query.filter(clearance.payment_status == payment_status)
+        if year:
+            query = query.filter(user.year == year)
+        return query.order_by(clearance.id)
+
+    return export_response(build_query, columns, "memberships", format)
+
+
+# Endpoint: GET /exports/participants
+# Description: Streams event participants as CSV or XLSX, for one event (event_id) or all active
+# events, optionally filtered by member year.
+@router.get("/participants")
+def export_participants(
+    format: str = "csv",
+    event_id: Optional[int] = None,
+    year: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_officer: models.Officer = Depends(get_current_officer)
+):
+    logger.info(f"Officer {current_officer.id} exporting participants of event {event_id or 'all'} as {format}")
+    participants, event, user = models.event_participants, models.Event, models.User
+    if event_id is not None:
+        if not db.query(event.id).filter(event.id == event_id, event.archived == False).first():
+            logger.error(f"Event {event_id} not found for export")
+            raise HTTPException(status_code=404, detail="Event not found")
+    columns = ["Event ID", "Event", "Event Date", "Student Number", "Full Name", "Email", "Year", "Block", "Joined At"]
+
+    def build_query(db):
+        query = db.query(
+            event.id, event.title, event.date, user.student_number, user.full_name, user.email, user.year,
+            user.block, participants.c.joined_at,
+        ).select_from(participants)\
+         .join(event, participants.c.event_id == event.id)\
+         .join(user, participants.c.user_id == user.id)\
+         .filter(event.archived == False)
+        if event_id is not None:
+            query = query.filter(event.id == event_id)
+        if year:
+            query = query.filter(user.year == year)
+        return query.order_by(event.id, user.id)
+
+    return export_response(build_query, columns, f"event-{event_id}-participants" if event_id else "participants", format)
+
+
+# Endpoint: GET /exports/analytics
+# Description: Streams the daily analytics rollups (see /analytics/trends) between start and end
+# (default the last 365 days) as CSV or XLSX, optionally for one metric and filtered by
+# requirement, payment_status, year and event_id.
+@router.get("/analytics")
+def export_analytics(
+    format: str = "csv",
+    metric: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    requirement: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    year: Optional[str] = None,
+    event_id: Optional[int] = None,
+    current_officer: models.Officer = Depends(get_current_officer)
+):
+    if metric is not None and metric not in rollups.METRICS:
+        raise HTTPException(status_code=400, detail=f"Unknown metric {metric}")
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=364)
+    logger.info(f"Officer {current_officer.id} exporting {metric or 'all'} rollups from {start} to {end} as {format}")
+    rollup = models.AnalyticsDailyRollup
+    columns = ["Day", "Metric", "Requirement", "Payment Status", "Year", "Event ID", "Value"]
+    filters = {"requirement": requirement, "payment_status": payment_status, "year": year, "event_id": event_id}
+
+    def build_query(db):
+        query = db.query(
+            rollup.day, rollup.metric, rollup.requirement, rollup.payment_status, rollup.year, rollup.event_id, rollup.value,
+        ).filter(rollup.day >= start, rollup.day <= end)
+        if metric:
+            query = query.filter(rollup.metric == metric)
+        for name, value in filters.items():
+            if value is not None:
+                query = query.filter(getattr(rollup, name) == value)
+        return query.order_by(rollup.day, rollup.metric, rollup.id)
+
+    return export_response(build_query, columns, f"analytics-{metric}" if metric else "analytics", format)
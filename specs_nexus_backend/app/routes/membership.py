@@ -1,14 +1,19 @@
 import logging
 import os
 import uuid
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Body
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Body, Response
+from sqlalchemy import select
 from sqlalchemy.orm import Session, joinedload
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
 
 from app.database import SessionLocal
 from app import models, schemas
 from app.auth_utils import get_current_user, get_current_officer
+from app.analytics_snapshot import analytics_snapshot
+from app.dashboard import clearance_state
+from app import requirements, rollups
+from app.pagination import page_response, paginate, parse_fields
 
 logger = logging.getLogger("app.membership")
 
@@ -163,13 +168,18 @@ def update_receipt(
         logger.error(f"Membership record not found for id: {payload.membership_id} (User {current_user.id})")
         raise HTTPException(status_code=404, detail="Membership not found")
     
+    before = clearance_state(membership)
     membership.receipt_path = payload.receipt_path
     membership.payment_status = "Verifying"
     membership.status = "Processing"
     membership.payment_method = payment_type
 
+    after = clearance_state(membership)
+    rollups.record_clearance_changes(db, [(before, after)])
+    generation = analytics_snapshot.generation
     db.commit()
     db.refresh(membership)
+    analytics_snapshot.record_clearance_change(before, after, generation)
     logger.info(f"User {current_user.id} updated receipt for membership_id: {payload.membership_id}")
     return membership
 
@@ -179,18 +189,40 @@ def update_receipt(
 
 # Endpoint: GET /membership/officer/list
 # Description: Allows an officer to fetch all active membership records.
+# Optional: filter by requirement, status, payment_status and member year; limit/cursor page
+# through the records in id order (next cursor in X-Next-Cursor); fields=a,b returns only those fields.
 @router.get("/officer/list", response_model=List[schemas.MembershipSchema])
 def officer_list_membership(
+    response: Response,
+    requirement: Optional[str] = None,
+    status: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    year: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db), 
     current_officer: models.Officer = Depends(get_current_officer)
 ):
     logger.debug(f"Officer {current_officer.id} ({current_officer.full_name}) fetching membership records")
-    memberships = db.query(models.Clearance)\
-        .options(joinedload(models.Clearance.user))\
-        .filter(models.Clearance.archived == False)\
-        .all()
+    selected = parse_fields(fields, schemas.MembershipSchema)
+    query = db.query(models.Clearance).filter(models.Clearance.archived == False)
+    # The member is only joined in when it is returned or filtered on
+    if selected is None or "user" in selected:
+        query = query.options(joinedload(models.Clearance.user))
+    if requirement:
+        query = query.filter(models.Clearance.requirement_id.in_(
+            select(models.Requirement.id).where(models.Requirement.name == requirement)
+        ))
+    if status:
+        query = query.filter(models.Clearance.status == status)
+    if payment_status:
+        query = query.filter(models.Clearance.payment_status == payment_status)
+    if year:
+        query = query.join(models.User, models.Clearance.user_id == models.User.id).filter(models.User.year == year)
+    memberships, next_cursor = paginate(query, models.Clearance.id, limit, cursor)
     logger.info(f"Officer {current_officer.id} fetched {len(memberships)} membership records")
-    return memberships
+    return page_response(response, memberships, next_cursor, schemas.MembershipSchema, selected)
 
 # Endpoint: POST /membership/officer/create
 # Description: Allows an officer to create a new membership record for a user.
@@ -204,18 +236,27 @@ def officer_create_membership(
     current_officer: models.Officer = Depends(get_current_officer)
 ):
     logger.debug(f"Officer {current_officer.id} creating membership record for user_id: {user_id}")
+    # The amount only prices a requirement that does not exist yet
+    requirement_record = requirements.get_or_create(db, requirement, amount)
+    if requirement_record is None:
+        logger.error(f"Requirement {requirement} is archived (Officer {current_officer.id})")
+        raise HTTPException(status_code=400, detail="Requirement is archived")
     new_record = models.Clearance(
         user_id=user_id,
-        amount=amount,
         payment_status=payment_status,
-        requirement=requirement,
+        requirement_record=requirement_record,
         status="Not Yet Cleared",
         receipt_path="",
         archived=False
     )
     db.add(new_record)
+    db.flush()
+    after = clearance_state(new_record)
+    rollups.record_clearance_changes(db, [(None, after)])
+    generation = analytics_snapshot.generation
     db.commit()
     db.refresh(new_record)
+    analytics_snapshot.record_clearance_change(None, after, generation)
     logger.info(f"Membership record {new_record.id} created for user_id: {user_id} by officer {current_officer.id}")
     return new_record
 
@@ -241,6 +282,7 @@ def officer_verify_membership(
         logger.error(f"Membership record {membership_id} not found (Officer {current_officer.id})")
         raise HTTPException(status_code=404, detail="Membership record not found")
     
+    before = clearance_state(membership)
     if action == "approve":
         membership.payment_status = "Paid"
         membership.status = "Clear"
@@ -250,31 +292,34 @@ def officer_verify_membership(
         membership.receipt_path = None
         membership.payment_method = None  # Reset payment_method when denied.
     
+    after = clearance_state(membership)
+    rollups.record_clearance_changes(db, [(before, after)])
+    generation = analytics_snapshot.generation
     db.commit()
     db.refresh(membership)
+    analytics_snapshot.record_clearance_change(before, after, generation)
     logger.info(f"Officer {current_officer.id} updated membership record {membership_id} with action {action}")
     return membership
 
+def requirement_response(requirement: models.Requirement) -> dict:
+    return {"id": requirement.id, "requirement": requirement.name, "amount": requirement.amount, "archived": requirement.archived}
+
 # Endpoint: GET /membership/officer/requirements
-# Description: Returns a list of distinct membership requirements from active records.
-@router.get("/officer/requirements", response_model=List[schemas.MembershipSchema])
+# Description: Returns the active membership requirements from the requirement catalog.
+@router.get("/officer/requirements", response_model=List[schemas.RequirementSchema])
 def get_officer_requirements(
     db: Session = Depends(get_db), 
     current_officer: models.Officer = Depends(get_current_officer)
 ):
     logger.debug(f"Officer {current_officer.id} fetching membership requirements")
-    clearances = db.query(models.Clearance).filter(models.Clearance.archived == False).all()
-    grouped = {}
-    for c in clearances:
-        if c.requirement not in grouped:
-            grouped[c.requirement] = c
-    result = list(grouped.values())
+    result = [requirement_response(r) for r in requirements.active(db)]
     logger.info(f"Officer {current_officer.id} fetched {len(result)} distinct membership requirements")
     return result
 
 # Endpoint: PUT /membership/officer/requirements/{requirement}
-# Description: Allows an officer to update membership requirement details (like amount) for all records with that requirement.
-@router.put("/officer/requirements/{requirement}", response_model=schemas.MembershipSchema)
+# Description: Allows an officer to update membership requirement details (like amount).
+# The price lives on the requirement, so this is one UPDATE however many members have it.
+@router.put("/officer/requirements/{requirement}", response_model=schemas.RequirementSchema)
 def update_officer_requirement(
     requirement: str, 
     payload: dict = Body(...), 
@@ -282,19 +327,19 @@ def update_officer_requirement(
     current_officer: models.Officer = Depends(get_current_officer)
 ):
     logger.debug(f"Officer {current_officer.id} updating membership requirement: {requirement}")
-    records = db.query(models.Clearance).filter(models.Clearance.requirement == requirement, models.Clearance.archived == False).all()
-    if not records:
+    if "amount" in payload:
+        record = requirements.set_amount(db, requirement, payload["amount"])
+    else:
+        record = requirements.find(db, requirement)
+    if not record:
         logger.error(f"Requirement {requirement} not found for update (Officer {current_officer.id})")
         raise HTTPException(status_code=404, detail="Requirement not found")
-    for r in records:
-        if "amount" in payload:
-            r.amount = payload["amount"]
     db.commit()
     logger.info(f"Officer {current_officer.id} updated requirement {requirement} successfully")
-    return records[0]
+    return requirement_response(record)
 
 # Endpoint: DELETE /membership/officer/requirements/{requirement}
-# Description: Allows an officer to archive all membership records for a given requirement.
+# Description: Allows an officer to archive a requirement and all membership records for it (one bulk UPDATE).
 @router.delete("/officer/requirements/{requirement}", response_model=schemas.MessageResponse)
 def delete_officer_requirement(
     requirement: str, 
@@ -302,19 +347,21 @@ def delete_officer_requirement(
     current_officer: models.Officer = Depends(get_current_officer)
 ):
     logger.debug(f"Officer {current_officer.id} archiving membership requirement: {requirement}")
-    records = db.query(models.Clearance).filter(models.Clearance.requirement == requirement, models.Clearance.archived == False).all()
-    if not records:
+    archived = requirements.archive(db, requirement)
+    if archived is None:
         logger.error(f"Requirement {requirement} not found for archiving (Officer {current_officer.id})")
         raise HTTPException(status_code=404, detail="Requirement not found")
-    for r in records:
-        r.archived = True
     db.commit()
-    logger.info(f"Officer {current_officer.id} archived requirement {requirement} successfully")
+    # Reloaded on the next read rather than removing each archived clearance from the counters
+    analytics_snapshot.invalidate()
+    logger.info(f"Officer {current_officer.id} archived requirement {requirement} and {archived} membership records")
     return {"message": "Requirement archived successfully"}
 
 # Endpoint: POST /membership/officer/requirement/create
 # Description: Allows an officer to create a new membership requirement for all users that don't already have it.
-@router.post("/officer/requirement/create", response_model=schemas.MembershipSchema)
+# The amount prices a new or archived requirement; an existing one keeps its price (see PUT .../requirements/{requirement}).
+# Runs as a single INSERT ... SELECT and returns how many members got it and how many already had it.
+@router.post("/officer/requirement/create", response_model=schemas.RequirementCreateResponse)
 def create_officer_requirement(
     requirement: str = Form(...),
     amount: float = Form(...),
@@ -322,31 +369,19 @@ def create_officer_requirement(
     current_officer: models.Officer = Depends(get_current_officer)
 ):
     logger.debug(f"Officer {current_officer.id} creating new membership requirement: {requirement} with amount: {amount}")
-    users = db.query(models.User).all()
-    created_records = []
-    for user in users:
-        existing = db.query(models.Clearance).filter(
-            models.Clearance.user_id == user.id,
-            models.Clearance.requirement == requirement,
-            models.Clearance.archived == False
-        ).first()
-        if not existing:
-            new_clearance = models.Clearance(
-                user_id=user.id,
-                requirement=requirement,
-                amount=amount,
-                payment_status="Not Paid",
-                status="Not Yet Cleared",
-                receipt_path="",
-                archived=False
-            )
-            db.add(new_clearance)
-            created_records.append(new_clearance)
-    db.commit()
-    if created_records:
-        db.refresh(created_records[0])
-        logger.info(f"Officer {current_officer.id} created membership requirement '{requirement}' for {len(created_records)} users")
-        return created_records[0]
-    else:
+    members, created_by_year = requirements.create_for_all_members(db, requirement, amount)
+    created = sum(created_by_year.values())
+    if not created:
+        db.rollback()
         logger.error(f"Membership requirement '{requirement}' already exists for all users (Officer {current_officer.id})")
         raise HTTPException(status_code=400, detail="Requirement already exists for all users")
+    generation = analytics_snapshot.generation
+    db.commit()
+    analytics_snapshot.record_new_clearances(requirement, created_by_year, generation)
+    logger.info(f"Officer {current_officer.id} created membership requirement '{requirement}' for {created} users")
+    return {
+        "message": "Requirement created successfully",
+        "requirement": requirement,
+        "created": created,
+        "skipped": members - created,
+    }
@@ -1,13 +1,14 @@
 import logging
 from datetime import timedelta
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, Depends, Form, UploadFile, File
+from fastapi import APIRouter, HTTPException, Depends, Form, UploadFile, File, Response
 from sqlalchemy.orm import Session
 
 from app.database import SessionLocal
 from app import models, schemas
 from app.auth_utils import admin_required, create_access_token
+from app.pagination import page_response, paginate, parse_fields
 
 logger = logging.getLogger("app.officers")
 
@@ -50,24 +51,53 @@ def officer_login(officer: schemas.OfficerLoginSchema, db: Session = Depends(get
         "officer": db_officer
     }
 
+def filter_officers(db: Session, position: Optional[str], year: Optional[str]):
+    query = db.query(models.Officer).filter(models.Officer.archived == False)
+    if position:
+        query = query.filter(models.Officer.position == position)
+    if year:
+        query = query.filter(models.Officer.year == year)
+    return query
+
 # Endpoint: GET /officers/
 # Description: Returns a list of all active officers for a logged-in officer.
+# Optional: filter by position and year; limit/cursor page through the officers in id order
+# (next cursor in X-Next-Cursor); fields=a,b returns only those fields.
 @router.get("/", response_model=List[schemas.OfficerSchema])
-def get_officers(db: Session = Depends(get_db), current_officer: models.Officer = Depends(admin_required)):
+def get_officers(
+    response: Response,
+    position: Optional[str] = None,
+    year: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_officer: models.Officer = Depends(admin_required)
+):
 
     logger.debug(f"get_officers called by Officer {current_officer.id} ({current_officer.full_name})")
-    officers = db.query(models.Officer).filter(models.Officer.archived == False).all()
+    selected = parse_fields(fields, schemas.OfficerSchema)
+    officers, next_cursor = paginate(filter_officers(db, position, year), models.Officer.id, limit, cursor)
     logger.info(f"Officer {current_officer.id} fetched {len(officers)} officers")
-    return officers
+    return page_response(response, officers, next_cursor, schemas.OfficerSchema, selected)
 
 # Endpoint: GET /officers/ (Admin)
-# Description: Allows an admin to fetch all active officers.
+# Description: Allows an admin to fetch all active officers. Takes the same parameters as above.
 @router.get("/", response_model=List[schemas.OfficerSchema], dependencies=[Depends(admin_required)])
-def get_officers_admin(db: Session = Depends(get_db)):
+def get_officers_admin(
+    response: Response,
+    position: Optional[str] = None,
+    year: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
     logger.debug("Admin fetching all active officers")
-    officers = db.query(models.Officer).filter(models.Officer.archived == False).all()
+    selected = parse_fields(fields, schemas.OfficerSchema)
+    officers, next_cursor = paginate(filter_officers(db, position, year), models.Officer.id, limit, cursor)
     logger.info(f"Admin fetched {len(officers)} officers")
-    return officers
+    return page_response(response, officers, next_cursor, schemas.OfficerSchema, selected)
 
 # Endpoint: POST /officers/
 # Description: Allows an admin to create a new officer account.
@@ -66,6 +66,7 @@ class EventSchema(BaseModel):
     participant_count: int
     registration_start: Optional[datetime] = None
     registration_end: Optional[datetime] = None
+    capacity: Optional[int] = None
     registration_open: bool
     registration_status: str
     is_participant: Optional[bool] = False  # New field to track if current user is participating
@@ -106,4 +107,53 @@ class TokenResponse(BaseModel):
     officer: OfficerSchema
 
 class MessageResponse(BaseModel):
-    message: str
\ No newline at end of file
+    message: str
+
+class EventRegistrationResponse(MessageResponse):
+    # joined, already_joined, waitlisted, already_waitlisted, left, left_waitlist or not_participating
+    status: str
+    waitlist_position: Optional[int] = None
+
+class RequirementSchema(BaseModel):
+    id: int
+    # The requirement's name, under the same key membership records use
+    requirement: str
+    amount: Optional[float] = None
+    archived: bool
+
+class RequirementCreateResponse(MessageResponse):
+    requirement: str
+    # Members who got the new requirement, and members skipped because they already had it
+    created: int
+    skipped: int
+
+class CheckinTokenResponse(BaseModel):
+    event_id: int
+    token: str
+    expires_at: datetime
+
+class ScanRequest(BaseModel):
+    tokens: List[str]
+
+class OfflineScan(BaseModel):
+    token: str
+    # When the scanner read the code, as recorded on the device
+    scanned_at: datetime
+
+class AttendanceSyncRequest(BaseModel):
+    scans: List[OfflineScan]
+
+class ScanResult(BaseModel):
+    # accepted, duplicate, wrong_event, malformed, bad_signature or expired
+    status: str
+    user_id: Optional[int] = None
+
+class ScanResponse(BaseModel):
+    accepted: int
+    results: List[ScanResult]
+
+class AttendanceSummary(BaseModel):
+    event_id: int
+    registered: int
+    checked_in: int
+    pending: int
@@ -0,0 +1,340 @@
+import datetime
+import hashlib
+import json
+import logging
+import mmap
+import os
+import shutil
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("app.vector_store")
+
+# On-disk layout of an index directory:
+#   CURRENT                 - name of the active build directory, replaced atomically on publish
+#   builds/<build_id>/
+#     index.faiss           - FAISS IndexIDMap2 written with faiss.write_index (loaded memory-mapped)
+#     chunks.bin            - UTF-8 document chunks concatenated back to back
+#     chunks.offsets        - .npy int64 array of n + 1 byte offsets into chunks.bin
+#     chunks.ids            - .npy int64 array of the FAISS id of each chunk
+#     manifest.json         - format version, model, dimension, chunk count and content hash
+FORMAT_VERSION = 2
+CURRENT_FILE = "CURRENT"
+BUILDS_DIR = "builds"
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.bin"
+OFFSETS_FILE = "chunks.offsets"
+IDS_FILE = "chunks.ids"
+MANIFEST_FILE = "manifest.json"
+# Number of previous builds kept next to the active one, for workers still mapping them
+KEEP_BUILDS = 2
+
+# Supported index types and their default parameters. All use L2 distance, so distance
+# thresholds mean the same thing whichever type is built.
+#   flat     - exact brute-force scan; best recall, cost grows linearly with the corpus
+#   hnsw     - graph index; fast and accurate, more memory, no removals (rebuilds instead)
+#   ivf_flat - inverted lists over k-means cells; needs training, nprobe trades recall for speed
+#   ivf_pq   - inverted lists with product-quantized codes; smallest memory, lossy distances
+INDEX_TYPES = {
+    "flat": {},
+    "hnsw": {"m": 32, "ef_construction": 200, "ef_search": 64},
+    "ivf_flat": {"nlist": 1024, "nprobe": 16},
+    "ivf_pq": {"nlist": 1024, "nprobe": 16, "pq_m": 48, "pq_nbits": 8},
+}
+# k-means wants at least this many training points per centroid for good cells
+MIN_POINTS_PER_CENTROID = 39
+
+
+class IndexArtifactError(Exception):
+    """Raised when index artifacts are missing, corrupt, or built for a different model."""
+
+
+def index_params(index_type: str, overrides: Optional[dict] = None) -> dict:
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {', '.join(INDEX_TYPES)}")
+    params = dict(INDEX_TYPES[index_type])
+    params.update({key: value for key, value in (overrides or {}).items() if value is not None and key in params})
+    return params
+
+
+def create_index(index_type: str, dimension: int, params: dict, training_vectors: np.ndarray):
+    """
+    Create an empty, trained, ID-mapped index of the given type.
+
+    Returns the index and the type actually built: IVF indexes fall back to flat when
+    there are too few vectors to train their coarse quantizer (or PQ codebooks).
+    """
+    import faiss
+
+    if index_type == "hnsw":
+        base = faiss.IndexHNSWFlat(dimension, params["m"])
+        base.hnsw.efConstruction = params["ef_construction"]
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        min_points = params["nlist"]
+        if index_type == "ivf_pq":
+            if dimension % params["pq_m"]:
+                raise ValueError(f"pq_m={params['pq_m']} must divide the dimension {dimension}")
+            min_points = max(min_points, 1 << params["pq_nbits"])
+        if len(training_vectors) < min_points:
+            logger.warning(
+                f"{len(training_vectors)} vectors are too few to train {index_type} (needs {min_points}); building a flat index"
+            )
+            return create_index("flat", dimension, {}, training_vectors)
+        if len(training_vectors) < min_points * MIN_POINTS_PER_CENTROID:
+            logger.warning(f"Training {index_type} on {len(training_vectors)} vectors; expect lower recall than with more data")
+        quantizer = faiss.IndexFlatL2(dimension)
+        if index_type == "ivf_flat":
+            base = faiss.IndexIVFFlat(quantizer, dimension, params["nlist"], faiss.METRIC_L2)
+        else:
+            base = faiss.IndexIVFPQ(quantizer, dimension, params["nlist"], params["pq_m"], params["pq_nbits"])
+        base.train(training_vectors)
+    else:
+        base = faiss.IndexFlatL2(dimension)
+    index = faiss.IndexIDMap2(base)
+    apply_search_params(index, params)
+    return index, index_type
+
+
+def base_index(index):
+    import faiss
+
+    return faiss.downcast_index(index.index) if hasattr(index, "index") else index
+
+
+def apply_search_params(index, params: dict) -> None:
+    """Set query-time parameters (HNSW efSearch, IVF nprobe) on a loaded index."""
+    import faiss
+
+    base = base_index(index)
+    if isinstance(base, faiss.IndexHNSW) and params.get("ef_search"):
+        base.hnsw.efSearch = int(params["ef_search"])
+    if isinstance(base, faiss.IndexIVF) and params.get("nprobe"):
+        base.nprobe = int(params["nprobe"])
+
+
+def supports_removal(index) -> bool:
+    import faiss
+
+    return not isinstance(base_index(index), faiss.IndexHNSW)
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(digest: str) -> int:
+    """Stable, non-negative int64 FAISS id derived from a chunk hash."""
+    return int(digest[:15], 16)
+
+
+class ChunkStore:
+    """
+    Read-only, memory-mapped collection of document chunks addressed by FAISS id.
+
+    Only the offsets and id arrays and the pages of chunks that are actually read are
+    brought into memory, and the pages are shared between worker processes by the OS.
+    """
+
+    def __init__(self, data_path: str, offsets_path: str, ids_path: str):
+        self._offsets = np.load(offsets_path, mmap_mode="r")
+        self.ids = np.load(ids_path, mmap_mode="r")
+        self._id_order = np.argsort(self.ids)
+        self._file = open(data_path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        # mmap cannot map an empty file
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, position: int) -> str:
+        if position < 0 or position >= len(self):
+            raise IndexError(f"Chunk {position} out of range")
+        start, end = int(self._offsets[position]), int(self._offsets[position + 1])
+        return self._data[start:end].decode("utf-8")
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
+
+    def position_of(self, faiss_id: int) -> Optional[int]:
+        found = int(np.searchsorted(self.ids, faiss_id, sorter=self._id_order))
+        if found < len(self._id_order) and self.ids[self._id_order[found]] == faiss_id:
+            return int(self._id_order[found])
+        return None
+
+    def get_by_id(self, faiss_id: int) -> Optional[str]:
+        position = self.position_of(faiss_id)
+        return self[position] if position is not None else None
+
+    def close(self) -> None:
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+    @staticmethod
+    def write(documents: Iterable[str], ids: Iterable[int], data_path: str, offsets_path: str, ids_path: str) -> None:
+        offsets = [0]
+        with open(data_path, "wb") as f:
+            for document in documents:
+                encoded = document.encode("utf-8")
+                f.write(encoded)
+                offsets.append(offsets[-1] + len(encoded))
+        with open(offsets_path, "wb") as f:
+            np.save(f, np.asarray(offsets, dtype="int64"))
+        with open(ids_path, "wb") as f:
+            np.save(f, np.asarray(list(ids), dtype="int64"))
+
+
+def file_sha256(*paths: str) -> str:
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def _fsync(path: str) -> None:
+    with open(path, "rb+") as f:
+        os.fsync(f.fileno())
+
+
+def current_build_dir(directory: str) -> str:
+    path = os.path.join(directory, CURRENT_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            build_id = f.read().strip()
+    except FileNotFoundError:
+        raise IndexArtifactError(f"No index at {directory}. Run build_index.py to build the index.")
+    return os.path.join(directory, BUILDS_DIR, build_id)
+
+
+def write_artifacts(directory: str, index, documents: List[str], ids: List[int], model_name: str,
+                    extra: Optional[dict] = None) -> dict:
+    """
+    Write a new build of the index, chunk store and manifest and publish it atomically.
+
+    The build is written to its own directory under `builds/`, then `CURRENT` is replaced
+    with os.replace, so readers see either the previous build or the complete new one.
+    Workers that still have an older build memory-mapped keep reading it unharmed.
+    """
+    import faiss
+
+    if index.ntotal != len(documents) or len(ids) != len(documents):
+        raise IndexArtifactError(f"Index has {index.ntotal} vectors and {len(ids)} ids but there are {len(documents)} chunks")
+
+    created_at = datetime.datetime.utcnow()
+    build_id = created_at.strftime("%Y%m%dT%H%M%S%f")
+    builds_root = os.path.join(directory, BUILDS_DIR)
+    build_dir = os.path.join(builds_root, build_id)
+    os.makedirs(build_dir)
+    paths = {name: os.path.join(build_dir, name) for name in (INDEX_FILE, CHUNKS_FILE, OFFSETS_FILE, IDS_FILE, MANIFEST_FILE)}
+
+    faiss.write_index(index, paths[INDEX_FILE])
+    ChunkStore.write(documents, ids, paths[CHUNKS_FILE], paths[OFFSETS_FILE], paths[IDS_FILE])
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "build_id": build_id,
+        "model_name": model_name,
+        "dimension": int(index.d),
+        "chunk_count": len(documents),
+        "index_type": "flat",
+        "index_params": {},
+        "faiss_class": type(base_index(index)).__name__,
+        "content_hash": file_sha256(paths[CHUNKS_FILE], paths[OFFSETS_FILE], paths[IDS_FILE]),
+        "index_bytes": os.path.getsize(paths[INDEX_FILE]),
+        "created_at": created_at.isoformat(),
+    }
+    manifest.update(extra or {})
+    with open(paths[MANIFEST_FILE], "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    for path in paths.values():
+        _fsync(path)
+
+    current_tmp = os.path.join(directory, CURRENT_FILE + ".tmp")
+    with open(current_tmp, "w", encoding="utf-8") as f:
+        f.write(build_id)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(current_tmp, os.path.join(directory, CURRENT_FILE))
+
+    _prune_builds(builds_root, build_id)
+    return manifest
+
+
+def _prune_builds(builds_root: str, active_build: str) -> None:
+    builds = sorted(name for name in os.listdir(builds_root) if name != active_build)
+    for name in builds[:-KEEP_BUILDS] if KEEP_BUILDS else builds:
+        shutil.rmtree(os.path.join(builds_root, name), ignore_errors=True)
+
+
+def read_manifest(build_dir: str) -> dict:
+    path = os.path.join(build_dir, MANIFEST_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise IndexArtifactError(f"No index manifest at {path}. Run build_index.py to build the index.")
+    except ValueError as e:
+        raise IndexArtifactError(f"Corrupt index manifest at {path}: {e}")
+
+
+def load_artifacts(directory: str, model_name: Optional[str] = None, dimension: Optional[int] = None,
+                   mmap_index: bool = True, encoder: Optional[str] = None) -> Tuple[object, ChunkStore, dict]:
+    """
+    Load and validate the current build of the index artifacts in `directory`.
+
+    Raises IndexArtifactError if the artifacts were built with a different format, model,
+    encoder (`model_id`, e.g. torch vs quantized ONNX) or dimension, or if the chunk files
+    do not match the hash recorded in the manifest.
+    """
+    import faiss
+
+    build_dir = current_build_dir(directory)
+    manifest = read_manifest(build_dir)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise IndexArtifactError(
+            f"Index format {manifest.get('format_version')} is not supported (expected {FORMAT_VERSION}); rebuild the index"
+        )
+    if model_name is not None and manifest.get("model_name") != model_name:
+        raise IndexArtifactError(
+            f"Index was built with model {manifest.get('model_name')!r} but {model_name!r} is configured; rebuild the index"
+        )
+    # Builds from before encoders were recorded were made with the PyTorch model
+    built_encoder = manifest.get("encoder", manifest.get("model_name"))
+    if encoder is not None and built_encoder != encoder:
+        raise IndexArtifactError(
+            f"Index was built with encoder {built_encoder!r} but {encoder!r} is configured; rebuild the index"
+        )
+    if dimension is not None and manifest.get("dimension") != dimension:
+        raise IndexArtifactError(f"Index dimension {manifest.get('dimension')} does not match model dimension {dimension}")
+
+    paths = {name: os.path.join(build_dir, name) for name in (INDEX_FILE, CHUNKS_FILE, OFFSETS_FILE, IDS_FILE)}
+    for path in paths.values():
+        if not os.path.exists(path):
+            raise IndexArtifactError(f"Missing index artifact {path}")
+    if file_sha256(paths[CHUNKS_FILE], paths[OFFSETS_FILE], paths[IDS_FILE]) != manifest.get("content_hash"):
+        raise IndexArtifactError("Index chunks do not match the manifest content hash; rebuild the index")
+    if os.path.getsize(paths[INDEX_FILE]) != manifest.get("index_bytes"):
+        raise IndexArtifactError("Index file size does not match the manifest; rebuild the index")
+
+    if mmap_index:
+        # IO_FLAG_MMAP_IFC maps flat vector storage in place (newer FAISS releases);
+        # older releases only support mapping IVF inverted lists.
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+        index = faiss.read_index(paths[INDEX_FILE], flags)
+    else:
+        index = faiss.read_index(paths[INDEX_FILE])
+    chunks = ChunkStore(paths[CHUNKS_FILE], paths[OFFSETS_FILE], paths[IDS_FILE])
+
+    if index.d != manifest.get("dimension"):
+        raise IndexArtifactError(f"Index dimension {index.d} does not match manifest dimension {manifest.get('dimension')}")
+    if index.ntotal != manifest.get("chunk_count") or len(chunks) != manifest.get("chunk_count"):
+        raise IndexArtifactError(
+            f"Index holds {index.ntotal} vectors and {len(chunks)} chunks but the manifest records {manifest.get('chunk_count')}"
+        )
+    apply_search_params(index, manifest.get("index_params") or {})
+    logger.info(f"Loaded index build {manifest['build_id']} ({manifest['chunk_count']} chunks, model {manifest['model_name']})")
+    return index, chunks, manifest
@@ -0,0 +1,65 @@
+import argparse
+import logging
+import sys
+from datetime import date, timedelta
+
+from app.database import SessionLocal
+from app import rollups
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+
+def backfill(start: date, end: date, metrics=None, chunk_days: int = 31, overwrite: bool = False) -> dict:
+    """
+    Rebuild the daily analytics rollups between `start` and `end` from the clearance,
+    event participant and user tables, one transaction per `chunk_days` days so a long
+    history does not hold one huge transaction.
+
+    The source tables only keep each row's latest timestamp, so a rebuilt day is less
+    accurate than one recorded live. By default days that already have rollup rows are
+    skipped, which makes it safe to re-run over a range that overlaps live history;
+    `overwrite=True` replaces them with the rebuilt counts.
+    """
+    totals = {}
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(end, chunk_start + timedelta(days=chunk_days - 1))
+        db = SessionLocal()
+        try:
+            written = rollups.rebuild(db, chunk_start, chunk_end, metrics, overwrite=overwrite)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        for metric, rows in written.items():
+            totals[metric] = totals.get(metric, 0) + rows
+        chunk_start = chunk_end + timedelta(days=1)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill the SPECS Nexus analytics daily rollups.")
+    # No default range: the usual run is from the first records up to the day before
+    # rollups went live, and only the operator knows those dates
+    parser.add_argument("--start", type=date.fromisoformat, required=True, help="First day (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, required=True, help="Last day (YYYY-MM-DD)")
+    parser.add_argument("--metrics", nargs="+", choices=sorted(rollups.METRICS), help="Metrics to rebuild (default all)")
+    parser.add_argument("--chunk-days", type=int, default=31, help="Days rebuilt per transaction")
+    parser.add_argument("--overwrite", action="store_true",
+                        help="Replace days that already have rollup rows (default: skip them, keeping live history)")
+    args = parser.parse_args()
+    start, end = args.start, args.end
+    if start > end:
+        parser.error("--start must not be after --end")
+
+    try:
+        totals = backfill(start, end, args.metrics, args.chunk_days, args.overwrite)
+        logging.info(f"Backfilled rollups from {start} to {end}: {totals}")
+    except Exception:
+        logging.exception("An error occurred while backfilling the analytics rollups")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
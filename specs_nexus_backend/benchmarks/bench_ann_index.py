@@ -0,0 +1,94 @@
+"""
+Recall/latency benchmark of the FAISS index types supported by build_index.py.
+
+Builds every index type over synthetic clustered unit vectors (the shape of sentence
+embeddings) and reports, against the exact Flat index: recall@k, single-query p50/p99
+latency, build time and serialized index size.
+
+Usage (from specs_nexus_backend/):
+    python -m benchmarks.bench_ann_index
+    python -m benchmarks.bench_ann_index --sizes 10000 100000 1000000 --types flat hnsw ivf_pq
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.vector_store import INDEX_TYPES, create_index, index_params
+
+
+def synthetic_vectors(n: int, dimension: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.standard_normal((clusters, dimension)).astype("float32")
+    vectors = centers[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dimension)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def serialized_bytes(index) -> int:
+    import faiss
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "index.faiss")
+        faiss.write_index(index, path)
+        return os.path.getsize(path)
+
+
+def run(n: int, dimension: int, index_types, k: int, queries: int, seed: int, overrides: dict) -> None:
+    import faiss
+
+    # Time one query at a time, as the chat endpoint does
+    faiss.omp_set_num_threads(1)
+    rng = np.random.default_rng(seed)
+    vectors = synthetic_vectors(n, dimension, max(16, n // 500), rng)
+    query_vectors = synthetic_vectors(queries, dimension, max(16, n // 500), rng)
+    ids = np.arange(n, dtype="int64")
+
+    print(f"\nn={n:,} d={dimension} k={k} queries={queries}")
+    print(f"{'type':<10} {'built as':<10} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8} {'build s':>8} {'size MB':>8}")
+    truth = None
+    for index_type in ["flat"] + [t for t in index_types if t != "flat"]:
+        params = index_params(index_type, overrides)
+        if index_type.startswith("ivf") and overrides.get("nlist") is None:
+            # Scale the cell count with the corpus so every cell gets enough training points
+            params["nlist"] = min(params["nlist"], max(16, int(np.sqrt(n))))
+        started = time.perf_counter()
+        index, built_type = create_index(index_type, dimension, params, vectors)
+        index.add_with_ids(vectors, ids)
+        build_seconds = time.perf_counter() - started
+
+        latencies, results = [], []
+        for query in query_vectors:
+            started = time.perf_counter()
+            _, found = index.search(query.reshape(1, -1), k)
+            latencies.append(time.perf_counter() - started)
+            results.append(found[0])
+        results = np.array(results)
+        if truth is None:
+            truth = results
+        recall = np.mean([len(set(r) & set(t)) / k for r, t in zip(results, truth)])
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        size_mb = serialized_bytes(index) / 1e6
+        print(f"{index_type:<10} {built_type:<10} {recall:>9.3f} {p50:>8.3f} {p99:>8.3f} {build_seconds:>8.2f} {size_mb:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FAISS index types for the chat index.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000], help="Corpus sizes to test")
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=list(INDEX_TYPES))
+    parser.add_argument("--dimension", type=int, default=384, help="Vector dimension (MiniLM is 384)")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ef-search", type=int, help="HNSW query-time search depth")
+    parser.add_argument("--nlist", type=int, help="IVF cell count (default: sqrt(n), at most 1024)")
+    parser.add_argument("--nprobe", type=int, help="IVF cells scanned per query")
+    args = parser.parse_args()
+    overrides = {"ef_search": args.ef_search, "nlist": args.nlist, "nprobe": args.nprobe}
+    for n in args.sizes:
+        run(n, args.dimension, args.types, args.k, args.queries, args.seed, overrides)
+
+
+if __name__ == "__main__":
+    main()
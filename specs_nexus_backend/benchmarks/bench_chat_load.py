@@ -0,0 +1,243 @@
+"""
+Offline load test of the chat endpoints.
+
+Starts the fake completion server and the API (uvicorn, SQLite database in a temporary
+directory, no network needed once the embedding model is in the local Hugging Face
+cache), then drives N concurrent clients against POST /chat/ or POST /chat/stream.
+For each concurrency level it reports throughput, p50/p95/p99 end-to-end latency (and
+time to first token when streaming), the time spent in each pipeline stage as reported
+by the server (embed, retrieve, llm), and how long the event loop was blocked.
+
+Usage (from specs_nexus_backend/):
+    python -m benchmarks.bench_chat_load
+    python -m benchmarks.bench_chat_load --concurrency 1 16 64 --requests 400 --stream
+    python -m benchmarks.bench_chat_load --max-p95-ms 800   # exit 1 on regression
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+import numpy as np
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+QUESTIONS = [
+    "How do I register for an event?",
+    "What is SPECS Nexus?",
+    "How can I pay my membership fee?",
+    "Where can I see the latest announcements?",
+    "How do I update my profile?",
+    "What are the requirements for membership?",
+    "How do I check my clearance status?",
+    "When does event registration close?",
+]
+
+
+def parse_server_timing(header: str) -> dict:
+    timings = {}
+    for part in filter(None, (p.strip() for p in header.split(","))):
+        name, _, rest = part.partition(";")
+        if rest.startswith("dur="):
+            timings[name] = float(rest[4:])
+    return timings
+
+
+def percentiles(values, qs=(50, 95, 99)) -> list:
+    return [round(float(np.percentile(values, q)), 1) if values else 0.0 for q in qs]
+
+
+def start_process(args, env, name):
+    log = open(os.path.join(env["BENCH_TMP"], f"{name}.log"), "w")
+    return subprocess.Popen([sys.executable, *args], cwd=BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_ready(client: httpx.AsyncClient, url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            response = await client.get(url)
+            if response.status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"{url} was not ready after {timeout}s")
+
+
+async def one_request(client: httpx.AsyncClient, base_url: str, message: str, stream: bool) -> dict:
+    started = time.perf_counter()
+    result = {"ok": False, "timings": {}, "ttft_ms": None}
+    if not stream:
+        response = await client.post(f"{base_url}/chat/", json={"message": message})
+        result["ok"] = response.status_code == 200
+        result["timings"] = parse_server_timing(response.headers.get("server-timing", ""))
+    else:
+        async with client.stream("POST", f"{base_url}/chat/stream", json={"message": message}) as response:
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[7:]
+                elif line.startswith("data: "):
+                    data = json.loads(line[6:])
+                    if event is None and result["ttft_ms"] is None:
+                        result["ttft_ms"] = (time.perf_counter() - started) * 1000
+                    elif event == "done":
+                        result["ok"] = True
+                        result["timings"] = data.get("timings_ms", {})
+                    elif event == "error":
+                        break
+    result["latency_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+
+async def run_level(client: httpx.AsyncClient, base_url: str, concurrency: int, total: int, stream: bool,
+                    distinct: bool) -> dict:
+    await client.get(f"{base_url}/metrics/event-loop", params={"reset": "true"})
+    counter = iter(range(total))
+    results = []
+
+    async def worker():
+        for i in counter:
+            message = QUESTIONS[i % len(QUESTIONS)]
+            if distinct:
+                # Defeats the embedding and answer caches, so every request does the full work
+                message = f"{message} ({concurrency}-{i})"
+            try:
+                results.append(await one_request(client, base_url, message, stream))
+            except httpx.HTTPError:
+                results.append({"ok": False, "timings": {}, "ttft_ms": None, "latency_ms": 0.0})
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    loop_stats = (await client.get(f"{base_url}/metrics/event-loop")).json()
+
+    ok = [r for r in results if r["ok"]]
+    stages = defaultdict(list)
+    for r in ok:
+        for name, ms in r["timings"].items():
+            stages[name].append(ms)
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "throughput_rps": round(len(ok) / elapsed, 2),
+        "latency_ms": dict(zip(("p50", "p95", "p99"), percentiles([r["latency_ms"] for r in ok]))),
+        "ttft_ms": dict(zip(("p50", "p95", "p99"), percentiles([r["ttft_ms"] for r in ok if r["ttft_ms"] is not None]))),
+        "stages_ms": {name: dict(zip(("p50", "p95"), percentiles(values, (50, 95)))) for name, values in stages.items()},
+        "event_loop": loop_stats,
+    }
+
+
+def print_report(report: dict, stream: bool) -> None:
+    lat = report["latency_ms"]
+    loop = report["event_loop"]
+    print(f"\nconcurrency={report['concurrency']} requests={report['requests']} errors={report['errors']} "
+          f"throughput={report['throughput_rps']} req/s")
+    print(f"  end-to-end ms   p50 {lat['p50']:>8}  p95 {lat['p95']:>8}  p99 {lat['p99']:>8}")
+    if stream:
+        ttft = report["ttft_ms"]
+        print(f"  first token ms  p50 {ttft['p50']:>8}  p95 {ttft['p95']:>8}  p99 {ttft['p99']:>8}")
+    for name, values in sorted(report["stages_ms"].items()):
+        print(f"  {name:<15} p50 {values['p50']:>8}  p95 {values['p95']:>8}")
+    print(f"  event loop lag  p50 {loop['lag_ms']['p50']:>8}  p99 {loop['lag_ms']['p99']:>8}  max {loop['lag_ms']['max']:>8}"
+          f"  blocked {loop['blocked_ms']} ms in {loop['blocked_count']} stalls")
+
+
+async def run(args, base_url: str) -> list:
+    limits = httpx.Limits(max_connections=max(args.concurrency) + 4, max_keepalive_connections=max(args.concurrency))
+    async with httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(120)) as client:
+        await wait_ready(client, f"{base_url}/chat/ready", args.startup_timeout)
+        # Warm up the encoder, the index pages and the connection pools
+        await run_level(client, base_url, 2, 10, args.stream, args.distinct)
+        reports = []
+        for concurrency in args.concurrency:
+            report = await run_level(client, base_url, concurrency, args.requests, args.stream, args.distinct)
+            print_report(report, args.stream)
+            reports.append(report)
+        return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test of the chat endpoints.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--stream", action="store_true", help="Use POST /chat/stream")
+    parser.add_argument("--repeat-queries", dest="distinct", action="store_false",
+                        help="Reuse the same questions so the caches can serve them")
+    parser.add_argument("--answer-cache", action="store_true", help="Keep the semantic answer cache enabled")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-jitter-ms", type=float, default=50)
+    parser.add_argument("--llm-tokens", type=int, default=40)
+    parser.add_argument("--llm-token-interval-ms", type=float, default=20)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--app-port", type=int, default=8100)
+    parser.add_argument("--llm-port", type=int, default=9100)
+    parser.add_argument("--url", help="Benchmark an already running API instead of starting one")
+    parser.add_argument("--startup-timeout", type=float, default=180)
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--max-p95-ms", type=float, help="Exit with status 1 if any level's p95 latency exceeds this")
+    args = parser.parse_args()
+
+    processes = []
+    with tempfile.TemporaryDirectory() as tmp:
+        base_url = args.url
+        if base_url is None:
+            env = dict(
+                os.environ,
+                BENCH_TMP=tmp,
+                LLM_API_URL=f"http://127.0.0.1:{args.llm_port}/v1/chat/completions",
+                LLM_API_KEY="benchmark",
+                LLM_MAX_CONNECTIONS=str(max(args.concurrency) + 4),
+                LLM_MAX_KEEPALIVE=str(max(args.concurrency)),
+                DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.sqlite3')}",
+                EMBEDDING_CACHE_PATH=os.path.join(tmp, "embedding_cache.sqlite3"),
+                ANSWER_CACHE_ENABLED="1" if args.answer_cache else "0",
+                CHAT_WARMUP="startup",
+                LOOP_LAG_MONITOR_INTERVAL="0.005",
+                HF_HUB_OFFLINE="1",
+                TRANSFORMERS_OFFLINE="1",
+            )
+            processes.append(start_process([
+                "-m", "benchmarks.fake_llm_server", "--port", str(args.llm_port),
+                "--latency-ms", str(args.llm_latency_ms), "--jitter-ms", str(args.llm_jitter_ms),
+                "--tokens", str(args.llm_tokens), "--token-interval-ms", str(args.llm_token_interval_ms),
+                "--error-rate", str(args.llm_error_rate),
+            ], env, "fake_llm"))
+            processes.append(start_process([
+                "-m", "uvicorn", "app.main:app", "--port", str(args.app_port), "--log-level", "warning",
+            ], env, "app"))
+            base_url = f"http://127.0.0.1:{args.app_port}"
+        try:
+            reports = asyncio.run(run(args, base_url))
+        except Exception:
+            for name in ("app", "fake_llm"):
+                path = os.path.join(tmp, f"{name}.log")
+                if os.path.exists(path):
+                    with open(path) as f:
+                        print(f"--- {name}.log (tail) ---\n{f.read()[-3000:]}", file=sys.stderr)
+            raise
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait(timeout=10)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+    if args.max_p95_ms is not None:
+        slow = [r for r in reports if r["latency_ms"]["p95"] > args.max_p95_ms or r["errors"]]
+        if slow:
+            print(f"FAIL: p95 above {args.max_p95_ms} ms or errors at concurrency {[r['concurrency'] for r in slow]}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark of the event check-in path: token verification and batched attendance writes.
+
+Seeds one event with --members participants and issues each a check-in token, then
+scans them all from --concurrency threads (duplicates included, as a door scanner
+re-reads codes) through the attendance buffer. Reports verification throughput, scan
+throughput, and how many INSERT statements the flushes needed. Checks that every
+member is checked in exactly once and that the dashboard snapshot and daily rollups
+count the same attendance. Exits with status 1 on any mismatch.
+
+Uses a throwaway SQLite database unless --database-url points at a real server.
+
+Usage (from specs_nexus_backend/):
+    python -m benchmarks.bench_checkin
+    python -m benchmarks.bench_checkin --members 5000 --batch-size 500 --concurrency 16
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of event check-in.")
+    parser.add_argument("--members", type=int, default=2000)
+    parser.add_argument("--rescans", type=float, default=0.2, help="Fraction of codes scanned twice")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--database-url", help="Database to run against (default: a temporary SQLite file)")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tmp.name, 'checkin.sqlite3')}"
+
+    from sqlalchemy import event as sa_event
+
+    from app import models, rollups
+    from app.analytics_snapshot import analytics_snapshot
+    from app.attendance import AttendanceBuffer, issue_token, verify_token
+    from app.database import SessionLocal, engine
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    first_user = (db.query(models.User.id).order_by(models.User.id.desc()).limit(1).scalar() or 0) + 1
+    user_ids = list(range(first_user, first_user + args.members))
+    db.bulk_insert_mappings(models.User, [
+        {"id": user_id, "email": f"checkin{user_id}@example.com", "student_number": f"K{user_id:08d}",
+         "full_name": f"Member {user_id}", "year": "2nd Year"}
+        for user_id in user_ids
+    ])
+    event = models.Event(title="Check-in test", description="", date=datetime.utcnow())
+    db.add(event)
+    db.commit()
+    event_id = event.id
+    db.execute(models.event_participants.insert(), [{"event_id": event_id, "user_id": u} for u in user_ids])
+    db.commit()
+    analytics_snapshot.get(db)
+
+    expires_at = datetime.utcnow() + timedelta(hours=2)
+    tokens = [issue_token(event_id, user_id, expires_at) for user_id in user_ids]
+    started = time.perf_counter()
+    for token in tokens:
+        verify_token(token)
+    elapsed = time.perf_counter() - started
+    print(f"Verified {len(tokens)} tokens in {elapsed * 1000:.1f} ms ({len(tokens) / elapsed:.0f}/s, no queries)")
+
+    inserts = []
+
+    def count_inserts(conn, cursor, statement, parameters, context, executemany):
+        if "INSERT" in statement.upper() and "event_attendance" in statement:
+            inserts.append(statement)
+
+    sa_event.listen(engine, "before_cursor_execute", count_inserts)
+    buffer = AttendanceBuffer(batch_size=args.batch_size)
+    scans = tokens + random.Random(0).sample(tokens, int(len(tokens) * args.rescans))
+    random.Random(1).shuffle(scans)
+
+    def scan(token):
+        scanned_event, user_id = verify_token(token)
+        return buffer.add(scanned_event, user_id, datetime.utcnow(), None)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(scan, scans))
+    buffer.flush()
+    elapsed = time.perf_counter() - started
+    print(f"Scanned {len(scans)} codes in {elapsed:.2f}s ({len(scans) / elapsed:.0f}/s), "
+          f"{len(inserts)} attendance INSERT statements, {buffer.inserted} check-ins")
+
+    failures = []
+    checked_in = db.query(models.EventAttendance.user_id).filter(models.EventAttendance.event_id == event_id).all()
+    if sorted(user_id for user_id, in checked_in) != user_ids:
+        failures.append(f"expected {len(user_ids)} distinct check-ins, found {len(checked_in)}")
+    body, _ = analytics_snapshot.get(db)
+    dashboard = {e["title"]: e for e in json.loads(body)["eventsEngagement"]["events"]}
+    if dashboard["Check-in test"]["attendance_count"] != len(user_ids):
+        failures.append(f"dashboard shows {dashboard['Check-in test']['attendance_count']} check-ins")
+    series = rollups.query_series(db, "event_attendance", date.today(), date.today(), filters={"event_id": event_id})
+    if series["series"][0]["total"] != len(user_ids):
+        failures.append(f"rollups show {series['series'][0]['total']} check-ins")
+    db.close()
+
+    tmp.cleanup()
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK: every member checked in once, dashboard and rollups agree")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Query count and latency of the analytics dashboard aggregation.
+
+Seeds a throwaway SQLite database (or the database in DATABASE_URL with --no-seed) with
+members, clearances, events and participants, then runs compute_dashboard() and counts
+the SQL statements it issues. Exits with status 1 if the count exceeds --max-queries, so
+an N+1 regression (e.g. touching Event.participants per event) fails loudly.
+
+Usage (from specs_nexus_backend/):
+    python -m benchmarks.bench_dashboard
+    python -m benchmarks.bench_dashboard --members 20000 --events 300
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+
+def seed(db, models, members: int, events: int, participants_per_event: int, rng: random.Random) -> None:
+    now = datetime.now()
+    years = ["1st Year", "2nd Year", "3rd Year", "4th Year", None]
+    db.bulk_insert_mappings(models.User, [
+        {
+            "id": i + 1,
+            "email": f"member{i}@example.com",
+            "student_number": f"S{i:07d}",
+            "full_name": f"Member {i}",
+            "year": rng.choice(years),
+            "last_active": now - timedelta(days=rng.randint(0, 90)),
+        }
+        for i in range(members)
+    ])
+    requirement_ids = []
+    for name in ("1st Semester Membership", "2nd Semester Membership"):
+        requirement = models.Requirement(name=name, amount=100.0, archived=False)
+        db.add(requirement)
+        db.flush()
+        requirement_ids.append(requirement.id)
+    db.bulk_insert_mappings(models.Clearance, [
+        {
+            "user_id": i + 1,
+            "requirement_id": requirement_id,
+            "status": rng.choice(["Clear", "Processing", "Not Yet Cleared"]),
+            "payment_status": rng.choice(["Not Paid", "Verifying", "Paid"]),
+            "payment_method": rng.choice(["GCash", "PayMaya", "Cash", None]),
+            "archived": False,
+        }
+        for i in range(members)
+        for requirement_id in requirement_ids
+    ])
+    db.bulk_insert_mappings(models.Event, [
+        {"id": e + 1, "title": f"Event {e}", "date": now - timedelta(days=rng.randint(0, 720)), "archived": False}
+        for e in range(events)
+    ])
+    db.execute(models.event_participants.insert(), [
+        {"event_id": e + 1, "user_id": user_id}
+        for e in range(events)
+        for user_id in rng.sample(range(1, members + 1), min(members, participants_per_event))
+    ])
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analytics dashboard aggregation.")
+    parser.add_argument("--members", type=int, default=5000)
+    parser.add_argument("--events", type=int, default=100)
+    parser.add_argument("--participants", type=int, default=200, help="Participants per event")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--max-queries", type=int, default=4)
+    parser.add_argument("--no-seed", action="store_true", help="Use DATABASE_URL as is instead of a seeded SQLite file")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    if not args.no_seed:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp.name, 'dashboard.sqlite3')}"
+
+    from sqlalchemy import event
+
+    from app import models
+    from app.dashboard import compute_dashboard
+    from app.database import SessionLocal, engine
+
+    db = SessionLocal()
+    if not args.no_seed:
+        models.Base.metadata.create_all(bind=engine)
+        started = time.perf_counter()
+        seed(db, models, args.members, args.events, args.participants, random.Random(0))
+        print(f"Seeded {args.members} members, {args.events} events in {time.perf_counter() - started:.1f}s")
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *rest: statements.append(statement))
+    durations = []
+    for run in range(args.runs):
+        statements.clear()
+        started = time.perf_counter()
+        compute_dashboard(db)
+        durations.append(time.perf_counter() - started)
+        db.rollback()
+    db.close()
+    tmp.cleanup()
+
+    p50, p95 = np.percentile(durations, [50, 95]) * 1000
+    print(f"compute_dashboard: {len(statements)} queries, p50 {p50:.1f} ms, p95 {p95:.1f} ms over {args.runs} runs")
+    if len(statements) > args.max_queries:
+        print(f"FAIL: {len(statements)} queries, expected at most {args.max_queries}")
+        for statement in statements:
+            print("  " + " ".join(statement.split())[:160])
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Parity check and benchmark of the embedding backends (PyTorch vs quantized ONNX).
+
+Parity: encodes the knowledge base chunks and a set of typical questions with both
+backends and checks the cosine similarity of each pair of vectors. Exits with status 1
+if any pair falls below --min-cosine. export_onnx.py runs the same check on every
+export; this adds the questions and the benchmark.
+
+Benchmark: each backend is measured in a fresh subprocess so peak RSS is not polluted by
+the other one. Reports load time, single-query p50/p99 latency, batch throughput and
+peak RSS.
+
+Usage (from specs_nexus_backend/, after `python export_onnx.py`):
+    python -m benchmarks.bench_encoders
+    python -m benchmarks.bench_encoders --skip-benchmark --min-cosine 0.99
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from app.encoders import load_encoder, onnx_parity
+from build_index import EMBEDDING_MODEL_NAME, split_chunks
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+QUESTIONS = [
+    "How do I register for an event?",
+    "What is SPECS Nexus?",
+    "How can I pay my membership fee?",
+    "Where can I see the latest announcements?",
+    "How do I update my profile picture?",
+    "What are the requirements for membership?",
+    "Who are the officers of the organization?",
+    "When does registration for the next event close?",
+]
+
+
+def sample_texts() -> list:
+    with open(os.path.join(BASE_DIR, "system_info.txt"), "r", encoding="utf-8") as f:
+        return split_chunks(f.read()) + QUESTIONS
+
+
+def parity(model_name: str, min_cosine: float) -> bool:
+    texts = sample_texts()
+    cosines = onnx_parity(model_name, texts)
+    print(f"Parity over {len(texts)} texts: min cosine {cosines.min():.4f}, mean {cosines.mean():.4f}")
+    worst = int(np.argmin(cosines))
+    print(f"  worst: {texts[worst][:60]!r}")
+    return bool(cosines.min() >= min_cosine)
+
+
+def measure(model_name: str, backend: str, queries: int, batch_size: int) -> dict:
+    """Runs in a subprocess; returns the numbers for one backend."""
+    texts = sample_texts()
+    started = time.perf_counter()
+    encoder = load_encoder(model_name, backend)
+    load_seconds = time.perf_counter() - started
+    encoder.encode(texts[:2])
+
+    latencies = []
+    for i in range(queries):
+        started = time.perf_counter()
+        encoder.encode([QUESTIONS[i % len(QUESTIONS)]])
+        latencies.append(time.perf_counter() - started)
+
+    batch = [texts[i % len(texts)] for i in range(batch_size)]
+    started = time.perf_counter()
+    rounds = 5
+    for _ in range(rounds):
+        encoder.encode(batch)
+    throughput = rounds * batch_size / (time.perf_counter() - started)
+
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    return {
+        "backend": backend,
+        "model_id": encoder.model_id,
+        "load_s": round(load_seconds, 2),
+        "p50_ms": round(float(p50), 2),
+        "p99_ms": round(float(p99), 2),
+        "texts_per_s": round(throughput, 1),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the torch and onnx embedding backends.")
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="Parity threshold")
+    parser.add_argument("--queries", type=int, default=200, help="Single-query encodes to time")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--skip-benchmark", action="store_true")
+    parser.add_argument("--measure", choices=["torch", "onnx"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.model, args.measure, args.queries, args.batch_size)))
+        return
+
+    ok = parity(args.model, args.min_cosine)
+    if not args.skip_benchmark:
+        print(f"\n{'backend':<8} {'load s':>7} {'p50 ms':>8} {'p99 ms':>8} {'texts/s':>9} {'RSS MB':>8}")
+        for backend in ("torch", "onnx"):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_encoders", "--measure", backend, "--model", args.model,
+                 "--queries", str(args.queries), "--batch-size", str(args.batch_size)],
+                cwd=BASE_DIR, capture_output=True, text=True, check=True,
+            ).stdout
+            row = json.loads(output.strip().splitlines()[-1])
+            print(f"{backend:<8} {row['load_s']:>7} {row['p50_ms']:>8} {row['p99_ms']:>8} "
+                  f"{row['texts_per_s']:>9} {row['peak_rss_mb']:>8}")
+    if not ok:
+        print(f"FAIL: cosine agreement below {args.min_cosine}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark of creating a membership requirement for every member.
+
+Seeds --users members, --existing of whom already have the requirement, then runs the
+set-based requirements.create_for_all_members() and reports its latency and SQL
+statement count. Checks that every member ends up with exactly one active clearance for
+the requirement and that the rollups counted the new ones. With --compare-legacy the
+new clearances are removed again and the old per-member loop (one SELECT per member,
+one ORM insert per row) recreates them for comparison; expect it to take minutes at 100k
+members. Exits with status 1 on
+any mismatch or if the statement count exceeds --max-queries.
+
+Uses a throwaway SQLite database unless --database-url points at a real server.
+
+Usage (from specs_nexus_backend/):
+    python -m benchmarks.bench_requirements
+    python -m benchmarks.bench_requirements --users 100000
+    python -m benchmarks.bench_requirements --users 10000 --compare-legacy
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+REQUIREMENT = "2nd Semester Membership"
+
+
+def seed(db, models, users: int, existing: int) -> int:
+    """Seed members and their clearances; returns the id of the REQUIREMENT catalog entry."""
+    years = ["1st Year", "2nd Year", "3rd Year", "4th Year", None]
+    db.bulk_insert_mappings(models.User, [
+        {"id": i + 1, "email": f"member{i}@example.com", "student_number": f"S{i:07d}",
+         "full_name": f"Member {i}", "year": years[i % len(years)]}
+        for i in range(users)
+    ])
+    first = models.Requirement(name="1st Semester Membership", amount=100.0, archived=False)
+    second = models.Requirement(name=REQUIREMENT, amount=100.0, archived=False)
+    db.add_all([first, second])
+    db.flush()
+    db.bulk_insert_mappings(models.Clearance, [
+        {"user_id": i + 1, "requirement_id": requirement_id, "payment_status": "Not Paid",
+         "status": "Not Yet Cleared", "archived": False}
+        for i in range(users)
+        for requirement_id in ([first.id] + ([second.id] if i < existing else []))
+    ])
+    db.commit()
+    return second.id
+
+
+def legacy_create(db, models, requirement_id: int) -> int:
+    """The per-member implementation this benchmark replaces, for comparison."""
+    created = 0
+    for user in db.query(models.User).all():
+        existing = db.query(models.Clearance).filter(
+            models.Clearance.user_id == user.id,
+            models.Clearance.requirement_id == requirement_id,
+            models.Clearance.archived == False
+        ).first()
+        if not existing:
+            db.add(models.Clearance(user_id=user.id, requirement_id=requirement_id, payment_status="Not Paid",
+                                    status="Not Yet Cleared", receipt_path="", archived=False))
+            created += 1
+    db.commit()
+    return created
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bulk membership requirement creation.")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--existing", type=int, default=None, help="Members who already have it (default: 10%%)")
+    parser.add_argument("--max-queries", type=int, default=16, help="One INSERT per member year (5) plus fixed overhead")
+    parser.add_argument("--compare-legacy", action="store_true", help="Also time the per-member implementation")
+    parser.add_argument("--database-url", help="Database to run against (default: a temporary SQLite file)")
+    args = parser.parse_args()
+    existing = args.users // 10 if args.existing is None else args.existing
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tmp.name, 'requirements.sqlite3')}"
+
+    from sqlalchemy import event, func
+
+    from app import models, requirements, rollups
+    from app.database import SessionLocal, engine
+
+    failures = []
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    print(f"Seeding {args.users} members, {existing} with '{REQUIREMENT}' already")
+    requirement_id = seed(db, models, args.users, existing)
+
+    last_id = db.query(func.max(models.Clearance.id)).scalar()
+    statements = []
+    listener = lambda conn, cursor, statement, *rest: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    started = time.perf_counter()
+    members, created_by_year = requirements.create_for_all_members(db, REQUIREMENT, 150.0)
+    db.commit()
+    elapsed = time.perf_counter() - started
+    event.remove(engine, "before_cursor_execute", listener)
+    created = sum(created_by_year.values())
+    print(f"Set-based: created {created} of {members} in {elapsed * 1000:.0f} ms with {len(statements)} statements")
+    if len(statements) > args.max_queries:
+        failures.append(f"{len(statements)} statements, more than --max-queries {args.max_queries}")
+
+    per_member = db.query(models.Clearance.user_id, func.count(models.Clearance.id))\
+        .filter(models.Clearance.requirement_id == requirement_id, models.Clearance.archived == False)\
+        .group_by(models.Clearance.user_id).all()
+    if len(per_member) != args.users or any(count != 1 for _, count in per_member):
+        failures.append("not every member has exactly one active clearance for the requirement")
+    if created != args.users - existing:
+        failures.append(f"expected {args.users - existing} new clearances, got {created}")
+    series = rollups.query_series(db, "payments", date.today(), date.today(),
+                                  filters={"requirement": REQUIREMENT, "payment_status": "Not Paid"})
+    if series["series"][0]["total"] != created:
+        failures.append(f"rollups counted {series['series'][0]['total']} new clearances")
+
+    if args.compare_legacy:
+        db.query(models.Clearance).filter(models.Clearance.id > last_id).delete(synchronize_session=False)
+        db.commit()
+        started = time.perf_counter()
+        legacy_created = legacy_create(db, models, requirement_id)
+        legacy_elapsed = time.perf_counter() - started
+        print(f"Per-member: created {legacy_created} in {legacy_elapsed * 1000:.0f} ms "
+              f"({legacy_elapsed / elapsed:.0f}x slower)")
+    db.close()
+
+    tmp.cleanup()
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
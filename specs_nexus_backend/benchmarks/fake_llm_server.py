@@ -0,0 +1,94 @@
+"""
+Local stand-in for the OpenAI-compatible completion API, for offline benchmarks.
+
+Answers every request with a canned reply after a configurable delay, either as one JSON
+body or as an SSE token stream, and can inject errors to exercise retries and the circuit
+breaker. Point the app at it with LLM_API_URL=http://127.0.0.1:<port>/v1/chat/completions.
+
+Usage (from specs_nexus_backend/):
+    python -m benchmarks.fake_llm_server --port 9100 --latency-ms 300 --token-interval-ms 20
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ANSWER = (
+    "SPECS Nexus lets members register for events, read announcements and track their membership "
+    "status from the Dashboard, Profile, Events, Announcements and Memberships pages."
+)
+
+
+def create_app(latency_ms: float = 300, jitter_ms: float = 50, tokens: int = 40, token_interval_ms: float = 20,
+               error_rate: float = 0.0) -> FastAPI:
+    app = FastAPI(title="Fake LLM")
+    words = ANSWER.split()
+    stats = {"requests": 0, "streams": 0, "errors": 0}
+
+    def delay() -> float:
+        return max(0.0, random.gauss(latency_ms, jitter_ms)) / 1000
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        payload = await request.json()
+        stats["requests"] += 1
+        if error_rate and random.random() < error_rate:
+            stats["errors"] += 1
+            return JSONResponse(status_code=503, content={"error": "injected failure"})
+        reply = [words[i % len(words)] for i in range(tokens)]
+        created = int(time.time())
+        usage = {"prompt_tokens": sum(len(m.get("content", "").split()) for m in payload.get("messages", [])),
+                 "completion_tokens": tokens}
+
+        if not payload.get("stream"):
+            # Total time of a non-streamed answer is time to first token plus generation time
+            await asyncio.sleep(delay() + tokens * token_interval_ms / 1000)
+            return {
+                "id": "fake-completion",
+                "created": created,
+                "model": payload.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(reply)}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        stats["streams"] += 1
+
+        async def events():
+            await asyncio.sleep(delay())
+            for i, word in enumerate(reply):
+                chunk = {"choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(token_interval_ms / 1000)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    def server_stats():
+        return stats
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible completion server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=300, help="Mean time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=50, help="Standard deviation of the latency")
+    parser.add_argument("--tokens", type=int, default=40, help="Tokens per answer")
+    parser.add_argument("--token-interval-ms", type=float, default=20, help="Delay between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    args = parser.parse_args()
+    app = create_app(args.latency_ms, args.jitter_ms, args.tokens, args.token_interval_ms, args.error_rate)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
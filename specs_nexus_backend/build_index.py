@@ -1,68 +1,234 @@
+import argparse
 import os
 import pickle
+import sys
 import numpy as np
-import faiss
 import logging
-from sentence_transformers import SentenceTransformer
+from typing import List, Optional
+
+from app.embedding_cache import EMBEDDING_CACHE_PATH, EmbeddingCache
+from app.encoders import EMBEDDING_BACKEND, encoder_model_id, load_encoder
+from app.vector_store import (
+    INDEX_TYPES,
+    IndexArtifactError,
+    chunk_hash,
+    chunk_id,
+    create_index,
+    index_params,
+    load_artifacts,
+    supports_removal,
+    write_artifacts,
+)
 
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
-def build_index(data_path: str, index_path: str, mapping_path: str, delimiter: str = "\n\n") -> None:
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+# flat is exact and the right choice for a small knowledge base; see vector_store.INDEX_TYPES
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat")
+
+def split_chunks(data: str, delimiter: str = "\n\n") -> List[str]:
+    """Split the knowledge base into stripped, non-empty chunks, dropping exact duplicates."""
+    seen = set()
+    documents = []
+    for chunk in data.split(delimiter):
+        chunk = chunk.strip()
+        if chunk and chunk not in seen:
+            seen.add(chunk)
+            documents.append(chunk)
+    return documents
+
+def build_index(data_path: str, output_dir: str, delimiter: str = "\n\n", model_name: str = EMBEDDING_MODEL_NAME,
+                cache_path: str = EMBEDDING_CACHE_PATH, full_rebuild: bool = False, index_type: str = INDEX_TYPE,
+                params: Optional[dict] = None, backend: str = EMBEDDING_BACKEND) -> dict:
     """
-    Builds a FAISS index from the document chunks in the provided file and saves the index and mapping.
+    Incrementally builds the FAISS index from the document chunks in the provided file.
+
+    Each chunk is identified by the hash of its text. Embeddings are looked up in the
+    persistent embedding cache so only new or changed chunks are encoded. When a previous
+    build exists, chunks that disappeared are removed from its ID-mapped index and new
+    ones are added; otherwise the index is built from scratch. The index is also rebuilt
+    when the index type or its parameters changed, or when chunks were removed from an
+    index that cannot remove vectors (HNSW). The result is published atomically. Errors
+    are raised to the caller.
 
     Args:
         data_path (str): Path to the system information text file.
-        index_path (str): Path to save the FAISS index (pickle file).
-        mapping_path (str): Path to save the document mapping (pickle file).
+        output_dir (str): Directory holding the index builds.
         delimiter (str): Delimiter used to split the text file into chunks.
+        model_name (str): Sentence-transformers model used to embed the chunks.
+        cache_path (str): Path to the SQLite embedding cache.
+        full_rebuild (bool): Ignore the previous build and rebuild the index from all vectors.
+        index_type (str): One of vector_store.INDEX_TYPES.
+        params (dict): Overrides for the index type's default parameters.
+        backend (str): Embedding backend, "torch" or "onnx".
+
+    Returns:
+        dict: Counts of added, removed, re-encoded and total chunks.
     """
+    params = index_params(index_type, params)
+    logging.info(f"Loading data from {data_path}...")
+    with open(data_path, "r", encoding="utf-8") as f:
+        data = f.read()
+
+    documents = split_chunks(data, delimiter)
+    if not documents:
+        raise ValueError("No document chunks found. Check the dataset file formatting.")
+    hashes = [chunk_hash(document) for document in documents]
+    ids = np.array([chunk_id(digest) for digest in hashes], dtype="int64")
+    logging.info(f"Found {len(documents)} document chunks.")
+
+    # Vectors are cached per encoder, so torch and quantized ONNX vectors are never mixed
+    model_id = encoder_model_id(model_name, backend)
+    cache = EmbeddingCache(cache_path)
     try:
+        vectors = cache.get_many(model_id, hashes)
+        missing = [i for i, digest in enumerate(hashes) if digest not in vectors]
+        if missing:
+            logging.info(f"Generating embeddings for {len(missing)} new or changed chunks...")
+            encoder = load_encoder(model_name, backend)
+            encoded = encoder.encode([documents[i] for i in missing])
+            new_vectors = {hashes[i]: vector for i, vector in zip(missing, encoded)}
+            cache.put_many(model_id, new_vectors)
+            vectors.update(new_vectors)
+    finally:
+        cache.close()
+    embeddings_np = np.stack([vectors[digest] for digest in hashes]).astype("float32")
+
+    previous = None
+    if not full_rebuild:
+        try:
+            # A build from another encoder is rejected here, so its vectors are never mixed with these
+            previous = load_artifacts(output_dir, model_name=model_name, dimension=embeddings_np.shape[1],
+                                      mmap_index=False, encoder=model_id)
+        except IndexArtifactError as e:
+            logging.info(f"Building from scratch: {e}")
+
+    if previous is not None:
+        index, previous_chunks, previous_manifest = previous
+        previous_ids = set(int(i) for i in previous_chunks.ids)
+        current_ids = set(int(i) for i in ids)
+        removed = np.array(sorted(previous_ids - current_ids), dtype="int64")
+        added = [position for position, faiss_id in enumerate(ids) if int(faiss_id) not in previous_ids]
+        previous_chunks.close()
+        if (previous_manifest.get("requested_index_type", previous_manifest.get("index_type")) != index_type
+                or previous_manifest.get("index_params") != params):
+            logging.info(f"Index type or parameters changed to {index_type} {params}; rebuilding")
+            previous = None
+        elif len(removed) and not supports_removal(index):
+            logging.info(f"{previous_manifest.get('index_type')} index cannot remove vectors; rebuilding")
+            previous = None
+
+    built_type = index_type
+    if previous is not None:
+        if not len(removed) and not added:
+            logging.info("Index is already up to date.")
+            return {"added": 0, "removed": 0, "encoded": len(missing), "total": len(documents)}
+        logging.info(f"Updating the FAISS index: {len(added)} added, {len(removed)} removed...")
+        if len(removed):
+            index.remove_ids(removed)
+        if added:
+            index.add_with_ids(embeddings_np[added], ids[added])
+    else:
+        logging.info(f"Building the FAISS index ({index_type})...")
+        removed, added = [], list(range(len(documents)))
+        index, built_type = create_index(index_type, embeddings_np.shape[1], params, embeddings_np)
+        index.add_with_ids(embeddings_np, ids)
+
+    logging.info(f"Saving index artifacts to {output_dir}...")
+    manifest = write_artifacts(output_dir, index, documents, ids.tolist(), model_name, extra={
+        "index_type": built_type,
+        # Kept so a build that fell back to flat is not rebuilt on every run
+        "requested_index_type": index_type,
+        "index_params": params,
+        "encoder": model_id,
+    })
+
+    logging.info(f"System index build {manifest['build_id']} saved successfully!")
+    return {"added": len(added), "removed": len(removed), "encoded": len(missing), "total": len(documents)}
+
+def convert_pickle_index(index_path: str, mapping_path: str, output_dir: str, model_name: str = EMBEDDING_MODEL_NAME,
+                         cache_path: str = EMBEDDING_CACHE_PATH) -> None:
+    """
+    Converts a legacy pickled FAISS index and document mapping to the native index format
+    without re-embedding the documents. The vectors are also stored in the embedding cache
+    so later incremental builds do not encode these chunks again.
 
-        logging.info(f"Loading data from {data_path}...")
-        with open(data_path, "r", encoding="utf-8") as f:
-            data = f.read()
-
-
-        documents = [chunk.strip() for chunk in data.split(delimiter) if chunk.strip()]
-        if not documents:
-            raise ValueError("No document chunks found. Check the dataset file formatting.")
-
-        logging.info(f"Found {len(documents)} document chunks.")
-
-
-        logging.info("Generating embeddings...")
-        embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-        embeddings = embedding_model.encode(documents)
-
-        # Convert embeddings to a NumPy array of type float32
-        embeddings_np = np.array(embeddings).astype("float32")
-
-
-        logging.info("Building the FAISS index...")
-        index = faiss.IndexFlatL2(embeddings_np.shape[1])
-        index.add(embeddings_np)
-
-        logging.info(f"Saving FAISS index to {index_path}...")
-        with open(index_path, "wb") as f:
-            pickle.dump(index, f)
-
-        logging.info(f"Saving document mapping to {mapping_path}...")
-        with open(mapping_path, "wb") as f:
-            pickle.dump(documents, f)
-
-        logging.info("System index built and saved successfully!")
-    except Exception as e:
-        logging.error("An error occurred while building the system index:")
-        logging.error(e)
+    Args:
+        index_path (str): Path to the pickled FAISS index.
+        mapping_path (str): Path to the pickled document list.
+        output_dir (str): Directory holding the index builds.
+        model_name (str): Model the pickled index was built with.
+        cache_path (str): Path to the SQLite embedding cache.
+    """
+    import faiss
+
+    # Pickled indexes reference the SWIG module of the CPU build that wrote them
+    # (e.g. faiss.swigfaiss_avx2); point those names at whichever build is loaded here.
+    swig_module = next(module for name, module in list(sys.modules.items()) if name.startswith("faiss.swigfaiss"))
+    for variant in ("swigfaiss", "swigfaiss_avx2", "swigfaiss_avx512", "swigfaiss_avx512_spr"):
+        sys.modules.setdefault(f"faiss.{variant}", swig_module)
+
+    logging.info(f"Converting {index_path} and {mapping_path}...")
+    with open(index_path, "rb") as f:
+        legacy_index = pickle.load(f)
+    with open(mapping_path, "rb") as f:
+        legacy_documents = pickle.load(f)
+    legacy_vectors = legacy_index.reconstruct_n(0, legacy_index.ntotal)
+
+    vectors_by_hash = {}
+    documents = []
+    for document, vector in zip(legacy_documents, legacy_vectors):
+        digest = chunk_hash(document)
+        if digest not in vectors_by_hash:
+            vectors_by_hash[digest] = vector
+            documents.append(document)
+    hashes = list(vectors_by_hash)
+    ids = np.array([chunk_id(digest) for digest in hashes], dtype="int64")
+
+    index = faiss.IndexIDMap2(faiss.IndexFlatL2(legacy_index.d))
+    index.add_with_ids(np.stack([vectors_by_hash[digest] for digest in hashes]), ids)
+
+    cache = EmbeddingCache(cache_path)
+    try:
+        cache.put_many(model_name, vectors_by_hash)
+    finally:
+        cache.close()
+    manifest = write_artifacts(output_dir, index, documents, ids.tolist(), model_name)
+    logging.info(f"Converted {manifest['chunk_count']} chunks to {output_dir}")
 
 def main():
-    data_file = "system_info.txt"
-    index_file = "faiss_system_index.pkl"
-    mapping_file = "system_doc_mapping.pkl"
+    parser = argparse.ArgumentParser(description="Build the SPECS Nexus chatbot index.")
+    parser.add_argument("--data", default="system_info.txt", help="Knowledge base text file")
+    parser.add_argument("--output", default="system_index", help="Index artifact directory")
+    parser.add_argument("--full", action="store_true", help="Ignore the previous build and rebuild the index")
+    parser.add_argument("--from-pickle", action="store_true",
+                        help="Convert faiss_system_index.pkl/system_doc_mapping.pkl instead of re-embedding")
+    parser.add_argument("--backend", default=EMBEDDING_BACKEND, choices=["torch", "onnx"], help="Embedding backend")
+    parser.add_argument("--index-type", default=INDEX_TYPE, choices=sorted(INDEX_TYPES), help="FAISS index type")
+    parser.add_argument("--hnsw-m", dest="m", type=int, help="HNSW neighbours per node")
+    parser.add_argument("--ef-construction", type=int, help="HNSW build-time search depth")
+    parser.add_argument("--ef-search", type=int, help="HNSW query-time search depth")
+    parser.add_argument("--nlist", type=int, help="IVF cell count")
+    parser.add_argument("--nprobe", type=int, help="IVF cells scanned per query")
+    parser.add_argument("--pq-m", type=int, help="PQ sub-quantizers (must divide the dimension)")
+    parser.add_argument("--pq-nbits", type=int, help="Bits per PQ code")
+    args = parser.parse_args()
+    overrides = {
+        key: getattr(args, key)
+        for key in ("m", "ef_construction", "ef_search", "nlist", "nprobe", "pq_m", "pq_nbits")
+    }
 
-    build_index(data_file, index_file, mapping_file)
+    try:
+        if args.from_pickle:
+            convert_pickle_index("faiss_system_index.pkl", "system_doc_mapping.pkl", args.output)
+        else:
+            stats = build_index(args.data, args.output, full_rebuild=args.full, index_type=args.index_type, params=overrides,
+                                backend=args.backend)
+            logging.info(f"Build summary: {stats}")
+    except Exception:
+        logging.exception("An error occurred while building the system index")
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,133 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+
+from app.encoders import ONNX_META_FILE, ONNX_MODEL_DIR, ONNX_MODEL_FILE, onnx_parity
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+# An export whose vectors for the knowledge base chunks fall below this cosine similarity
+# to the PyTorch model's is rejected
+ONNX_MIN_COSINE = float(os.getenv("ONNX_MIN_COSINE", "0.98"))
+
+def export_onnx(model_name: str, output_dir: str, quantize: bool = True, opset: int = 14) -> dict:
+    """
+    Exports a sentence-transformers model to ONNX for the "onnx" embedding backend.
+
+    The transformer is exported with dynamic batch and sequence axes, then its weights are
+    dynamically quantized to int8. Pooling and normalization run in numpy in OnnxEncoder,
+    so only mean-pooling models are supported.
+
+    Args:
+        model_name (str): Sentence-transformers model to export.
+        output_dir (str): Directory for model.onnx, tokenizer.json and encoder.json.
+        quantize (bool): Quantize the weights to int8 (keep fp32 when False).
+        opset (int): ONNX opset version.
+
+    Returns:
+        dict: The encoder metadata written to encoder.json.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    logging.info(f"Loading {model_name}...")
+    model = SentenceTransformer(model_name, device="cpu")
+    module_names = [type(module).__name__ for module in model]
+    pooling = next(module for module in model if type(module).__name__ == "Pooling")
+    if not pooling.get_config_dict().get("pooling_mode_mean_tokens"):
+        raise ValueError(f"{model_name} does not use mean pooling; OnnxEncoder cannot reproduce it")
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    sample = tokenizer(["an example sentence"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fp32_path = os.path.join(tmp, "model_fp32.onnx")
+        logging.info("Exporting to ONNX...")
+        with torch.no_grad():
+            torch.onnx.export(
+                transformer,
+                tuple(sample[name] for name in input_names),
+                fp32_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=opset,
+            )
+        output_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+        if quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            logging.info("Quantizing weights to int8...")
+            quantize_dynamic(fp32_path, output_path, weight_type=QuantType.QInt8)
+        else:
+            os.replace(fp32_path, output_path)
+
+    tokenizer.save_pretrained(output_dir)
+    meta = {
+        "model_name": model_name,
+        "dimension": model.get_sentence_embedding_dimension(),
+        "max_length": model.max_seq_length,
+        "normalize": "Normalize" in module_names,
+        "quantization": "int8" if quantize else "fp32",
+        "opset": opset,
+    }
+    with open(os.path.join(output_dir, ONNX_META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    logging.info(f"Saved {meta['quantization']} ONNX model ({os.path.getsize(output_path) / 1e6:.1f} MB) to {output_dir}")
+    return meta
+
+def check_parity(model_name: str, output_dir: str, data_path: str, min_cosine: float) -> bool:
+    """
+    Compare the export against the PyTorch model on the knowledge base chunks. A failing
+    export's encoder.json is removed, so the onnx backend refuses to load it.
+
+    Args:
+        model_name (str): Sentence-transformers model the export was made from.
+        output_dir (str): Directory holding the export.
+        data_path (str): Knowledge base text file.
+        min_cosine (float): Lowest acceptable cosine similarity for any chunk.
+
+    Returns:
+        bool: Whether every chunk reached `min_cosine`.
+    """
+    from build_index import split_chunks
+
+    with open(data_path, "r", encoding="utf-8") as f:
+        texts = split_chunks(f.read())
+    cosines = onnx_parity(model_name, texts, output_dir)
+    logging.info(f"Parity over {len(texts)} chunks: min cosine {cosines.min():.4f}, mean {cosines.mean():.4f}")
+    if cosines.min() >= min_cosine:
+        return True
+    os.remove(os.path.join(output_dir, ONNX_META_FILE))
+    logging.error(f"ONNX export drifted below cosine {min_cosine} from the PyTorch model; removed its {ONNX_META_FILE}")
+    return False
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX for CPU inference.")
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME, help="Sentence-transformers model name")
+    parser.add_argument("--output", default=ONNX_MODEL_DIR, help="Output directory")
+    parser.add_argument("--no-quantize", action="store_true", help="Keep fp32 weights")
+    parser.add_argument("--data", default="system_info.txt", help="Knowledge base text file for the parity check")
+    parser.add_argument("--min-cosine", type=float, default=ONNX_MIN_COSINE, help="Parity threshold")
+    args = parser.parse_args()
+
+    try:
+        export_onnx(args.model, args.output, quantize=not args.no_quantize)
+        ok = check_parity(args.model, args.output, args.data, args.min_cosine)
+    except Exception:
+        logging.exception("An error occurred while exporting the embedding model")
+        sys.exit(1)
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""Add updated_at to events and announcements
+
+Revision ID: 5b2d8c41e7a9
+Revises: 303f1350b778
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2d8c41e7a9'
+down_revision: Union[str, None] = '303f1350b778'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('events', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_events_updated_at'), 'events', ['updated_at'], unique=False)
+    op.add_column('announcements', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_announcements_updated_at'), 'announcements', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_announcements_updated_at'), table_name='announcements')
+    op.drop_column('announcements', 'updated_at')
+    op.drop_index(op.f('ix_events_updated_at'), table_name='events')
+    op.drop_column('events', 'updated_at')
@@ -0,0 +1,47 @@
+"""Add analytics daily rollups and change timestamps
+
+Revision ID: 8e41c7d0f2b3
+Revises: 5b2d8c41e7a9
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e41c7d0f2b3'
+down_revision: Union[str, None] = '5b2d8c41e7a9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'analytics_daily_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('metric', sa.String(length=50), nullable=False),
+        sa.Column('requirement', sa.String(length=100), nullable=False),
+        sa.Column('payment_status', sa.String(length=50), nullable=False),
+        sa.Column('year', sa.String(length=50), nullable=False),
+        sa.Column('event_id', sa.Integer(), nullable=False),
+        sa.Column('value', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('day', 'metric', 'requirement', 'payment_status', 'year', 'event_id', name='uq_analytics_daily_rollup'),
+    )
+    op.create_index(op.f('ix_analytics_daily_rollups_day'), 'analytics_daily_rollups', ['day'], unique=False)
+    # Existing rows keep NULL; the backfill falls back to other dates for them
+    op.add_column('clearances', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.add_column('event_participants', sa.Column('joined_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('event_participants', 'joined_at')
+    op.drop_column('clearances', 'updated_at')
+    op.drop_index(op.f('ix_analytics_daily_rollups_day'), table_name='analytics_daily_rollups')
+    op.drop_table('analytics_daily_rollups')
@@ -0,0 +1,75 @@
+"""Add requirement catalog referenced by clearances
+
+Revision ID: a4d7e3b91c60
+Revises: f17b2a6c9e58
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d7e3b91c60'
+down_revision: Union[str, None] = 'f17b2a6c9e58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+REQUIREMENT_TYPE = sa.Enum('1st Semester Membership', '2nd Semester Membership', name='requirement_type')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'requirements',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('amount', sa.Float(), nullable=True),
+        sa.Column('archived', sa.Boolean(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name'),
+    )
+    # One catalog entry per requirement name. Its price is the highest amount among the
+    # active clearances (falling back to archived ones), and it is archived when no
+    # active clearance has it.
+    op.execute(
+        "INSERT INTO requirements (name, amount, archived, created_at, updated_at) "
+        "SELECT requirement, "
+        "COALESCE(MAX(CASE WHEN COALESCE(archived, 0) = 0 THEN amount END), MAX(amount)), "
+        "CASE WHEN SUM(CASE WHEN COALESCE(archived, 0) = 0 THEN 1 ELSE 0 END) = 0 THEN 1 ELSE 0 END, "
+        "CURRENT_TIMESTAMP, CURRENT_TIMESTAMP "
+        "FROM clearances GROUP BY requirement"
+    )
+    op.add_column('clearances', sa.Column('requirement_id', sa.Integer(), nullable=True))
+    op.execute(
+        "UPDATE clearances SET requirement_id = "
+        "(SELECT requirements.id FROM requirements WHERE requirements.name = clearances.requirement)"
+    )
+    op.alter_column('clearances', 'requirement_id', existing_type=sa.Integer(), nullable=False)
+    op.create_foreign_key('fk_clearances_requirement_id', 'clearances', 'requirements', ['requirement_id'], ['id'])
+    op.create_index(op.f('ix_clearances_requirement_id'), 'clearances', ['requirement_id'], unique=False)
+    op.drop_column('clearances', 'amount')
+    op.drop_column('clearances', 'requirement')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Requirements outside the old enum cannot be represented and fall back to the first value
+    op.add_column('clearances', sa.Column('requirement', REQUIREMENT_TYPE, nullable=True))
+    op.add_column('clearances', sa.Column('amount', sa.Float(), nullable=True))
+    op.execute(
+        "UPDATE clearances SET "
+        "requirement = (SELECT CASE WHEN requirements.name IN ('1st Semester Membership', '2nd Semester Membership') "
+        "THEN requirements.name ELSE '1st Semester Membership' END "
+        "FROM requirements WHERE requirements.id = clearances.requirement_id), "
+        "amount = (SELECT requirements.amount FROM requirements WHERE requirements.id = clearances.requirement_id)"
+    )
+    op.alter_column('clearances', 'requirement', existing_type=REQUIREMENT_TYPE, nullable=False)
+    op.drop_constraint('fk_clearances_requirement_id', 'clearances', type_='foreignkey')
+    op.drop_index(op.f('ix_clearances_requirement_id'), table_name='clearances')
+    op.drop_column('clearances', 'requirement_id')
+    op.drop_table('requirements')
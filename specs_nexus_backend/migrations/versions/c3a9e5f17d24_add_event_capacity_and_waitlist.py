@@ -0,0 +1,42 @@
+"""Add event capacity and waitlist
+
+Revision ID: c3a9e5f17d24
+Revises: 8e41c7d0f2b3
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3a9e5f17d24'
+down_revision: Union[str, None] = '8e41c7d0f2b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('events', sa.Column('capacity', sa.Integer(), nullable=True))
+    op.create_table(
+        'event_waitlist',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('event_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['event_id'], ['events.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('event_id', 'user_id', name='uq_event_waitlist_event_user'),
+    )
+    op.create_index(op.f('ix_event_waitlist_event_id'), 'event_waitlist', ['event_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_event_waitlist_event_id'), table_name='event_waitlist')
+    op.drop_table('event_waitlist')
+    op.drop_column('events', 'capacity')
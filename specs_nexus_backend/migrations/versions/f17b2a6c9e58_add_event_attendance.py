@@ -0,0 +1,40 @@
+"""Add event attendance
+
+Revision ID: f17b2a6c9e58
+Revises: c3a9e5f17d24
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f17b2a6c9e58'
+down_revision: Union[str, None] = 'c3a9e5f17d24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'event_attendance',
+        sa.Column('event_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('checked_in_at', sa.DateTime(), nullable=False),
+        sa.Column('scanned_by', sa.Integer(), nullable=True),
+        sa.Column('source', sa.String(length=20), nullable=False),
+        sa.Column('recorded_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['event_id'], ['events.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['scanned_by'], ['officers.id']),
+        sa.PrimaryKeyConstraint('event_id', 'user_id'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('event_attendance')
@@ -14,6 +14,8 @@ const Chatbot = () => {
   const [input, setInput] = useState('');
   const [loading, setLoading] = useState(false);
   const messagesEndRef = useRef(null);
+  // Lets the server answer follow-up questions in the context of this conversation
+  const sessionIdRef = useRef(null);
 
   useEffect(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
@@ -36,8 +38,12 @@ const Chatbot = () => {
     setLoading(true);
 
     try {
-      const response = await axios.post("http://localhost:8000/chat/", { message: userMessage.text });
+      const response = await axios.post("http://localhost:8000/chat/", {
+        message: userMessage.text,
+        session_id: sessionIdRef.current,
+      });
       const botResponse = response.data.response;
+      sessionIdRef.current = response.data.session_id;
       setMessages(prev => [...prev, { sender: 'bot', text: botResponse }]);
     } catch (error) {
       console.error("Error from chat endpoint:", error);